@@ -0,0 +1,224 @@
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .cache import get_medications
+from .models import (Diagnosis, DiagnosisStat, MedicationStat, Prescription,
+                     RollupWatermark, Visit, VisitStat)
+
+
+def get_watermark(name):
+    watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=name)
+    return watermark
+
+
+def next_range(model, watermark, now):
+    # Прирост витрины — строки с id в (last_id, seen_id]. Отметка по id, а
+    # не по created_at: created_at задают приложение и файл импорта, и строка,
+    # закоммиченная позже с более ранним created_at, осталась бы за отметкой.
+    # id выдаются до коммита, поэтому seen_id — наибольший id, замеченный
+    # прошлым запуском не меньше ANALYTICS_LAG_SECONDS назад: транзакции с
+    # меньшими id к этому времени завершены
+    cutoff = now - datetime.timedelta(seconds=settings.ANALYTICS_LAG_SECONDS)
+    if watermark.seen_at is not None and watermark.seen_at > cutoff:
+        return None
+    ids = (watermark.last_id, watermark.seen_id) if watermark.seen_id > watermark.last_id else None
+    watermark.last_id = max(watermark.last_id, watermark.seen_id)
+    top = model.objects.order_by("-id").values_list("id", flat=True).first() or 0
+    watermark.seen_id, watermark.seen_at = max(top, watermark.last_id), now
+    return ids
+
+
+def refresh_diagnoses(now):
+    watermark = get_watermark("diagnoses")
+    ids = next_range(Diagnosis, watermark, now)
+    changed = 0
+    if ids is not None:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                           INSERT INTO stats_diagnoses_daily (day, icd_code, diagnoses)
+                           SELECT (created_at AT TIME ZONE %s)::date, icd_code, count(*)
+                           FROM diagnoses
+                           WHERE id > %s
+                             AND id <= %s
+                           GROUP BY 1, 2
+                           ON CONFLICT (day, icd_code)
+                               DO UPDATE SET diagnoses = stats_diagnoses_daily.diagnoses + EXCLUDED.diagnoses
+                           """, [settings.TIME_ZONE, *ids])
+            changed = cursor.rowcount
+    watermark.save()
+    return changed
+
+
+def refresh_medications(now):
+    watermark = get_watermark("prescriptions")
+    ids = next_range(Prescription, watermark, now)
+    changed = 0
+    if ids is not None:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                           INSERT INTO stats_medications_daily (day, medication_id, prescriptions)
+                           SELECT (p.created_at AT TIME ZONE %s)::date, pm.medication_id, count(*)
+                           FROM prescriptions p
+                                    JOIN prescription_medications pm ON pm.prescription_id = p.id
+                           WHERE p.id > %s
+                             AND p.id <= %s
+                           GROUP BY 1, 2
+                           ON CONFLICT (day, medication_id)
+                               DO UPDATE SET prescriptions = stats_medications_daily.prescriptions + EXCLUDED.prescriptions
+                           """, [settings.TIME_ZONE, *ids])
+            changed = cursor.rowcount
+    watermark.save()
+    return changed
+
+
+def day_runs(days):
+    # Подряд идущие дни -> [начало, конец) в местном времени: визит задним
+    # числом добавляет к пересчёту свой день, а не всю историю до него
+    tz = timezone.get_current_timezone()
+    starts, ends = [], []
+    for day in sorted(days):
+        start = datetime.datetime.combine(day, datetime.time.min, tzinfo=tz)
+        end = datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz)
+        if ends and ends[-1] == start:
+            ends[-1] = end
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+
+def refresh_visits(now):
+    # Статус визита меняется после создания, поэтому дни, затронутые новыми
+    # визитами, и скользящее окно ANALYTICS_RECHECK_DAYS вокруг сегодняшнего
+    # дня пересчитываются целиком, а не прибавляются
+    watermark = get_watermark("visits")
+    ids = next_range(Visit, watermark, now)
+
+    days = set()
+    if ids is not None:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                           SELECT DISTINCT (visit_date AT TIME ZONE %s)::date
+                           FROM visits
+                           WHERE id > %s
+                             AND id <= %s
+                           """, [settings.TIME_ZONE, *ids])
+            days.update(row[0] for row in cursor.fetchall())
+
+    today = timezone.localdate()
+    window = settings.ANALYTICS_RECHECK_DAYS
+    days.update(today + datetime.timedelta(days=n) for n in range(-window, window + 1))
+
+    starts, ends = day_runs(days)
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM stats_visits_daily WHERE day = ANY(%s)", [sorted(days)])
+        cursor.execute("""
+                       INSERT INTO stats_visits_daily (doctor_id, day, status, visits)
+                       SELECT v.doctor_id, (v.visit_date AT TIME ZONE %s)::date AS day, v.status, count(*)
+                       FROM unnest(%s::timestamptz[], %s::timestamptz[]) AS r(starts, ends)
+                                JOIN visits v ON v.visit_date >= r.starts AND v.visit_date < r.ends
+                       GROUP BY 1, 2, 3
+                       """, [settings.TIME_ZONE, starts, ends])
+        changed = cursor.rowcount
+
+    watermark.save()
+    return changed
+
+
+# Полная пересборка витрины: (отметка, модель отметки, исходные таблицы,
+# витрина, запрос по всей истории)
+REBUILDS = {
+    "visits": ("visits", Visit, ("visits",), "stats_visits_daily", """
+        INSERT INTO stats_visits_daily (doctor_id, day, status, visits)
+        SELECT doctor_id, (visit_date AT TIME ZONE %s)::date, status, count(*)
+        FROM visits
+        GROUP BY 1, 2, 3
+    """),
+    "diagnoses": ("diagnoses", Diagnosis, ("diagnoses",), "stats_diagnoses_daily", """
+        INSERT INTO stats_diagnoses_daily (day, icd_code, diagnoses)
+        SELECT (created_at AT TIME ZONE %s)::date, icd_code, count(*)
+        FROM diagnoses
+        GROUP BY 1, 2
+    """),
+    "medications": ("prescriptions", Prescription, ("prescriptions", "prescription_medications"),
+                    "stats_medications_daily", """
+        INSERT INTO stats_medications_daily (day, medication_id, prescriptions)
+        SELECT (p.created_at AT TIME ZONE %s)::date, pm.medication_id, count(*)
+        FROM prescriptions p
+                 JOIN prescription_medications pm ON pm.prescription_id = p.id
+        GROUP BY 1, 2
+    """),
+}
+
+
+def rebuild(name, now):
+    # Инкрементальное обновление видит только новые id и окно
+    # ANALYTICS_RECHECK_DAYS: правки, смена статуса и удаление более старых
+    # строк, а также любые правки диагнозов и назначений в витрины не
+    # попадают. Пересборка считает витрину по всей истории. SHARE-блокировка
+    # дожидается незавершённых транзакций записи и не пускает новые до
+    # коммита, поэтому отметка ставится ровно на наибольший учтённый id.
+    # Витрина очищается через DELETE, а не TRUNCATE: до коммита дашборды
+    # читают прежние строки
+    watermark_name, model, tables, target, sql = REBUILDS[name]
+    watermark = get_watermark(watermark_name)
+    with connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {', '.join(tables)} IN SHARE MODE")
+        cursor.execute(f"DELETE FROM {target}")
+        cursor.execute(sql, [settings.TIME_ZONE])
+        changed = cursor.rowcount
+    top = model.objects.order_by("-id").values_list("id", flat=True).first() or 0
+    watermark.last_id = watermark.seen_id = top
+    watermark.seen_at = now
+    watermark.save()
+    return changed
+
+
+def refresh_rollups(full=False):
+    now = timezone.now()
+    result = {}
+    for name, refresh in (("visits", refresh_visits),
+                          ("diagnoses", refresh_diagnoses),
+                          ("medications", refresh_medications)):
+        with transaction.atomic():
+            result[name] = rebuild(name, now) if full else refresh(now)
+    return result
+
+
+def visits_summary(start, end, doctor_id=None):
+    stats = VisitStat.objects.filter(day__gte=start, day__lte=end)
+    if doctor_id is not None:
+        stats = stats.filter(doctor_id=doctor_id)
+    return list(
+        stats.values("day", "doctor_id", "status")
+        .annotate(visits=Sum("visits"))
+        .order_by("day", "doctor_id", "status")
+    )
+
+
+def top_diagnoses(start, end, limit=10):
+    return list(
+        DiagnosisStat.objects
+        .filter(day__gte=start, day__lte=end)
+        .values("icd_code")
+        .annotate(diagnoses=Sum("diagnoses"))
+        .order_by("-diagnoses", "icd_code")[:limit]
+    )
+
+
+def top_medications(start, end, limit=10):
+    rows = list(
+        MedicationStat.objects
+        .filter(day__gte=start, day__lte=end)
+        .values("medication_id")
+        .annotate(prescriptions=Sum("prescriptions"))
+        .order_by("-prescriptions", "medication_id")[:limit]
+    )
+    medications = get_medications()
+    for row in rows:
+        row["name"] = medications.get(row["medication_id"], {}).get("name")
+    return rows
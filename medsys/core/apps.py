@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import checks  # noqa: F401
+        from .cache import connect_signals
+        from .registry import build_registry
+        build_registry()
+        connect_signals()
@@ -0,0 +1,119 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection
+from django.utils import timezone
+
+from .models import ActionLog
+from .partitions import ensure_partitions, month_start
+
+logger = logging.getLogger(__name__)
+
+MAX_PENDING_BATCHES = 20
+COLUMNS = ("user_id", "action_type", "entity", "entity_id", "details", "created_at")
+
+
+class ActionLogBuffer:
+    # Записи журнала копятся в памяти и пишутся фоновым потоком пачками
+    # (COPY или многострочный INSERT), запрос на запись не ждёт
+    def __init__(self, size=None, interval=None):
+        self.size = size
+        self.interval = interval
+        self._entries = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._months = set()
+
+    def get_size(self):
+        return self.size or settings.ACTION_LOG_BUFFER_SIZE
+
+    def get_interval(self):
+        return self.interval or settings.ACTION_LOG_FLUSH_INTERVAL
+
+    def log(self, user_id, action_type, entity, entity_id=None, details=None):
+        self.extend([(user_id, action_type, entity, entity_id, details, timezone.now())])
+
+    def extend(self, entries):
+        with self._lock:
+            self._entries.extend(entries)
+            full = len(self._entries) >= self.get_size()
+        self._start()
+        if full:
+            self._wakeup.set()
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="action-log-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.get_interval())
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Не удалось записать журнал действий")
+
+    def flush(self):
+        with self._lock:
+            entries, self._entries = self._entries, []
+        if not entries:
+            return 0
+
+        try:
+            self._ensure_months(entries)
+            write_entries(entries)
+        except DatabaseError:
+            # вернём записи в буфер, следующая попытка через интервал
+            with self._lock:
+                self._entries[:0] = entries
+                overflow = len(self._entries) - self.get_size() * MAX_PENDING_BATCHES
+                if overflow > 0:
+                    del self._entries[:overflow]
+                    logger.error("Буфер журнала переполнен, потеряно записей: %s", overflow)
+            raise
+        return len(entries)
+
+    def _ensure_months(self, entries):
+        months = {month_start(entry[-1]) for entry in entries} - self._months
+        for month in months:
+            ensure_partitions(months_ahead=0, now=month)
+        self._months |= months
+
+
+def write_entries(entries):
+    with connection.cursor() as cursor:
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, "copy"):
+            sql = "COPY {} ({}) FROM STDIN".format(ActionLog._meta.db_table, ", ".join(COLUMNS))
+            with raw_cursor.copy(sql) as copy:
+                for entry in entries:
+                    copy.write_row(entry)
+            return
+    ActionLog.objects.bulk_create(
+        [ActionLog(**dict(zip(COLUMNS, entry))) for entry in entries],
+        batch_size=settings.ACTION_LOG_BUFFER_SIZE,
+    )
+
+
+action_log = ActionLogBuffer()
+
+
+def log_action(user_id, action_type, entity, entity_id=None, details=None):
+    action_log.log(user_id, action_type, entity, entity_id, details)
+
+
+def log_actions(entries):
+    # Синхронная запись одним COPY/INSERT в текущей транзакции:
+    # журнал фиксируется или откатывается вместе с самими изменениями
+    action_log._ensure_months(entries)
+    write_entries(entries)
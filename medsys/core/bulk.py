@@ -0,0 +1,97 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .audit import log_actions
+from .cache import invalidate_rows
+from .constants import BULK_MAX_ROWS
+from .schedule import ACTIVE_STATUSES
+
+
+class BulkError(Exception):
+    pass
+
+
+def parse_ids(spec, values):
+    pk = spec.model._meta.pk
+    ids = set()
+    for value in values:
+        try:
+            ids.add(pk.to_python(value))
+        except ValidationError:
+            raise BulkError(f"Неверный идентификатор строки: {value}")
+    if not ids:
+        raise BulkError("Не выбрано ни одной строки")
+    if len(ids) > BULK_MAX_ROWS:
+        raise BulkError(f"За один раз можно изменить не больше {BULK_MAX_ROWS} строк")
+    return sorted(ids)
+
+
+def clean_value(spec, name, raw):
+    field = spec.bulk_fields.get(name)
+    if field is None:
+        raise BulkError(f"Поле {name} нельзя менять массово")
+
+    if raw in (None, ""):
+        if not field.null:
+            raise BulkError(f"Поле {name} не может быть пустым")
+        return field.attname, None
+
+    if field.is_relation:
+        # значение одно на все строки: существование проверяется одним запросом
+        try:
+            target = field.target_field.to_python(raw)
+        except ValidationError:
+            raise BulkError(f"Неверный идентификатор в поле {name}: {raw}")
+        if not field.related_model.objects.filter(pk=target).exists():
+            raise BulkError(f"Связанная запись {name}={raw} не найдена")
+        return field.attname, target
+
+    try:
+        value = field.clean(raw, None)
+    except ValidationError as e:
+        raise BulkError(f"{name}: {'; '.join(e.messages)}")
+
+    if spec.name == "visits" and name == "status" and value in ACTIVE_STATUSES:
+        raise BulkError("Возвращать визиты в расписание можно только по одному: нужна проверка пересечений")
+    return field.attname, value
+
+
+def lock_rows(spec, ids):
+    return list(spec.model.objects
+                .filter(pk__in=ids)
+                .select_for_update()
+                .values_list("pk", flat=True))
+
+
+@transaction.atomic
+def bulk_update(spec, ids, name, raw, user_id):
+    # Одно UPDATE ... WHERE pk IN (...) вместо save() на каждую строку
+    attname, value = clean_value(spec, name, raw)
+    ids = lock_rows(spec, parse_ids(spec, ids))
+    if not ids:
+        return 0
+
+    now = timezone.now()
+    values = {attname: value}
+    values.update((field, now) for field in spec.auto_now_fields)
+    spec.model.objects.filter(pk__in=ids).update(**values)
+    invalidate_rows(spec.model, ids)
+
+    details = f"{name}={raw}"
+    log_actions([(user_id, "bulk_update", spec.name, pk, details, now) for pk in ids])
+    return len(ids)
+
+
+@transaction.atomic
+def bulk_delete(spec, ids, user_id):
+    # QuerySet.delete() собирает каскады пачками по IN, а не по строке
+    ids = lock_rows(spec, parse_ids(spec, ids))
+    if not ids:
+        return 0
+
+    spec.model.objects.filter(pk__in=ids).delete()
+
+    now = timezone.now()
+    log_actions([(user_id, "bulk_delete", spec.name, pk, None, now) for pk in ids])
+    return len(ids)
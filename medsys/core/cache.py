@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache as shared_cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .models import Doctor, Medication, SystemUser, Visit
+from .schedule import invalidate_schedule
+
+MISSING = object()
+
+
+class LocalLRU:
+    # Первый уровень: LRU в памяти процесса. TTL короткий: инвалидация
+    # из другого процесса доходит сюда не позже чем через TTL
+    def __init__(self, size=None, ttl=None):
+        self.size = size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return MISSING
+            value, expires = item
+            if expires < time.monotonic():
+                del self._items[key]
+                return MISSING
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        ttl = self.ttl if self.ttl is not None else settings.CORE_CACHE_LOCAL_TTL
+        size = self.size or settings.CORE_CACHE_LOCAL_SIZE
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class TwoLevelCache:
+    # Локальный LRU поверх общего кеша Django (Redis или LocMemCache,
+    # см. CACHES): промах первого уровня идёт во второй, промах второго —
+    # в loader, то есть в БД. shared — любой объект с get/set/delete_many
+    # (в тестах подменяется фейком)
+    def __init__(self, name, local=None, shared=None):
+        self.name = name
+        self.local = local or LocalLRU()
+        self.shared = shared if shared is not None else shared_cache
+        self._counts = {"local": 0, "shared": 0, "miss": 0}
+        self._lock = threading.Lock()
+
+    def make_key(self, key):
+        return f"core:{self.name}:{key}"
+
+    def count(self, kind):
+        with self._lock:
+            self._counts[kind] += 1
+
+    def get(self, key, loader):
+        value = self.local.get(key)
+        if value is not MISSING:
+            self.count("local")
+            return value
+
+        value = self.shared.get(self.make_key(key), MISSING)
+        if value is MISSING:
+            self.count("miss")
+            value = loader()
+            self.shared.set(self.make_key(key), value, settings.CORE_CACHE_TTL)
+        else:
+            self.count("shared")
+        self.local.set(key, value)
+        return value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.local.delete(key)
+        self.shared.delete_many([self.make_key(key) for key in keys])
+
+    def clear_local(self):
+        self.local.clear()
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        counts["requests"] = total
+        counts["hit_rate"] = round((counts["local"] + counts["shared"]) / total, 4) if total else None
+        return counts
+
+
+identity_cache = TwoLevelCache("identity")
+doctor_cache = TwoLevelCache("doctors")
+medication_cache = TwoLevelCache("medications")
+CACHES = (identity_cache, doctor_cache, medication_cache)
+
+
+def get_identity(user_id):
+    # (id, role, full_name, email) или None, если пользователь удалён
+    return identity_cache.get(user_id, lambda: (
+        SystemUser.objects
+        .filter(id=user_id)
+        .values_list("id", "role", "full_name", "email")
+        .first()
+    ))
+
+
+def get_doctor_ids():
+    return doctor_cache.get("ids", lambda: list(Doctor.objects.values_list("user_id", flat=True)))
+
+
+def get_medications():
+    # справочник лекарств целиком: id -> {name, dosage, instruction}
+    return medication_cache.get("all", lambda: {
+        row["id"]: row
+        for row in Medication.objects.values("id", "name", "dosage", "instruction")
+    })
+
+
+def cache_stats():
+    return {cache.name: cache.stats() for cache in CACHES}
+
+
+def invalidate_rows(model, ids, using=None):
+    # QuerySet.update()/delete() и импорт не шлют post_save,
+    # поэтому массовые операции сбрасывают кеш явно.
+    # Сигналы приходят внутри транзакции запроса (CurrentUserMiddleware):
+    # до коммита параллельный запрос может прочитать из БД старую строку
+    # (например, прежнюю роль) и вернуть её в общий кеш на CORE_CACHE_TTL,
+    # поэтому ключи сбрасываются сразу и ещё раз после коммита
+    if model is SystemUser:
+        target, keys = identity_cache, list(ids)
+    elif model is Doctor:
+        target, keys = doctor_cache, ["ids"]
+    elif model is Medication:
+        target, keys = medication_cache, ["all"]
+    elif model is Visit:
+        # прогретый индекс расписания (core.schedule.WarmSchedule)
+        invalidate_schedule(using)
+        return
+    else:
+        return
+    target.delete(*keys)
+    transaction.on_commit(lambda: target.delete(*keys), using=using)
+
+
+def invalidate_instance(sender, instance, using=None, **kwargs):
+    invalidate_rows(sender, [instance.pk], using=using)
+
+
+def connect_signals():
+    for model in (SystemUser, Doctor, Medication, Visit):
+        post_save.connect(invalidate_instance, sender=model, dispatch_uid=f"core.cache.save.{model.__name__}")
+        post_delete.connect(invalidate_instance, sender=model, dispatch_uid=f"core.cache.delete.{model.__name__}")
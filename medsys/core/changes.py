@@ -0,0 +1,144 @@
+import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .constants import CHANGES_MAX_PAGE_SIZE, CHANGES_PAGE_SIZE
+from .copy_export import json_value
+from .exports import export_fields
+from .models import DeletedRow
+
+WATERMARK_SALT = "core.changes"
+
+
+class WatermarkError(Exception):
+    pass
+
+
+class WatermarkExpired(WatermarkError):
+    pass
+
+
+def changed_at(model):
+    # Момент последнего изменения строки. У строк до миграции 0009
+    # updated_at пуст, у таблиц без updated_at (action_logs) только created_at
+    names = {field.name for field in model._meta.concrete_fields}
+    if "updated_at" in names:
+        return Coalesce("updated_at", "created_at")
+    return F("created_at")
+
+
+def parse_limit(value):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return CHANGES_PAGE_SIZE
+    return max(1, min(limit, CHANGES_MAX_PAGE_SIZE))
+
+
+def after(column, pk_name, position):
+    # Позиция (время, pk): строки строго после неё в порядке (column, pk).
+    # pk None — всё до этого времени включительно уже прочитано
+    moment, pk = position
+    if pk is None:
+        return Q(**{column + "__gt": moment})
+    return Q(**{column + "__gt": moment}) | Q(**{column: moment, pk_name + "__gt": pk})
+
+
+def encode_watermark(table, changes, deleted):
+    return signing.dumps({
+        "t": table,
+        "c": [changes[0].isoformat(), changes[1]] if changes else None,
+        "d": [deleted[0].isoformat(), deleted[1]],
+    }, salt=WATERMARK_SALT, compress=True)
+
+
+def decode_position(value):
+    moment = parse_datetime(value[0])
+    if moment is None:
+        raise ValueError(value[0])
+    return moment, value[1]
+
+
+def parse_since(table, since):
+    # Отметка из прошлого ответа или время ISO 8601 (первая выгрузка
+    # после полной). Без since лента начинается с самого начала
+    try:
+        moment = parse_datetime(since)
+    except ValueError:
+        raise WatermarkError("Неверная отметка времени")
+    if moment is not None:
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return (moment, None), (moment, None)
+
+    try:
+        data = signing.loads(since, salt=WATERMARK_SALT)
+        if data["t"] != table:
+            raise WatermarkError("Отметка выдана для другой таблицы")
+        changes = decode_position(data["c"]) if data["c"] else None
+        return changes, decode_position(data["d"])
+    except (signing.BadSignature, KeyError, IndexError, TypeError, ValueError):
+        raise WatermarkError("Неверная отметка")
+
+
+def read_changes(table, model, since=None, limit=None):
+    # Строки, созданные или изменённые после отметки, и id удалённых.
+    # Верхняя граница отстаёт от текущего времени на CHANGES_LAG_SECONDS:
+    # now() в PostgreSQL — время начала транзакции, и строка ещё не
+    # завершённой транзакции может появиться позже уже выданной отметки
+    limit = parse_limit(limit)
+    upper = timezone.now() - datetime.timedelta(seconds=settings.CHANGES_LAG_SECONDS)
+    if since:
+        changes_from, deleted_from = parse_since(table, since)
+    else:
+        # удалённое до начала полной выгрузки в неё и так не попадёт
+        changes_from, deleted_from = None, (upper, None)
+
+    cutoff = timezone.now() - datetime.timedelta(days=settings.CHANGES_TOMBSTONE_DAYS)
+    if deleted_from[0] < cutoff:
+        raise WatermarkExpired("Отметка старше срока хранения удалений, нужна полная выгрузка")
+
+    fields = export_fields(model)
+    pk_name = model._meta.pk.attname
+    queryset = (model.objects
+                .annotate(changed_at=changed_at(model))
+                .filter(changed_at__lte=upper))
+    if changes_from is not None:
+        queryset = queryset.filter(after("changed_at", pk_name, changes_from))
+    rows = list(queryset.order_by("changed_at", pk_name)
+                .values_list(*fields, "changed_at")[:limit + 1])
+
+    deleted = list(DeletedRow.objects
+                   .filter(after("deleted_at", "id", deleted_from),
+                           table_name=model._meta.db_table, deleted_at__lte=upper)
+                   .order_by("deleted_at", "id")
+                   .values_list("deleted_at", "id", "row_id")[:limit + 1])
+
+    more_changes, more_deleted = len(rows) > limit, len(deleted) > limit
+    rows, deleted = rows[:limit], deleted[:limit]
+    # дочитанный поток продолжается с верхней границы
+    if more_changes:
+        changes_to = (rows[-1][-1], rows[-1][fields.index(pk_name)])
+    else:
+        changes_to = (upper, None)
+    deleted_to = deleted[-1][:2] if more_deleted else (upper, None)
+
+    return {
+        "table": table,
+        "changes": [dict(zip(fields, map(json_value, row))) for row in rows],
+        "deleted": [row_id for _, _, row_id in deleted],
+        "watermark": encode_watermark(table, changes_to, deleted_to),
+        "has_more": more_changes or more_deleted,
+    }
+
+
+def prune_tombstones(days):
+    # отметки старше срока больше не выдаются: read_changes отвечает 410
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    deleted, _ = DeletedRow.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,35 @@
+from django.core.checks import Error, Tags, register
+from django.db import connections
+
+# Пароли хешируются в приложении (core.passwords), в том числе повторно при
+# входе. Триггер system_users, хеширующий hashed_password через pgcrypto,
+# сохранил бы хеш от готового bcrypt-хеша, и пользователь не смог бы войти
+PASSWORD_TRIGGERS_SQL = r"""
+    SELECT t.tgname
+    FROM pg_trigger t
+             JOIN pg_proc p ON p.oid = t.tgfoid
+    WHERE t.tgrelid = to_regclass('system_users')
+      AND NOT t.tgisinternal
+      AND p.prosrc ~* '\m(crypt|gen_salt)\s*\('
+"""
+
+
+@register(Tags.database)
+def password_triggers(databases=None, **kwargs):
+    # только для manage.py check --database <alias>
+    errors = []
+    for alias in databases or ():
+        connection = connections[alias]
+        if connection.vendor != "postgresql":
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute(PASSWORD_TRIGGERS_SQL)
+            names = [name for name, in cursor.fetchall()]
+        for name in names:
+            errors.append(Error(
+                f"Триггер {name} на system_users хеширует пароль в БД",
+                hint="Пароли хешируются в приложении (core.passwords); триггер нужно удалить",
+                obj=alias,
+                id="core.E001",
+            ))
+    return errors
@@ -9,4 +9,35 @@ STATUS_CHOICES = (
         ('in_progress', 'In Progress'),
         ('completed', 'Completed'),
         ('cancelled', 'Cancelled'),
-    )
\ No newline at end of file
+    )
+JOB_STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('expired', 'Expired'),
+    )
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_MAX_COLUMN_WIDTH = 60
+# строк в одном диапазоне PK параллельной выгрузки и уровень сжатия xlsx
+EXPORT_RANGE_ROWS = 250000
+EXPORT_ZIP_LEVEL = 1
+# выгрузка CSV/JSONL через COPY: размер отдаваемого блока и уровень gzip
+COPY_EXPORT_BUFFER_SIZE = 256 * 1024
+COPY_EXPORT_GZIP_LEVEL = 1
+# размер блока при отдаче файла выгрузки через ASGI
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+DB_ROLES = {
+    "admin": "admin_role",
+    "doctor": "doctor_role",
+}
+IMPORT_BATCH_SIZE = 5000
+SEARCH_MIN_LENGTH = 2
+BULK_MAX_ROWS = 5000
+# ключ advisory-блокировки заданий пользователя (второй ключ — id пользователя)
+JOB_LOCK_KEY = 19
+# лента изменений core.changes: строк на страницу по умолчанию и максимум
+CHANGES_PAGE_SIZE = 1000
+CHANGES_MAX_PAGE_SIZE = 5000
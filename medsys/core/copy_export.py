@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+
+from .constants import COPY_EXPORT_BUFFER_SIZE, COPY_EXPORT_GZIP_LEVEL, EXPORT_CHUNK_SIZE
+from .exports import export_fields
+from .middleware import apply_db_context
+
+# формат -> (расширение файла, Content-Type)
+FORMATS = {
+    "csv": ("csv", "text/csv; charset=utf-8"),
+    "jsonl": ("jsonl", "application/x-ndjson"),
+}
+GZIP_CONTENT_TYPE = "application/gzip"
+
+
+def copy_sql(model, fmt):
+    table = connection.ops.quote_name(model._meta.db_table)
+    # имена колонок как в export_fields (attname), даже если в БД другое
+    columns = ", ".join(
+        connection.ops.quote_name(field.column) if field.column == field.attname
+        else f"{connection.ops.quote_name(field.column)} AS {connection.ops.quote_name(field.attname)}"
+        for field in model._meta.fields
+    )
+    select = f"SELECT {columns} FROM {table}"
+    if fmt == "csv":
+        return f"COPY ({select}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+    # Текстовый формат COPY экранировал бы обратные слэши JSON. В JSON нет
+    # сырых управляющих символов, поэтому CSV с кавычкой \x01 и
+    # разделителем \x02 отдаёт строки row_to_json без изменений
+    return (f"COPY (SELECT row_to_json(t) FROM ({select}) AS t) TO STDOUT"
+            " WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')")
+
+
+def json_value(value):
+    # bytea так же, как его выводит row_to_json
+    if isinstance(value, (bytes, memoryview)):
+        return "\\x" + bytes(value).hex()
+    return value
+
+
+def python_rows(model, fmt, using):
+    # без psycopg3 (другая СУБД): те же форматы через ORM
+    fields = export_fields(model)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(fields)
+    for values in model.objects.using(using).values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        if fmt == "csv":
+            writer.writerow([json_value(v) for v in values])
+        else:
+            row = dict(zip(fields, map(json_value, values)))
+            buffer.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n")
+        if buffer.tell() >= COPY_EXPORT_BUFFER_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def table_chunks(model, fmt, using):
+    # COPY отдаёт по сообщению на строку, блоки собираются до
+    # COPY_EXPORT_BUFFER_SIZE: память не зависит от размера таблицы
+    with connections[using].cursor() as cursor:
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, "copy"):
+            buffer = bytearray()
+            with raw_cursor.copy(copy_sql(model, fmt)) as copy:
+                for data in copy:
+                    buffer += data
+                    if len(buffer) >= COPY_EXPORT_BUFFER_SIZE:
+                        yield bytes(buffer)
+                        buffer.clear()
+            yield bytes(buffer)
+            return
+    yield from python_rows(model, fmt, using)
+
+
+def stream_table(model, fmt, user=None, compress=True, using=DEFAULT_DB_ALIAS):
+    # Генератор выполняется после выхода из CurrentUserMiddleware, поэтому
+    # транзакцию и контекст RLS пользователя открывает сам; using — БД,
+    # из которой читать (реплика)
+    compressor = zlib.compressobj(COPY_EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+    with transaction.atomic(using=using):
+        if user is not None:
+            apply_db_context(user, using=using)
+        for chunk in table_chunks(model, fmt, using):
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def export_filename(table, fmt, compress=True):
+    name = f"{table}.{FORMATS[fmt][0]}"
+    return name + ".gz" if compress else name
+
+
+def export_content_type(fmt, compress=True):
+    return GZIP_CONTENT_TYPE if compress else FORMATS[fmt][1]
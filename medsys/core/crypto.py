@@ -0,0 +1,160 @@
+import base64
+import logging
+import os
+import threading
+import time
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from django.conf import settings
+from django.db import transaction
+
+from .models import Alias, EncryptionKey
+
+NONCE_SIZE = 12
+
+logger = logging.getLogger(__name__)
+
+
+class KeyCache:
+    # Ключи EncryptionKey в памяти процесса с вытеснением по TTL
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._keys = {}
+        self._active = None
+        self._lock = threading.Lock()
+
+    def get_ttl(self):
+        return self.ttl if self.ttl is not None else settings.ALIAS_KEY_CACHE_TTL
+
+    def get_many(self, key_ids):
+        now = time.monotonic()
+        found = {}
+        missing = []
+        with self._lock:
+            for key_id in set(key_ids):
+                entry = self._keys.get(key_id)
+                if entry and entry[1] > now:
+                    found[key_id] = entry[0]
+                else:
+                    missing.append(key_id)
+
+        if missing:
+            loaded = EncryptionKey.objects.filter(id__in=missing).values_list("id", "key_value")
+            expires = now + self.get_ttl()
+            with self._lock:
+                for key_id, key_value in loaded:
+                    try:
+                        cipher = AESGCM(bytes(key_value))
+                    except ValueError:
+                        # ключ не 128/192/256 бит: строки с ним не расшифровываются
+                        logger.error("Ключ шифрования %s неверной длины: %s байт", key_id, len(key_value))
+                        continue
+                    self._keys[key_id] = (cipher, expires)
+                    found[key_id] = cipher
+        return found
+
+    def get(self, key_id):
+        return self.get_many([key_id]).get(key_id)
+
+    def active_key_id(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._active and self._active[1] > now:
+                return self._active[0]
+
+        key_id = (EncryptionKey.objects
+                  .filter(is_active=True)
+                  .order_by("-created_at", "-id")
+                  .values_list("id", flat=True)
+                  .first())
+        with self._lock:
+            self._active = (key_id, now + self.get_ttl())
+        return key_id
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+            self._active = None
+
+
+key_cache = KeyCache()
+
+
+def encrypt_with(cipher, plaintext):
+    iv = os.urandom(NONCE_SIZE)
+    data = cipher.encrypt(iv, plaintext.encode(), None)
+    return base64.b64encode(data).decode(), iv
+
+
+def decrypt_with(cipher, encrypted_data, iv):
+    try:
+        data = cipher.decrypt(bytes(iv), base64.b64decode(encrypted_data), None)
+    except (InvalidTag, ValueError, TypeError):
+        return None
+    return data.decode()
+
+
+def decrypt_rows(rows):
+    # Расшифровка страницы одним проходом: rows — (key_id, encrypted_data, iv);
+    # все ключи берутся из кеша (или одним запросом), шифр на каждый ключ
+    # создаётся один раз
+    ciphers = key_cache.get_many(key_id for key_id, _, _ in rows)
+    result = []
+    for key_id, encrypted_data, iv in rows:
+        cipher = ciphers.get(key_id)
+        if cipher is None:
+            result.append(None)
+        else:
+            result.append(decrypt_with(cipher, encrypted_data, iv))
+    return result
+
+
+def create_key():
+    return EncryptionKey.objects.create(key_value=AESGCM.generate_key(bit_length=256))
+
+
+def rotate_aliases(new_key, chunk_size=None, progress=None):
+    # Перешифровка псевдонимов короткими транзакциями: блокируются только
+    # строки текущей пачки, занятые другими транзакциями строки пропускаются
+    # и подбираются следующим проходом с тем же ключом. Возвращает
+    # (перешифровано, не расшифровано): нерасшифрованные остаются на старом ключе
+    chunk_size = chunk_size or settings.ALIAS_ROTATION_CHUNK_SIZE
+    new_cipher = AESGCM(bytes(new_key.key_value))
+    rotated = 0
+    failed = 0
+    last_id = 0
+
+    while True:
+        with transaction.atomic():
+            chunk = list(
+                Alias.objects
+                .filter(id__gt=last_id)
+                .exclude(key_id=new_key.id)
+                .order_by("id")
+                .select_for_update(skip_locked=True, of=("self",))
+                .only("id", "encrypted_data", "iv", "key_id")[:chunk_size]
+            )
+            if not chunk:
+                break
+
+            ciphers = key_cache.get_many(alias.key_id for alias in chunk)
+            changed = []
+            for alias in chunk:
+                cipher = ciphers.get(alias.key_id)
+                plaintext = decrypt_with(cipher, alias.encrypted_data, alias.iv) if cipher else None
+                if plaintext is None:
+                    failed += 1
+                    continue
+                alias.encrypted_data, alias.iv = encrypt_with(new_cipher, plaintext)
+                alias.key_id = new_key.id
+                changed.append(alias)
+
+            Alias.objects.bulk_update(changed, ["encrypted_data", "iv", "key"])
+
+        rotated += len(changed)
+        last_id = chunk[-1].id
+        if progress:
+            progress(rotated)
+
+    return rotated, failed
@@ -0,0 +1,14 @@
+# Пул соединений psycopg (settings.DATABASES OPTIONS["pool"]). Модуль
+# импортируется из settings, поэтому без импортов Django.
+
+# Контекст RLS сессии (middleware.apply_db_context): роль БД и app.*
+RESET_CONTEXT_SQL = "RESET ROLE; RESET app.current_user_id; RESET app.current_user_role"
+
+
+def reset_connection(conn):
+    # Вызывается пулом при возврате соединения. SET LOCAL запроса
+    # снимается вместе с транзакцией, но контекст на всё соединение
+    # (воркер заданий, прерванное задание) перешёл бы к следующему
+    # запросу. Ошибка здесь — и пул закрывает соединение, а не отдаёт его
+    with conn.transaction():
+        conn.execute(RESET_CONTEXT_SQL)
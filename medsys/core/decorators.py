@@ -1,10 +1,20 @@
 from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
 from django.shortcuts import redirect
 
 def login_required(view_func):
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            if getattr(request, "current_user", None) is None:
+                return redirect("login")
+            return await view_func(request, *args, **kwargs)
+        return async_wrapper
+
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
-        if "user_id" not in request.session:
+        if getattr(request, "current_user", None) is None:
             return redirect("login")
         return view_func(request, *args, **kwargs)
     return wrapper
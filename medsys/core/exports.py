@@ -0,0 +1,124 @@
+import datetime
+import decimal
+
+import openpyxl
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from openpyxl.utils import get_column_letter
+
+from .constants import DOWNLOAD_CHUNK_SIZE, EXPORT_CHUNK_SIZE, EXPORT_MAX_COLUMN_WIDTH
+
+
+def export_fields(model):
+    return [field.attname for field in model._meta.fields]
+
+
+def cell_value(value):
+    if value is None or isinstance(value, (bool, int, float, decimal.Decimal)):
+        return value
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+    if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+        # Excel не поддерживает часовые пояса
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value
+    return str(value)
+
+
+def iter_rows(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    for values in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        yield [cell_value(v) for v in values]
+
+
+def write_sheet(ws, fields, rows, chunk_size=EXPORT_CHUNK_SIZE):
+    # В write-only режиме ширины колонок пишутся до первой строки,
+    # поэтому считаем их по заголовку и первой пачке строк.
+    widths = [len(f) for f in fields]
+    head = []
+    for row in rows:
+        head.append(row)
+        for i, val in enumerate(row):
+            if val is not None:
+                widths[i] = max(widths[i], len(str(val)))
+        if len(head) >= chunk_size:
+            break
+
+    for i, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = min(width, EXPORT_MAX_COLUMN_WIDTH) + 2
+
+    ws.append(fields)
+    for row in head:
+        ws.append(row)
+    for row in rows:
+        ws.append(row)
+
+
+def report_progress(rows, progress, chunk_size):
+    # progress(n) — ещё n строк записано
+    count = 0
+    for row in rows:
+        yield row
+        count += 1
+        if count == chunk_size:
+            progress(count)
+            count = 0
+    if count:
+        progress(count)
+
+
+def write_workbook(fileobj, tables, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    wb = openpyxl.Workbook(write_only=True)
+
+    for table_name, model in tables.items():
+        ws = wb.create_sheet(title=table_name)
+        fields = export_fields(model)
+        rows = iter_rows(model.objects.all(), fields, chunk_size)
+        if progress is not None:
+            rows = report_progress(rows, progress, chunk_size)
+        write_sheet(ws, fields, rows, chunk_size)
+
+    wb.save(fileobj)
+    return fileobj
+
+
+async def aiter_file(fileobj, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    # чтение в пуле потоков: не держит ни цикл событий, ни поток запроса
+    read = sync_to_async(fileobj.read, thread_sensitive=False)
+    try:
+        while chunk := await read(chunk_size):
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def download_response(request, fileobj, filename, content_type):
+    # Под ASGI синхронный итератор FileResponse Django дочитывает в память
+    # целиком, поэтому файл отдаётся асинхронным итератором по блокам
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(aiter_file(fileobj), content_type=content_type)
+        response["Content-Disposition"] = content_disposition_header(True, filename)
+        return response
+    return FileResponse(fileobj, as_attachment=True, filename=filename, content_type=content_type)
+
+
+async def aiterate(iterator):
+    # Шаги синхронного итератора в потоке запроса (thread_sensitive): так
+    # генератор, открывший транзакцию, продолжает её на том же соединении
+    step = sync_to_async(next)
+    try:
+        while (chunk := await step(iterator, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(iterator.close)()
+
+
+def stream_response(request, chunks, filename, content_type):
+    # chunks — генератор байтов; под ASGI отдаётся асинхронно, см. download_response
+    if isinstance(request, ASGIRequest):
+        chunks = aiterate(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = content_disposition_header(True, filename)
+    return response
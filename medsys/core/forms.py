@@ -1,5 +1,6 @@
 # app/forms.py
 from django import forms
+from .imports import IMPORT_TABLES
 from .models import SystemUser, Doctor
 
 
@@ -8,6 +9,22 @@ class LoginForm(forms.Form):
     password = forms.CharField(widget=forms.PasswordInput)
 
 
+class ImportForm(forms.Form):
+    table = forms.ChoiceField(
+        choices=[(name, name) for name in IMPORT_TABLES],
+        widget=forms.Select(attrs={"class": "form-select"})
+    )
+    file = forms.FileField(
+        widget=forms.ClearableFileInput(attrs={"class": "form-control", "accept": ".csv,.xlsx"})
+    )
+
+    def clean_file(self):
+        file = self.cleaned_data.get("file")
+        if file and not file.name.lower().endswith((".csv", ".xlsx")):
+            raise forms.ValidationError("Поддерживаются только файлы CSV и XLSX.")
+        return file
+
+
 class AddAdminForm(forms.ModelForm):
     class Meta:
         model = SystemUser
@@ -0,0 +1,200 @@
+import csv
+import io
+import os
+
+import openpyxl
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connection, models, transaction
+from django.utils import timezone
+
+from .cache import invalidate_rows
+from .constants import IMPORT_BATCH_SIZE
+from .models import Patient, Visit, LabTest, Diagnosis
+
+IMPORT_TABLES = {
+    "patients": Patient,
+    # пересекающиеся визиты врача отсекает ограничение visits_no_overlap:
+    # пачка с таким визитом не записывается целиком
+    "visits": Visit,
+    "lab_tests": LabTest,
+    "diagnoses": Diagnosis,
+}
+
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.errors = []
+
+    def add_error(self, line, field, message):
+        self.errors.append((line, field, message))
+
+
+def import_fields(model):
+    return [f for f in model._meta.concrete_fields if not f.primary_key]
+
+
+def read_rows(fileobj, filename):
+    # (номер строки, {заголовок: значение}) без загрузки файла целиком
+    if os.path.splitext(filename)[1].lower() == ".xlsx":
+        wb = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else "" for h in next(rows, ())]
+        for line, values in enumerate(rows, start=2):
+            if any(v is not None for v in values):
+                yield line, dict(zip(header, values))
+        wb.close()
+    else:
+        if isinstance(fileobj, io.TextIOBase):
+            text = fileobj
+        else:
+            text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+        reader = csv.DictReader(text)
+        for line, row in enumerate(reader, start=2):
+            yield line, row
+
+
+def clean_row(fields, line, raw, result):
+    values = {}
+    for field in fields:
+        value = raw.get(field.name, raw.get(field.attname))
+        if isinstance(value, str):
+            value = value.strip()
+        if value in ("", None):
+            value = None if field.null else field.get_default()
+
+        try:
+            if field.is_relation:
+                # существование внешних ключей проверяется пачкой
+                value = field.target_field.to_python(value)
+                if value is None and not field.null:
+                    raise ValidationError("Обязательное поле.")
+            else:
+                value = field.clean(value, None)
+                if isinstance(field, models.DateTimeField) and value is not None and timezone.is_naive(value):
+                    value = timezone.make_aware(value)
+        except ValidationError as e:
+            result.add_error(line, field.name, "; ".join(e.messages))
+            return None
+        values[field.attname] = value
+    return values
+
+
+def validate_batch(model, fields, batch, result):
+    # FK и уникальность — одним запросом на поле для всей пачки
+    rejected = set()
+
+    for field in fields:
+        if field.is_relation:
+            wanted = {v[field.attname] for _, v in batch if v[field.attname] is not None}
+            existing = set(
+                field.related_model._default_manager
+                .filter(pk__in=wanted)
+                .values_list("pk", flat=True)
+            ) if wanted else set()
+            for line, values in batch:
+                value = values[field.attname]
+                if value is not None and value not in existing:
+                    result.add_error(line, field.name, f"Запись {value} не найдена.")
+                    rejected.add(line)
+
+        elif field.unique:
+            seen = {}
+            for line, values in batch:
+                value = values[field.attname]
+                if value is None:
+                    continue
+                if value in seen:
+                    result.add_error(line, field.name, f"Повтор значения из строки {seen[value]}.")
+                    rejected.add(line)
+                else:
+                    seen[value] = line
+            existing = set(
+                model._default_manager
+                .filter(**{field.attname + "__in": list(seen)})
+                .values_list(field.attname, flat=True)
+            ) if seen else set()
+            for value in existing:
+                result.add_error(seen[value], field.name, f"Значение {value} уже существует.")
+                rejected.add(seen[value])
+
+    return [(line, values) for line, values in batch if line not in rejected]
+
+
+def write_batch(model, fields, rows):
+    columns = [f.attname for f in fields]
+    with connection.cursor() as cursor:
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, "copy"):
+            # psycopg3: COPY заметно быстрее INSERT
+            sql = "COPY {} ({}) FROM STDIN".format(
+                connection.ops.quote_name(model._meta.db_table),
+                ", ".join(connection.ops.quote_name(f.column) for f in fields),
+            )
+            with raw_cursor.copy(sql) as copy:
+                for values in rows:
+                    copy.write_row([values[c] for c in columns])
+            return
+    model.objects.bulk_create([model(**values) for values in rows], batch_size=len(rows))
+
+
+def flush(model, fields, batch, result):
+    rows = validate_batch(model, fields, batch, result)
+    if not rows:
+        return
+    try:
+        with transaction.atomic():
+            write_batch(model, fields, [values for _, values in rows])
+            invalidate_rows(model, [])
+    except DatabaseError as e:
+        for line, _ in rows:
+            result.add_error(line, "", f"Пачка не записана: {e}")
+        return
+    result.imported += len(rows)
+
+
+def import_rows(model, rows, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    # Каждая пачка пишется в своей транзакции (или точке сохранения, если
+    # вызывающий уже открыл транзакцию). progress(rows) — после каждой пачки
+    result = ImportResult()
+    fields = import_fields(model)
+    batch = []
+
+    for line, raw in rows:
+        values = clean_row(fields, line, raw, result)
+        if values is None:
+            continue
+        batch.append((line, values))
+        if len(batch) >= batch_size:
+            flush(model, fields, batch, result)
+            if progress:
+                progress(len(batch))
+            batch = []
+
+    if batch:
+        flush(model, fields, batch, result)
+        if progress:
+            progress(len(batch))
+    result.errors.sort(key=lambda error: error[0])
+    return result
+
+
+def import_file(table, fileobj, filename, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    return import_rows(IMPORT_TABLES[table], read_rows(fileobj, filename), batch_size, progress)
+
+
+def count_rows(fileobj, filename):
+    # оценка числа строк для прогресса задания: у XLSX — по размерам листа
+    if os.path.splitext(filename)[1].lower() == ".xlsx":
+        wb = openpyxl.load_workbook(fileobj, read_only=True)
+        rows = wb.worksheets[0].max_row or 1
+        wb.close()
+    else:
+        rows = sum(chunk.count(b"\n") for chunk in iter(lambda: fileobj.read(1 << 20), b""))
+    return max(rows - 1, 0)
+
+
+def write_errors(out, errors):
+    writer = csv.writer(out)
+    writer.writerow(["line", "field", "error"])
+    writer.writerows(errors)
@@ -0,0 +1,347 @@
+import datetime
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.utils import timezone
+
+from .audit import log_action
+from .cache import get_identity
+from .constants import JOB_LOCK_KEY
+from .exports import write_workbook
+from .imports import IMPORT_TABLES, count_rows, import_file, write_errors
+from .middleware import SessionUser, apply_db_context, reset_db_context
+from .models import Job
+from .pagination import estimate_count
+from .parallel_export import write_workbook_parallel
+from .registry import export_tables
+from .replica import choose_read_alias
+from .routers import read_alias, reads_from
+
+logger = logging.getLogger(__name__)
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_CONTENT_TYPE = "text/csv; charset=utf-8"
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobError(Exception):
+    pass
+
+
+class JobLost(JobError):
+    pass
+
+
+def owned(job):
+    # Строка задания, пока им владеет эта попытка: requeue_stale мог вернуть
+    # задание в очередь, и его уже выполняет другой воркер
+    return Job.objects.filter(id=job.id, status="running", worker=job.worker, attempts=job.attempts)
+
+
+class Progress:
+    # Прогресс пишется в строку задания не чаще раза в JOB_PROGRESS_INTERVAL
+    # секунд и заодно продлевает heartbeat_at: по нему находят задания
+    # упавших воркеров. using — БД, на соединении которой стоит контекст
+    # владельца задания. Если задание отдано другому воркеру, следующий
+    # вызов прерывает выгрузку
+    def __init__(self, job, user=None, total=0, using=DEFAULT_DB_ALIAS):
+        self.job = job
+        self.user = user
+        self.total = total
+        self.using = using
+        self.done = 0
+        self.saved_at = time.monotonic()
+        self.lost = threading.Event()
+
+    def __call__(self, rows):
+        if self.lost.is_set():
+            raise JobLost("Задание передано другому воркеру")
+        self.done += rows
+        if time.monotonic() - self.saved_at >= settings.JOB_PROGRESS_INTERVAL:
+            self.save()
+
+    def percent(self):
+        # оценка объёма приблизительная, 100 ставит только завершение
+        if not self.total:
+            return 0
+        return min(99, self.done * 100 // self.total)
+
+    def save(self):
+        # у ролей пользователей нет UPDATE на jobs: строка задания пишется
+        # под владельцем схемы, контекст владельца задания затем возвращается.
+        # При чтении из реплики соединение primary без контекста
+        shared = self.user is not None and self.using == DEFAULT_DB_ALIAS
+        if shared:
+            reset_db_context()
+        try:
+            if not owned(self.job).update(progress=self.percent(), heartbeat_at=timezone.now()):
+                self.lost.set()
+        finally:
+            if shared:
+                apply_db_context(self.user, local=False)
+        self.saved_at = time.monotonic()
+
+
+class Heartbeat(threading.Thread):
+    # heartbeat_at продлевается и без вызовов Progress: разбивка таблиц на
+    # диапазоны, ожидание больших частей и сборка книги идут дольше
+    # JOB_STALE_SECONDS. У потока своё соединение без контекста RLS
+    def __init__(self, job, lost):
+        super().__init__(name=f"job-{job.id}-heartbeat", daemon=True)
+        self.job = job
+        self.lost = lost
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(settings.JOB_HEARTBEAT_SECONDS):
+                if not owned(self.job).update(heartbeat_at=timezone.now()):
+                    self.lost.set()
+                    return
+        except Exception:
+            logger.exception("Heartbeat задания %s не записан", self.job.id)
+        finally:
+            connections.close_all()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_export_excel(params, path, progress):
+    progress.total = sum(estimate_count(model) for model in export_tables.values())
+    # снимок для процессов пула есть только в PostgreSQL
+    if settings.EXPORT_PROCESSES > 1 and connection.vendor == "postgresql":
+        write_workbook_parallel(path, export_tables, progress.user, progress, using=read_alias.get())
+        return
+    with open(path, "wb") as f:
+        write_workbook(f, export_tables, progress=progress)
+
+
+def upload_dir():
+    return os.path.join(settings.JOB_RESULTS_DIR, "uploads")
+
+
+def save_upload(upload):
+    # файл импорта кладётся рядом с результатами: каталог общий для
+    # веб-процессов и воркеров
+    os.makedirs(upload_dir(), exist_ok=True)
+    path = os.path.join(upload_dir(), uuid.uuid4().hex + os.path.splitext(upload.name)[1].lower())
+    with open(path, "wb") as f:
+        for chunk in upload.chunks():
+            f.write(chunk)
+    return path
+
+
+def run_import_data(params, path, progress):
+    # Вне транзакции запроса каждая пачка коммитится сразу: блокировки и
+    # записанные строки не копятся до конца всего файла. Результат — отчёт
+    # об ошибках в CSV
+    table, upload, filename = params.get("table"), params.get("upload"), params.get("filename", "")
+    if table not in IMPORT_TABLES or not upload:
+        raise JobError("Не указан файл импорта")
+    try:
+        with open(upload, "rb") as f:
+            progress.total = count_rows(f, filename)
+            f.seek(0)
+            result = import_file(table, f, filename, progress=progress)
+    finally:
+        os.remove(upload)
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        write_errors(out, result.errors)
+    log_action(progress.user.id, "import", table, entity_id=progress.job.id,
+               details=f"{filename}: строк {result.imported}, ошибок {len(result.errors)}")
+
+
+class JobKind:
+    # writes — задание пишет в БД и выполняется на primary; retry=False —
+    # брошенное задание не перезапускается (повтор записал бы уже
+    # закоммиченные пачки второй раз)
+    def __init__(self, run, roles, filename, content_type, writes=False, retry=True):
+        self.run = run
+        self.roles = roles
+        self.filename = filename
+        self.content_type = content_type
+        self.writes = writes
+        self.retry = retry
+
+
+JOB_KINDS = {
+    "export_excel": JobKind(run_export_excel, ("admin",), "report.xlsx", XLSX_CONTENT_TYPE),
+    "import_data": JobKind(run_import_data, ("admin",), "import_errors.csv", CSV_CONTENT_TYPE,
+                           writes=True, retry=False),
+}
+
+
+def lock_user_jobs(user_id):
+    # постановка и захват заданий одного пользователя идут по очереди,
+    # поэтому параллельные запросы и воркеры не обходят лимиты
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [JOB_LOCK_KEY, user_id])
+
+
+@transaction.atomic
+def enqueue(user, kind, params=None):
+    spec = JOB_KINDS.get(kind)
+    if spec is None or user.role not in spec.roles:
+        raise JobError("Задание недоступно")
+
+    lock_user_jobs(user.id)
+    active = Job.objects.filter(user_id=user.id, status__in=ACTIVE_STATUSES).count()
+    if active >= settings.JOB_MAX_ACTIVE_PER_USER:
+        raise JobError(f"Не больше {settings.JOB_MAX_ACTIVE_PER_USER} заданий в очереди одновременно")
+    return Job.objects.create(user_id=user.id, kind=kind, params=params or {})
+
+
+def recent_jobs(user_id, limit=10):
+    return Job.objects.filter(user_id=user_id).order_by("-created_at", "-id")[:limit]
+
+
+def serialize_job(job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_job(worker):
+    # FOR UPDATE SKIP LOCKED: воркеры не ждут друг друга и не берут одно
+    # задание дважды. Пользователь, у которого уже выполняется
+    # JOB_MAX_RUNNING_PER_USER заданий, пропускается до следующего круга
+    skipped_users = []
+    while True:
+        with transaction.atomic():
+            job = (Job.objects
+                   .filter(status="queued")
+                   .exclude(user_id__in=skipped_users)
+                   .order_by("created_at", "id")
+                   .select_for_update(skip_locked=True)
+                   .first())
+            if job is None:
+                return None
+
+            lock_user_jobs(job.user_id)
+            running = Job.objects.filter(user_id=job.user_id, status="running").count()
+            if running >= settings.JOB_MAX_RUNNING_PER_USER:
+                skipped_users.append(job.user_id)
+                continue
+
+            now = timezone.now()
+            job.status = "running"
+            job.worker = worker
+            job.attempts += 1
+            job.progress = 0
+            job.started_at = now
+            job.heartbeat_at = now
+            job.save(update_fields=["status", "worker", "attempts", "progress", "started_at", "heartbeat_at"])
+            return job
+
+
+def result_path(job):
+    # у каждой попытки свой файл: брошенная попытка может ещё писать
+    return os.path.join(settings.JOB_RESULTS_DIR, f"{job.id}-{job.attempts}-{JOB_KINDS[job.kind].filename}")
+
+
+def fail_job(job, error):
+    owned(job).update(status="failed", error=error, finished_at=timezone.now())
+
+
+def run_job(job):
+    # Задание выполняется вне транзакции: прогресс сразу виден опросу, а
+    # контекст RLS владельца ставится на всё соединение до конца задания
+    spec = JOB_KINDS.get(job.kind)
+    identity = get_identity(job.user_id)
+    if spec is None or identity is None:
+        fail_job(job, "Задание недоступно")
+        return False
+    user = SessionUser(*identity)
+    if user.role not in spec.roles:
+        fail_job(job, "Задание недоступно")
+        return False
+    if not spec.retry and job.attempts > 1:
+        fail_job(job, "Задание было прервано и не повторяется: часть данных могла быть уже записана")
+        return False
+
+    # Читать из реплики можно, если она отстаёт меньше, чем существует
+    # задание: всё записанное до постановки в очередь там уже есть
+    age = (timezone.now() - job.created_at).total_seconds()
+    using = DEFAULT_DB_ALIAS if spec.writes else choose_read_alias(max_lag=age)
+
+    os.makedirs(settings.JOB_RESULTS_DIR, exist_ok=True)
+    path = result_path(job)
+    partial = path + ".part"
+    progress = Progress(job, user, using=using)
+    heartbeat = Heartbeat(job, progress.lost)
+    heartbeat.start()
+    try:
+        apply_db_context(user, local=False, using=using)
+        try:
+            with reads_from(using):
+                spec.run(job.params, partial, progress)
+        finally:
+            reset_db_context(using)
+        os.replace(partial, path)
+    except Exception as e:
+        if isinstance(e, JobLost):
+            logger.warning("Задание %s передано другому воркеру", job.id)
+        else:
+            logger.exception("Задание %s завершилось ошибкой", job.id)
+        if os.path.exists(partial):
+            os.remove(partial)
+        fail_job(job, str(e)[:1000])
+        return False
+    finally:
+        heartbeat.stop()
+
+    if not owned(job).update(status="done", progress=100, result_path=path, finished_at=timezone.now()):
+        # задание вернули в очередь, пока шла выгрузка: результат у другой попытки
+        logger.warning("Задание %s передано другому воркеру", job.id)
+        os.remove(path)
+        return False
+    return True
+
+
+def requeue_stale():
+    # задания воркеров, которые перестали продлевать heartbeat_at
+    now = timezone.now()
+    stale = Job.objects.filter(status="running",
+                               heartbeat_at__lt=now - datetime.timedelta(seconds=settings.JOB_STALE_SECONDS))
+    failed = stale.filter(attempts__gte=settings.JOB_MAX_ATTEMPTS).update(
+        status="failed", error="Воркер перестал отвечать", finished_at=now)
+    requeued = stale.update(status="queued", worker=None, progress=0)
+    return requeued, failed
+
+
+def expire_results():
+    cutoff = timezone.now() - datetime.timedelta(hours=settings.JOB_RESULT_TTL_HOURS)
+    expired = 0
+    for job in Job.objects.filter(status="done", finished_at__lt=cutoff).only("id", "result_path"):
+        if job.result_path:
+            try:
+                os.remove(job.result_path)
+            except FileNotFoundError:
+                pass
+        Job.objects.filter(id=job.id).update(status="expired", result_path=None)
+        expired += 1
+
+    # файлы импорта брошенных заданий и запросов, откатившихся после загрузки
+    if os.path.isdir(upload_dir()):
+        for entry in os.scandir(upload_dir()):
+            if entry.stat().st_mtime < cutoff.timestamp():
+                os.remove(entry.path)
+    return expired
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.partitions import detach_old_partitions, ensure_partitions
+
+
+class Command(BaseCommand):
+    help = "Создаёт секции action_logs на будущие месяцы и отсоединяет старые в архив"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ahead", type=int, default=settings.ACTION_LOG_PARTITIONS_AHEAD)
+        parser.add_argument("--keep-months", type=int, default=settings.ACTION_LOG_RETENTION_MONTHS)
+        parser.add_argument("--archive-schema", default=settings.ACTION_LOG_ARCHIVE_SCHEMA)
+        parser.add_argument("--no-detach", action="store_true")
+
+    def handle(self, *args, **options):
+        for name in ensure_partitions(options["ahead"]):
+            self.stdout.write(f"Создана секция {name}")
+
+        if options["no_detach"]:
+            return
+        for name in detach_old_partitions(options["keep_months"], options["archive_schema"]):
+            self.stdout.write(f"Секция {name} отсоединена и перенесена в {options['archive_schema']}")
@@ -0,0 +1,102 @@
+import copy
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from core.middleware import DB_CONTEXT_SQL, SessionUser, db_context_params
+from core.models import SystemUser
+
+LEAK_SQL = ("SELECT current_user = session_user,"
+            " coalesce(current_setting('app.current_user_id', true), '') = ''")
+
+
+def add_alias(alias, pool):
+    # копия default с пулом или без: в каждом потоке своё соединение
+    settings_dict = copy.deepcopy(connections["default"].settings_dict)
+    if pool:
+        settings_dict["OPTIONS"]["pool"] = pool
+    else:
+        settings_dict["OPTIONS"].pop("pool", None)
+    connections.settings[alias] = settings_dict
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает задержку запроса с новым соединением на каждый запрос и с пулом "
+            "psycopg; проверяет, что роль и app.* не переходят к следующему запросу")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--user", help="email пользователя для контекста RLS")
+
+    def handle(self, *args, **options):
+        if connections["default"].vendor != "postgresql":
+            raise CommandError("Замер только для PostgreSQL")
+        account = SystemUser.objects.filter(email=options["user"]) if options["user"] else SystemUser.objects
+        account = account.order_by("id").first()
+        if account is None:
+            raise CommandError("Нет пользователя для контекста RLS")
+        user = SessionUser.from_model(account)
+
+        pool = connections["default"].settings_dict["OPTIONS"].get("pool")
+        if not pool:
+            raise CommandError("Пул выключен (DB_POOL=0)")
+        add_alias("bench_direct", None)
+        add_alias("bench_pool", pool if pool is not True else {})
+
+        for alias in ("bench_direct", "bench_pool"):
+            timings, elapsed = self.run(alias, user, options)
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            self.stdout.write(
+                f"{alias}: {len(timings)} запросов за {elapsed:.2f} с, {len(timings) / elapsed:.0f} запросов/с, "
+                f"p50 {statistics.median(timings):.2f} мс, p95 {p95:.2f} мс"
+            )
+
+        leaks = self.check_reset("bench_pool", user, options["requests"] // 10 or 1)
+        self.stdout.write(f"bench_pool: контекст на всё соединение перешёл к следующему запросу {leaks} раз")
+        connections["bench_pool"].close_pool()
+
+    def request(self, alias, user):
+        # как запрос через CurrentUserMiddleware: соединение, транзакция
+        # с SET LOCAL, запрос, закрытие по request_finished
+        started = time.perf_counter()
+        with transaction.atomic(using=alias):
+            with connections[alias].cursor() as cursor:
+                cursor.execute(DB_CONTEXT_SQL, db_context_params(user))
+                cursor.execute("SELECT count(*) FROM system_users")
+                cursor.fetchone()
+        connections[alias].close()
+        return (time.perf_counter() - started) * 1000
+
+    def run(self, alias, user, options):
+        def worker(count):
+            try:
+                return [self.request(alias, user) for _ in range(count)]
+            finally:
+                connections.close_all()
+
+        concurrency = options["concurrency"]
+        counts = [options["requests"] // concurrency] * concurrency
+        counts[0] += options["requests"] % concurrency
+
+        self.request(alias, user)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            started = time.perf_counter()
+            timings = [t for chunk in executor.map(worker, counts) for t in chunk]
+            return timings, time.perf_counter() - started
+
+    def check_reset(self, alias, user, count):
+        # худший случай: контекст поставлен на всё соединение и не снят
+        leaks = 0
+        for _ in range(count):
+            with connections[alias].cursor() as cursor:
+                cursor.execute(LEAK_SQL)
+                if not all(cursor.fetchone()):
+                    leaks += 1
+                cursor.execute(DB_CONTEXT_SQL, db_context_params(user, local=False))
+            connections[alias].close()
+        return leaks
@@ -0,0 +1,75 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from core.models import SystemUser
+from core.passwords import bcrypt_rounds, hash_password
+from core.views import authenticate_user
+
+BENCH_EMAIL = "bench-login@seed.medsys"
+BENCH_PASSWORD = "bench-login-password"
+
+
+def db_crypt_login(email, password):
+    with connection.cursor() as cursor:
+        cursor.execute("""
+                       SELECT id, role
+                       FROM system_users
+                       WHERE email = %s
+                         AND hashed_password = crypt(%s, hashed_password) LIMIT 1
+                       """, [email, password])
+        return cursor.fetchone()
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает пропускную способность входа: crypt() в PostgreSQL и bcrypt в пуле потоков. "
+            "Оба пути проверяют один и тот же хеш с PASSWORD_BCRYPT_ROUNDS раундами у отдельного "
+            "пользователя замера, который в конце удаляется")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=8)
+
+    def handle(self, *args, **options):
+        # потоки замера ходят в БД своими соединениями, поэтому пользователь
+        # коммитится, а не живёт в откатываемой транзакции
+        SystemUser.objects.filter(email=BENCH_EMAIL).delete()
+        hashed = hash_password(BENCH_PASSWORD)
+        user = SystemUser.objects.create(email=BENCH_EMAIL, hashed_password=hashed, role="doctor")
+        try:
+            self.bench(options, hashed)
+        finally:
+            user.delete()
+
+    def bench(self, options, hashed):
+        self.stdout.write(f"bcrypt, раундов: {bcrypt_rounds(hashed)}")
+        paths = {
+            "db_crypt": db_crypt_login,
+            "app_bcrypt": authenticate_user,
+        }
+        for name, login in paths.items():
+            if login(BENCH_EMAIL, BENCH_PASSWORD) is None:
+                self.stderr.write(f"{name}: вход пользователя замера не прошёл")
+                continue
+            elapsed = self.run(login, options)
+            rate = options["logins"] / elapsed
+            self.stdout.write(f"{name}: {options['logins']} входов за {elapsed:.2f} с, {rate:.1f} входов/с")
+
+    def run(self, login, options):
+        def worker(count):
+            try:
+                for _ in range(count):
+                    login(BENCH_EMAIL, BENCH_PASSWORD)
+            finally:
+                connections.close_all()
+
+        concurrency = options["concurrency"]
+        counts = [options["logins"] // concurrency] * concurrency
+        counts[0] += options["logins"] % concurrency
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            started = time.perf_counter()
+            list(pool.map(worker, counts))
+            return time.perf_counter() - started
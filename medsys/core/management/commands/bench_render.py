@@ -0,0 +1,83 @@
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+from django.test import RequestFactory
+
+from core.registry import TABLES, get_table
+
+# разметка строк дашборда до table_rows: get_item на каждую ячейку,
+# {% url %} и {% csrf_token %} на каждую строку
+LEGACY_ROWS = """{% load custom_filters %}
+    {% for row in table_data %}
+    <tr>
+        <td><input type="checkbox" name="row_ids" value="{{ row|get_item:pk_column }}" form="bulk-form"></td>
+        {% for col in columns %}
+        <td>{{ row|get_item:col }}</td>
+        {% endfor %}
+            <td>
+                {% if editable %}
+                    <a href="{% url 'edit_row' table=selected_table row_id=row|get_item:pk_column %}"
+                    class="btn btn-sm btn-warning">Изменить</a>
+                {% endif %}
+                <form method="post" action="{% url 'delete_row' %}" style="display:inline;">
+                    {% csrf_token %}
+                    <input type="hidden" name="table" value="{{ selected_table }}">
+                    <input type="hidden" name="row_id" value="{{ row|get_item:pk_column }}">
+                    <button type="submit" class="btn btn-sm btn-danger">Удалить</button>
+                </form>
+            </td>
+    </tr>
+    {% endfor %}"""
+
+FAST_ROWS = """{% load custom_filters %}
+    {% table_rows table_data selected_table pk_index actions=True editable=editable %}"""
+
+
+def normalize(html):
+    return re.sub(r"\s+", " ", re.sub(r">\s+<", "><", html)).strip()
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает отрисовку строк дашборда: цикл шаблона с get_item по словарям "
+            "и тег table_rows по кортежам values_list")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--table", choices=sorted(TABLES), default="visits")
+        parser.add_argument("--rows", type=int, default=5000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        spec = get_table(options["table"])
+        if spec.render is not None:
+            raise CommandError("Таблица с вычисляемыми колонками: расшифровка исказит замер")
+        pk_name = spec.model._meta.pk.attname
+        queryset = spec.model.objects.order_by(pk_name)[:options["rows"]]
+        dicts = list(queryset.values(*dict.fromkeys([*spec.fields, pk_name])))
+        tuples = spec.display_rows(list(queryset.values_list(*spec.fields)))
+        if not tuples:
+            raise CommandError(f"Таблица {spec.name} пуста")
+
+        request = RequestFactory().get("/dashboard/")
+        context = {"selected_table": spec.name, "columns": spec.columns, "editable": bool(spec.edit_roles),
+                   "pk_column": pk_name, "pk_index": spec.pk_index}
+        legacy = engines["django"].from_string(LEGACY_ROWS)
+        fast = engines["django"].from_string(FAST_ROWS)
+
+        results = {}
+        for name, template, rows in (("get_item", legacy, dicts), ("table_rows", fast, tuples)):
+            timings = []
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                html = template.render({**context, "table_data": rows}, request)
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = (min(timings), html)
+            self.stdout.write(f"{name}: {len(rows)} строк, {min(timings):.1f} мс (лучший из {options['repeat']})")
+
+        legacy_ms, legacy_html = results["get_item"]
+        fast_ms, fast_html = results["table_rows"]
+        # токен CSRF маскируется заново при каждом выводе {% csrf_token %}
+        same = (re.sub(r'name="csrfmiddlewaretoken" value="[^"]*"', "", normalize(legacy_html))
+                == re.sub(r'name="csrfmiddlewaretoken" value="[^"]*"', "", normalize(fast_html)))
+        self.stdout.write(f"ускорение {legacy_ms / fast_ms:.1f}x, разметка {'совпадает' if same else 'РАЗЛИЧАЕТСЯ'}")
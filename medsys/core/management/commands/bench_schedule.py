@@ -0,0 +1,103 @@
+import datetime
+import gc
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Doctor, SystemUser, Visit
+from core.schedule import ScheduleIndex, bump_schedule_version, day_bounds, day_grid, find_free_slots
+
+BENCH_EMAIL = "bench-schedule-{}@seed.medsys"
+
+
+def median(timings):
+    return sorted(timings)[len(timings) // 2]
+
+
+class Command(BaseCommand):
+    help = ("Замеряет поиск свободных слотов на неделю для всей клиники целиком (find_free_slots): "
+            "по прогретому индексу процесса и первый запрос после записи визита, когда индекс "
+            "перечитывается из БД. Синтетические врачи и визиты пишутся в транзакцию, которая "
+            "в конце откатывается")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--doctors", type=int, default=500)
+        parser.add_argument("--days", type=int, default=7)
+        parser.add_argument("--occupancy", type=float, default=0.6)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.bench(options)
+            transaction.set_rollback(True)
+
+    def seed(self, options, start_day):
+        random.seed(0)
+        users = SystemUser.objects.bulk_create([
+            SystemUser(email=BENCH_EMAIL.format(n), hashed_password="-", role="doctor")
+            for n in range(options["doctors"])
+        ])
+        Doctor.objects.bulk_create([
+            Doctor(user=user, license_number=f"BENCH-{user.id}") for user in users
+        ])
+        doctor_ids = [user.id for user in users]
+
+        visits = []
+        for n in range(options["days"]):
+            slots, _ = day_grid(start_day + datetime.timedelta(days=n))
+            duration = datetime.timedelta(minutes=settings.VISIT_DURATION_MINUTES)
+            for doctor_id in doctor_ids:
+                busy_until = slots[0]
+                for slot in slots:
+                    if random.random() < options["occupancy"]:
+                        # часть визитов смещена относительно сетки; пересечения
+                        # не пропустит ограничение visits_no_overlap
+                        shift = random.choice((0, 0, 0, settings.VISIT_DURATION_MINUTES // 3))
+                        visit_date = slot + datetime.timedelta(minutes=shift)
+                        if visit_date < busy_until:
+                            continue
+                        visits.append(Visit(doctor_id=doctor_id, status="scheduled", visit_date=visit_date))
+                        busy_until = visit_date + duration
+        Visit.objects.bulk_create(visits, batch_size=5000)
+        return doctor_ids, len(visits)
+
+    def bench(self, options):
+        start_day = timezone.localdate()
+        days = options["days"]
+        doctor_ids, visits = self.seed(options, start_day)
+        start, end = day_bounds(start_day, days)
+
+        # мусор от генерации данных не должен попадать в замер
+        gc.collect()
+        warm, reload, load, search = [], [], [], []
+        for _ in range(options["repeat"]):
+            # запись визита в любом процессе меняет версию расписания
+            bump_schedule_version()
+            started = time.perf_counter()
+            find_free_slots(doctor_ids, start_day, days)
+            reload.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            result = find_free_slots(doctor_ids, start_day, days)
+            warm.append((time.perf_counter() - started) * 1000)
+
+            # без прогретого индекса: чтение визитов периода и поиск по индексу
+            started = time.perf_counter()
+            index = ScheduleIndex.load(start, end, doctor_ids)
+            loaded = time.perf_counter()
+            index.free_slots_range(doctor_ids, start_day, days)
+            load.append((loaded - started) * 1000)
+            search.append((time.perf_counter() - loaded) * 1000)
+
+        free = sum(len(s) for by_day in result.values() for s in by_day.values())
+        self.stdout.write(
+            f"{options['doctors']} врачей, {days} дн., визитов {visits}, свободных слотов {free}: "
+            f"find_free_slots по прогретому индексу медиана {median(warm):.2f} мс, худшее {max(warm):.2f} мс; "
+            f"после записи визита (перечитывание {settings.SCHEDULE_WARM_DAYS} дн.) медиана "
+            f"{median(reload):.2f} мс; без прогретого индекса: загрузка {median(load):.2f} мс, "
+            f"поиск {median(search):.2f} мс"
+        )
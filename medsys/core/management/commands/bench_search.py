@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.search import SEARCH_SCOPES, search
+
+
+class Command(BaseCommand):
+    help = "Замеряет время поиска по каждой области на текущих данных"
+
+    def add_arguments(self, parser):
+        parser.add_argument("queries", nargs="+")
+        parser.add_argument("--scope", choices=sorted(SEARCH_SCOPES), action="append")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        for scope in options["scope"] or SEARCH_SCOPES:
+            for text in options["queries"]:
+                # первый прогон прогревает кэш страниц и не учитывается
+                found = len(search(scope, text, {})["results"])
+                timings = []
+                for _ in range(options["repeat"]):
+                    started = time.perf_counter()
+                    search(scope, text, {})
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                self.stdout.write(
+                    f"{scope} «{text}»: найдено на странице {found}, "
+                    f"медиана {timings[len(timings) // 2]:.2f} мс, худшее {timings[-1]:.2f} мс"
+                )
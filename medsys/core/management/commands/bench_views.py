@@ -0,0 +1,226 @@
+import http.cookiejar
+import json
+import math
+import re
+import resource
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from core.jobs import claim_job, run_job, worker_name
+from core.models import Medication, SystemUser
+from core.passwords import hash_password
+from core.registry import tables_by_role
+
+BENCH_EMAIL = "bench@seed.medsys"
+BENCH_PASSWORD = "medsys-bench"
+CSRF_INPUT_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))], 2)
+
+
+def summarize(samples):
+    # samples: [(мс, запросов к БД или None, успех)]
+    timings = [ms for ms, _, ok in samples if ok]
+    queries = [q for _, q, ok in samples if ok and q is not None]
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for *_, ok in samples if not ok),
+        "p50_ms": percentile(timings, 0.5),
+        "p99_ms": percentile(timings, 0.99),
+        "mean_ms": round(sum(timings) / len(timings), 2) if timings else None,
+        "queries_per_request": round(sum(queries) / len(queries), 1) if queries else None,
+    }
+
+
+class Command(BaseCommand):
+    help = ("Замеряет login, dashboard, edit_row, delete_row, постановку и выполнение выгрузки "
+            "через тестовый клиент "
+            "или по HTTP (--url) и печатает p50/p99, запросы к БД и пиковую память в JSON")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tables", nargs="*", help="таблицы дашборда, по умолчанию все")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--export-repeat", type=int, default=1)
+        parser.add_argument("--skip-export", action="store_true")
+        # несколько --url (например, один сервер под WSGI, другой под ASGI)
+        # прогоняются по очереди с одинаковой нагрузкой
+        parser.add_argument("--url", action="append", help="адрес запущенного сервера для нагрузки по HTTP")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--duration", type=float, default=30)
+        parser.add_argument("--email", default=BENCH_EMAIL)
+        parser.add_argument("--password", default=BENCH_PASSWORD)
+        parser.add_argument("--output", help="файл для JSON-отчёта, по умолчанию stdout")
+
+    def handle(self, *args, **options):
+        tables = options["tables"] or tables_by_role["admin"]
+        urls = options["url"]
+        if urls and len(urls) > 1:
+            report = {"mode": "http", "runs": [self.run_http(options, tables, url) for url in urls]}
+        elif urls:
+            report = self.run_http(options, tables, urls[0])
+        else:
+            report = self.run_client(options, tables)
+        # ru_maxrss в Linux — килобайты
+        report["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        text = json.dumps(report, ensure_ascii=False, indent=2, default=str)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(text)
+        else:
+            self.stdout.write(text)
+
+    # --- тестовый клиент: в том же процессе, с подсчётом запросов к БД ---
+
+    def ensure_bench_user(self, email, password):
+        user = SystemUser.objects.filter(email=email).first()
+        if user is None:
+            user = SystemUser.objects.create(email=email, hashed_password=hash_password(password),
+                                             full_name="Нагрузочный тест", role="admin")
+        elif user.role != "admin":
+            raise CommandError(f"Пользователь {email} не администратор")
+        return user
+
+    def measure(self, repeat, request):
+        samples = []
+        for i in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = request(i)
+                if response.streaming:
+                    for _ in response.streaming_content:
+                        pass
+                elapsed = (time.perf_counter() - started) * 1000
+            samples.append((elapsed, len(queries), response.status_code < 400))
+        return summarize(samples)
+
+    def measure_export(self, client, repeat):
+        # постановка задания запросом и его выполнение в этом же процессе
+        enqueued, executed = [], []
+        worker = worker_name()
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.post("/export_excel/")
+                elapsed = (time.perf_counter() - started) * 1000
+            enqueued.append((elapsed, len(queries), response.status_code < 400))
+
+            job = claim_job(worker)
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                ok = job is not None and run_job(job)
+                elapsed = (time.perf_counter() - started) * 1000
+            executed.append((elapsed, len(queries), ok))
+        return summarize(enqueued), summarize(executed)
+
+    def run_client(self, options, tables):
+        email, password, repeat = options["email"], options["password"], options["repeat"]
+        self.ensure_bench_user(email, password)
+        client = Client(HTTP_HOST="localhost")
+        credentials = {"email": email, "password": password}
+
+        report = {"mode": "client", "repeat": repeat, "views": {}}
+        views = report["views"]
+        views["login_view"] = self.measure(repeat, lambda i: client.post("/login/", credentials))
+
+        for table in tables:
+            views[f"dashboard?table={table}"] = self.measure(
+                repeat, lambda i, table=table: client.get("/dashboard/", {"table": table}))
+
+        # строки для edit_row/delete_row создаются самим замером
+        edited = Medication.objects.create(name=f"bench-edit-{time.time_ns()}")
+        views["edit_row GET"] = self.measure(
+            repeat, lambda i: client.get(f"/edit_row/medications/{edited.id}/"))
+        views["edit_row POST"] = self.measure(repeat, lambda i: client.post(
+            f"/edit_row/medications/{edited.id}/",
+            {"name": edited.name, "dosage": f"{i} мг", "instruction": "bench"}))
+        edited.delete()
+
+        doomed_ids = [Medication.objects.create(name=f"bench-delete-{time.time_ns()}").id for _ in range(repeat)]
+        views["delete_row"] = self.measure(len(doomed_ids), lambda i: client.post(
+            "/delete_row/", {"table": "medications", "row_id": doomed_ids[i]}))
+
+        if not options["skip_export"]:
+            views["export_excel"], views["export job"] = self.measure_export(client, options["export_repeat"])
+        return report
+
+    # --- HTTP: параллельные клиенты против запущенного сервера ---
+
+    def http_session(self, base, email, password):
+        jar = http.cookiejar.CookieJar()
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+        page = opener.open(urllib.parse.urljoin(base, "/login/")).read().decode()
+        match = CSRF_INPUT_RE.search(page)
+        data = {"email": email, "password": password}
+        if match:
+            data["csrfmiddlewaretoken"] = match.group(1)
+        request = urllib.request.Request(
+            urllib.parse.urljoin(base, "/login/"),
+            data=urllib.parse.urlencode(data).encode(),
+            headers={"Referer": urllib.parse.urljoin(base, "/login/")},
+        )
+        response = opener.open(request)
+        if "/dashboard/" not in response.geturl():
+            raise CommandError("Не удалось войти: проверьте --email и --password")
+        return opener
+
+    def run_http(self, options, tables, base):
+        paths = [(f"dashboard?table={t}", f"/dashboard/?table={urllib.parse.quote(t)}") for t in tables]
+        deadline = time.monotonic() + options["duration"]
+        samples = {name: [] for name, _ in paths}
+        lock = threading.Lock()
+        failures = []
+
+        def worker(offset):
+            try:
+                opener = self.http_session(base, options["email"], options["password"])
+            except Exception as e:
+                failures.append(str(e))
+                return
+            n = offset
+            while time.monotonic() < deadline:
+                name, path = paths[n % len(paths)]
+                n += 1
+                started = time.perf_counter()
+                try:
+                    with opener.open(urllib.parse.urljoin(base, path)) as response:
+                        response.read()
+                        ok = response.status < 400
+                except Exception:
+                    ok = False
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    samples[name].append((elapsed, None, ok))
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options["concurrency"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        if failures and len(failures) == len(threads):
+            raise CommandError(failures[0])
+        total = sum(len(s) for s in samples.values())
+        return {
+            "mode": "http",
+            "url": base,
+            "concurrency": options["concurrency"],
+            "duration_s": round(elapsed, 1),
+            "throughput_rps": round(total / elapsed, 1) if elapsed else None,
+            "login_failures": len(failures),
+            "views": {name: summarize(s) for name, s in samples.items()},
+        }
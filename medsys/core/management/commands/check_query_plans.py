@@ -0,0 +1,100 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import (ActionLog, Diagnosis, LabTest, MedicalRecord,
+                         Patient, Prescription, Visit)
+
+
+def plan_checks():
+    now = timezone.now()
+    return [
+        ("дашборд: первая страница patients",
+         Patient.objects.order_by("created_at", "pk")[:51],
+         "patients_created_idx"),
+        ("дашборд: следующая страница patients",
+         Patient.objects.filter(Q(created_at__gt=now) | Q(created_at=now, pk__gt=1)).order_by("created_at", "pk")[:51],
+         "patients_created_idx"),
+        ("поиск пациента по фамилии",
+         Patient.objects.filter(last_name__icontains="ива"),
+         "patients_last_name_trgm"),
+        ("визиты врача по дате",
+         Visit.objects.filter(doctor_id=1).order_by("visit_date"),
+         "visits_doctor_date_idx"),
+        ("визиты пациента по дате",
+         Visit.objects.filter(alias_id=1).order_by("visit_date"),
+         "visits_alias_date_idx"),
+        ("открытые визиты",
+         Visit.objects.filter(status="scheduled", visit_date__gte=now),
+         "visits_open_status_idx"),
+        ("журнал действий за период",
+         ActionLog.objects.filter(created_at__gte=now - timezone.timedelta(days=1)),
+         "action_logs_created_brin"),
+        ("журнал действий пользователя",
+         ActionLog.objects.filter(user_id=1).order_by("created_at"),
+         "action_logs_user_created_idx"),
+        ("анализы визита", LabTest.objects.filter(visit_id=1), "lab_tests_visit_idx"),
+        ("диагнозы визита", Diagnosis.objects.filter(visit_id=1), "diagnoses_visit_idx"),
+        ("записи визита", MedicalRecord.objects.filter(visit_id=1), "medical_records_visit_idx"),
+        ("назначения визита", Prescription.objects.filter(visit_id=1), "prescriptions_visit_idx"),
+    ]
+
+
+def index_names(node):
+    names = set()
+    if "Index Name" in node:
+        names.add(node["Index Name"])
+    for child in node.get("Plans", ()):
+        names |= index_names(child)
+    return names
+
+
+# action_logs секционирована (0004): в плане видны индексы секций,
+# а ожидаемое имя — у секционированного индекса-родителя (ON ONLY)
+PARENT_INDEXES_SQL = """
+    WITH RECURSIVE chain(oid) AS (
+        SELECT c.oid FROM pg_class c
+        WHERE c.relname = ANY(%s) AND c.relkind IN ('i', 'I') AND pg_table_is_visible(c.oid)
+        UNION
+        SELECT i.inhparent FROM pg_inherits i JOIN chain ON i.inhrelid = chain.oid
+    )
+    SELECT c.relname FROM pg_class c JOIN chain ON c.oid = chain.oid
+"""
+
+
+def with_parent_indexes(names):
+    if not names:
+        return names
+    with connection.cursor() as cursor:
+        cursor.execute(PARENT_INDEXES_SQL, [sorted(names)])
+        return names | {name for name, in cursor.fetchall()}
+
+
+class Command(BaseCommand):
+    help = "Проверяет, что ключевые запросы дашборда и выгрузки используют индексы"
+
+    def handle(self, *args, **options):
+        failed = 0
+        for title, queryset, expected in plan_checks():
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    # на маленьких таблицах планировщик всё равно выберет seq scan,
+                    # проверяем именно пригодность индекса
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+                explained = json.loads(queryset.explain(format="json"))
+            if isinstance(explained, list):
+                explained = explained[0]
+            plan = explained["Plan"]
+
+            used = index_names(plan)
+            if expected in with_parent_indexes(used):
+                self.stdout.write(f"OK    {title}: {expected}")
+            else:
+                failed += 1
+                self.stdout.write(f"FAIL  {title}: ожидался {expected}, использованы {sorted(used) or 'нет индексов'}")
+
+        if failed:
+            raise CommandError(f"Запросов без ожидаемого индекса: {failed}")
@@ -0,0 +1,52 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.copy_export import FORMATS, stream_table
+from core.middleware import SessionUser
+from core.models import SystemUser
+from core.registry import TABLES, get_table
+from core.replica import choose_read_alias
+
+
+class Command(BaseCommand):
+    help = ("Выгружает таблицу в CSV или JSON Lines через COPY ... TO STDOUT. "
+            "С --user — с правами и контекстом RLS этого пользователя")
+
+    def add_arguments(self, parser):
+        parser.add_argument("table", choices=sorted(TABLES))
+        parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--output", help="файл (по умолчанию stdout)")
+        parser.add_argument("--gzip", action="store_true", help="сжимать gzip")
+        parser.add_argument("--user", help="email пользователя, от имени которого идёт выгрузка")
+
+    def handle(self, *args, **options):
+        user = None
+        spec = get_table(options["table"])
+        if options["user"]:
+            account = SystemUser.objects.filter(email=options["user"]).first()
+            if account is None:
+                raise CommandError(f"Пользователь {options['user']} не найден")
+            user = SessionUser.from_model(account)
+            spec = get_table(options["table"], user.role)
+            if spec is None:
+                raise CommandError(f"Таблица {options['table']} недоступна роли {user.role}")
+
+        # реплика, если она не отстаёт больше REPLICA_MAX_LAG_SECONDS
+        using = choose_read_alias()
+        out = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        written = 0
+        started = time.perf_counter()
+        try:
+            for chunk in stream_table(spec.model, options["format"], user, options["gzip"], using):
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            if options["output"]:
+                out.close()
+        elapsed = time.perf_counter() - started
+
+        rate = written / elapsed / 1024 / 1024 if elapsed else 0
+        self.stderr.write(f"{options['table']} ({using}): {written / 1024 / 1024:.1f} МБ за {elapsed:.2f} с "
+                          f"({rate:.0f} МБ/с)")
@@ -0,0 +1,42 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.constants import IMPORT_BATCH_SIZE
+from core.imports import IMPORT_TABLES, import_file, write_errors
+
+
+class Command(BaseCommand):
+    help = "Массовый импорт CSV/XLSX в patients, visits, lab_tests или diagnoses"
+
+    def add_arguments(self, parser):
+        parser.add_argument("table", choices=sorted(IMPORT_TABLES))
+        parser.add_argument("path")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument("--errors", help="CSV-файл для отчёта об ошибках (по умолчанию stderr)")
+
+    def handle(self, *args, **options):
+        try:
+            fileobj = open(options["path"], "rb")
+        except OSError as e:
+            raise CommandError(e)
+
+        started = time.perf_counter()
+        with fileobj:
+            result = import_file(options["table"], fileobj, options["path"], options["batch_size"])
+        elapsed = time.perf_counter() - started
+
+        if result.errors:
+            if options["errors"]:
+                with open(options["errors"], "w", newline="", encoding="utf-8") as out:
+                    write_errors(out, result.errors)
+            else:
+                write_errors(sys.stderr, result.errors)
+
+        rate = result.imported / elapsed if elapsed else 0
+        self.stdout.write(
+            f"Импортировано {result.imported} строк, ошибок: {len(result.errors)}, "
+            f"{elapsed:.2f} с ({rate:.0f} строк/с)"
+        )
+
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.changes import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = "Удаляет из deleted_rows отметки об удалении старше срока хранения ленты изменений"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.CHANGES_TOMBSTONE_DAYS)
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones(options["days"])
+        self.stdout.write(f"Удалено отметок: {deleted}")
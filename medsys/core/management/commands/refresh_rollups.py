@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.analytics import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = ("Инкрементально обновляет витрины аналитики по отметкам id; --full пересобирает "
+            "их по всей истории (правки и удаления старых строк), блокируя запись в исходные "
+            "таблицы на время пересборки")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = refresh_rollups(full=options["full"])
+        elapsed = time.perf_counter() - started
+        summary = ", ".join(f"{name}: {rows}" for name, rows in result.items())
+        self.stdout.write(f"Обновлено строк витрин — {summary} ({elapsed:.2f} с)")
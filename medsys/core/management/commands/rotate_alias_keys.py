@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.crypto import create_key, key_cache, rotate_aliases
+from core.models import Alias, EncryptionKey
+
+
+class Command(BaseCommand):
+    help = ("Создаёт новый ключ шифрования и перешифровывает им псевдонимы пациентов; "
+            "--key продолжает перешифровку уже созданным ключом")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=None)
+        parser.add_argument("--key", type=int, help="id активного ключа прошлого запуска")
+
+    def handle(self, *args, **options):
+        if options["key"]:
+            new_key = EncryptionKey.objects.filter(id=options["key"]).first()
+            if new_key is None or not new_key.is_active:
+                raise CommandError(f"Активный ключ {options['key']} не найден")
+            self.stdout.write(f"Продолжение с ключом: {new_key.id}")
+        else:
+            with transaction.atomic():
+                new_key = create_key()
+                EncryptionKey.objects.exclude(id=new_key.id).update(is_active=False)
+            key_cache.clear()
+            self.stdout.write(f"Новый ключ: {new_key.id}")
+
+        started = time.perf_counter()
+
+        def progress(rotated):
+            rate = rotated / (time.perf_counter() - started)
+            self.stdout.write(f"  перешифровано {rotated} ({rate:.0f} псевдонимов/с)")
+
+        rotated, failed = rotate_aliases(new_key, options["chunk_size"], progress)
+        elapsed = time.perf_counter() - started
+        rate = rotated / elapsed if elapsed else 0
+        self.stdout.write(f"Готово: {rotated} псевдонимов за {elapsed:.2f} с ({rate:.0f} псевдонимов/с)")
+
+        # нерасшифрованные и занятые другими транзакциями строки
+        remaining = Alias.objects.exclude(key_id=new_key.id).count()
+        if failed:
+            self.stdout.write(self.style.WARNING(f"Не расшифровано старым ключом: {failed}"))
+        if remaining:
+            self.stdout.write(self.style.WARNING(
+                f"На старых ключах осталось {remaining} псевдонимов, повторный запуск: "
+                f"rotate_alias_keys --key {new_key.id}"
+            ))
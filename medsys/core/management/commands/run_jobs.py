@@ -0,0 +1,55 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.jobs import claim_job, expire_results, requeue_stale, run_job, worker_name
+
+# как часто воркер возвращает зависшие задания и удаляет старые файлы
+MAINTENANCE_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = ("Воркер очереди заданий: берёт задания из таблицы jobs (SKIP LOCKED) и пишет "
+            "результаты в JOB_RESULTS_DIR. Для параллельной работы запускается несколько воркеров")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="выполнить очередь и выйти")
+        parser.add_argument("--poll", type=float, help="пауза при пустой очереди, с")
+
+    def handle(self, *args, **options):
+        poll = options["poll"] or settings.JOB_POLL_SECONDS
+        worker = worker_name()
+        self.stopping = False
+        # SIGTERM дожидается конца текущего задания
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        maintained_at = 0
+        while not self.stopping:
+            close_old_connections()
+            if time.monotonic() - maintained_at >= MAINTENANCE_INTERVAL:
+                requeued, failed = requeue_stale()
+                expired = expire_results()
+                if requeued or failed or expired:
+                    self.stdout.write(f"Возвращено в очередь: {requeued}, отменено: {failed}, "
+                                      f"удалено результатов: {expired}")
+                maintained_at = time.monotonic()
+
+            job = claim_job(worker)
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(poll)
+                continue
+
+            started = time.perf_counter()
+            ok = run_job(job)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"Задание {job.id} ({job.kind}): "
+                              f"{'готово' if ok else 'ошибка'} за {elapsed:.1f} с")
+
+    def stop(self, signum, frame):
+        self.stopping = True
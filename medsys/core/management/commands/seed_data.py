@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.seed import SEED_PASSWORD, Seeder
+
+
+class Command(BaseCommand):
+    help = "Заполняет БД синтетическими данными для нагрузочных замеров"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--patients", type=int, default=1_000_000)
+        parser.add_argument("--visits-per-patient", type=int, default=5)
+        parser.add_argument("--doctors", type=int, default=500)
+        parser.add_argument("--medications", type=int, default=2000)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options["doctors"] < 1:
+            raise CommandError("Нужен хотя бы один врач")
+
+        started = time.perf_counter()
+
+        def progress(written):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"пациентов {written['patients']}, визитов {written['visits']} ({elapsed:.0f} с)")
+
+        seeder = Seeder(
+            patients=options["patients"],
+            visits_per_patient=options["visits_per_patient"],
+            doctors=options["doctors"],
+            medications=options["medications"],
+            batch_size=options["batch_size"],
+            seed=options["seed"],
+            progress=progress,
+        )
+        written = seeder.run()
+        for table, count in written.items():
+            self.stdout.write(f"{table}: {count}")
+        self.stdout.write(f"Готово за {time.perf_counter() - started:.1f} с, пароль врачей: {SEED_PASSWORD}")
@@ -0,0 +1,230 @@
+import bisect
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .cache import cache_stats
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FINGERPRINT_RULES = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    # списки IN (%s, %s, ...) любой длины дают один отпечаток
+    (re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)"), "(...)"),
+    (re.compile(r"\s+"), " "),
+)
+
+
+def fingerprint(sql):
+    for pattern, replacement in FINGERPRINT_RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint_id(text):
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class QueryTimer:
+    # Обёртка connection.execute_wrapper: число и время запросов одного
+    # HTTP-запроса; медленные копятся до конца запроса, когда уже известно
+    # представление, и попадают в выборку с отпечатком SQL
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.time += elapsed
+            if elapsed * 1000 >= settings.METRICS_SLOW_QUERY_MS:
+                self.slow.append((sql, elapsed))
+
+
+class MetricsRegistry:
+    # Метрики процесса; каждый воркер отдаёт свои, суммирует Prometheus
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}
+        self.sampled = {}
+        self.queries = {}
+        self.query_time = {}
+        self.slow = {}
+        self.slow_samples = deque(maxlen=settings.METRICS_SLOW_QUERY_SAMPLES)
+
+    def request(self, view, elapsed, timer=None):
+        with self._lock:
+            histogram = self.latency.get(view)
+            if histogram is None:
+                histogram = self.latency[view] = Histogram()
+            histogram.observe(elapsed)
+            if timer is not None:
+                self.sampled[view] = self.sampled.get(view, 0) + 1
+                self.queries[view] = self.queries.get(view, 0) + timer.count
+                self.query_time[view] = self.query_time.get(view, 0.0) + timer.time
+        if timer is not None:
+            for sql, query_elapsed in timer.slow:
+                self.slow_query(view, sql, query_elapsed)
+
+    def slow_query(self, view, sql, elapsed):
+        text = fingerprint(sql)
+        key = (view, fingerprint_id(text))
+        with self._lock:
+            count, total, _ = self.slow.get(key, (0, 0.0, text))
+            self.slow[key] = (count + 1, total + elapsed, text)
+            self.slow_samples.append({
+                "view": view,
+                "fingerprint": key[1],
+                "sql": text,
+                "ms": round(elapsed * 1000, 2),
+                "at": time.time(),
+            })
+
+    def slow_queries(self):
+        with self._lock:
+            fingerprints = [
+                {"view": view, "fingerprint": fid, "sql": text, "count": count,
+                 "total_ms": round(total * 1000, 2)}
+                for (view, fid), (count, total, text) in self.slow.items()
+            ]
+            samples = list(self.slow_samples)
+        fingerprints.sort(key=lambda item: item["total_ms"], reverse=True)
+        return {"fingerprints": fingerprints, "samples": samples}
+
+    def render(self):
+        # текстовый формат экспозиции Prometheus
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP medsys_request_duration_seconds Время обработки запроса по представлениям",
+                "# TYPE medsys_request_duration_seconds histogram",
+            ]
+            for view, histogram in sorted(self.latency.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'medsys_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                lines.append(f'medsys_request_duration_seconds_bucket{{view="{view}",le="+Inf"}} {histogram.count}')
+                lines.append(f'medsys_request_duration_seconds_sum{{view="{view}"}} {histogram.sum:.6f}')
+                lines.append(f'medsys_request_duration_seconds_count{{view="{view}"}} {histogram.count}')
+
+            for name, kind, help_text, values in (
+                ("medsys_sampled_requests_total", "counter", "Запросы с замером обращений к БД", self.sampled),
+                ("medsys_db_queries_total", "counter", "Запросы к БД в замеренных запросах", self.queries),
+                ("medsys_db_query_seconds_total", "counter", "Время запросов к БД в замеренных запросах", self.query_time),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                for view, value in sorted(values.items()):
+                    lines.append(f'{name}{{view="{view}"}} {value}')
+
+            lines += [
+                "# HELP medsys_slow_queries_total Медленные запросы по отпечаткам SQL",
+                "# TYPE medsys_slow_queries_total counter",
+            ]
+            for (view, fid), (count, _, _) in sorted(self.slow.items()):
+                lines.append(f'medsys_slow_queries_total{{view="{view}",fingerprint="{fid}"}} {count}')
+
+        lines += [
+            "# HELP medsys_cache_requests_total Обращения к кешу core.cache по уровням",
+            "# TYPE medsys_cache_requests_total counter",
+        ]
+        for name, stats in sorted(cache_stats().items()):
+            for level in ("local", "shared", "miss"):
+                lines.append(f'medsys_cache_requests_total{{cache="{name}",result="{level}"}} {stats[level]}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+# Таймер ставится на все псевдонимы: чтения через ReplicaRouter идут в
+# реплику, и без этого они выпадают из замера
+def install_timer(timer):
+    for alias in connections:
+        connections[alias].execute_wrappers.append(timer)
+
+
+def remove_timer(timer):
+    for alias in connections:
+        connections[alias].execute_wrappers.remove(timer)
+
+
+def view_name(request):
+    match = request.resolver_match
+    return match.url_name if match and match.url_name else "unmatched"
+
+
+class MetricsMiddleware:
+    # Время ответа пишется для каждого запроса (perf_counter и блокировка),
+    # запросы к БД — только для доли METRICS_SAMPLE_RATE.
+    # Для потоковых ответов (выгрузка) это время до начала отдачи файла.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        timer = None
+        started = time.perf_counter()
+        if random.random() < settings.METRICS_SAMPLE_RATE:
+            timer = QueryTimer()
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(timer))
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        metrics.request(view_name(request), elapsed, timer)
+        return response
+
+    async def __acall__(self, request):
+        # обёртка ставится на соединение потока, в котором идут запросы к БД
+        # этого ASGI-запроса, а не на поток цикла событий
+        timer = None
+        started = time.perf_counter()
+        if random.random() < settings.METRICS_SAMPLE_RATE:
+            timer = QueryTimer()
+            await sync_to_async(install_timer)(timer)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(remove_timer)(timer)
+        else:
+            response = await self.get_response(request)
+        elapsed = time.perf_counter() - started
+        metrics.request(view_name(request), elapsed, timer)
+        return response
@@ -0,0 +1,128 @@
+import sys
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .cache import get_identity
+from .constants import DB_ROLES
+from .dbpool import RESET_CONTEXT_SQL
+from .routers import pin_primary
+
+# запросы этих методов ничего не пишут и не привязывают сессию к primary
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class SessionUser:
+    def __init__(self, id, role, full_name=None, email=None):
+        self.id = id
+        self.role = role
+        self.full_name = full_name
+        self.email = email
+
+    @classmethod
+    def from_model(cls, user):
+        return cls(user.id, user.role, user.full_name, user.email)
+
+
+def remember_user(request, user):
+    request.session["user_id"] = user.id
+    request.session["user_role"] = user.role
+
+
+def get_session_user(request):
+    user_id = request.session.get("user_id")
+    if not user_id:
+        return None
+
+    # данные пользователя из двухуровневого кеша: смена роли или удаление
+    # сбрасывают запись сигналом, и сессия сразу видит актуальную роль
+    identity = get_identity(user_id)
+    if identity is None:
+        request.session.flush()
+        return None
+    return SessionUser(*identity)
+
+
+DB_CONTEXT_SQL = (
+    "SELECT set_config('app.current_user_id', %s, %s),"
+    " set_config('app.current_user_role', %s, %s),"
+    " set_config('role', %s, %s)"
+)
+
+
+def db_context_params(user, local=True):
+    return [str(user.id), local, user.role, local, DB_ROLES.get(user.role, DB_ROLES["doctor"]), local]
+
+
+def apply_db_context(user, local=True, using=DEFAULT_DB_ALIAS):
+    # SET LOCAL для id, роли приложения и роли БД за один запрос;
+    # всё сбрасывается в конце транзакции. local=False ставит их на всё
+    # соединение (воркер заданий), сброс — reset_db_context
+    with connections[using].cursor() as cursor:
+        cursor.execute(DB_CONTEXT_SQL, db_context_params(user, local))
+
+
+def reset_db_context(using=DEFAULT_DB_ALIAS):
+    with connections[using].cursor() as cursor:
+        cursor.execute(RESET_CONTEXT_SQL)
+
+
+def begin_request(atomic, user, using=DEFAULT_DB_ALIAS):
+    atomic.__enter__()
+    try:
+        apply_db_context(user, using=using)
+    except BaseException:
+        atomic.__exit__(*sys.exc_info())
+        raise
+
+
+class CurrentUserMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        user = get_session_user(request)
+        request.current_user = user
+
+        if user is None:
+            return self.get_response(request)
+
+        if request.method not in READ_METHODS:
+            pin_primary(request)
+        with transaction.atomic():
+            apply_db_context(user)
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        user = await sync_to_async(get_session_user)(request)
+        request.current_user = user
+
+        if user is None:
+            return await self.get_response(request)
+
+        # сессия уже загружена get_session_user, запись ключа не идёт в БД
+        if request.method not in READ_METHODS:
+            pin_primary(request)
+
+        # atomic() нельзя держать вокруг корутины, но все синхронные и
+        # ORM-вызовы одного ASGI-запроса выполняются в одном потоке
+        # (thread_sensitive), поэтому транзакция с SET LOCAL открывается
+        # и закрывается в этом потоке вручную и покрывает все запросы к БД
+        atomic = transaction.atomic()
+        await sync_to_async(begin_request)(atomic, user)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            await sync_to_async(atomic.__exit__)(*sys.exc_info())
+            raise
+        await sync_to_async(atomic.__exit__)(None, None, None)
+        return response
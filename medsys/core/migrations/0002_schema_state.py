@@ -0,0 +1,221 @@
+# Generated by Django 6.0 on 2026-10-17 22:24
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    # Таблицы создаются внешней схемой БД (роли, триггеры, pgcrypto),
+    # поэтому модели переносятся только в состояние миграций.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='SystemUser',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('email', models.EmailField(max_length=254, unique=True, validators=[django.core.validators.RegexValidator(regex='^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\\.[A-Za-z]{2,}$')])),
+                        ('hashed_password', models.TextField()),
+                        ('full_name', models.TextField(blank=True, null=True)),
+                        ('role', models.CharField(choices=[('doctor', 'Doctor'), ('admin', 'Admin')], max_length=20)),
+                        ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                        ('updated_at', models.DateTimeField(auto_now=True)),
+                    ],
+                    options={
+                        'verbose_name': 'Пользователь системы',
+                        'verbose_name_plural': 'Пользователи системы',
+                        'db_table': 'system_users',
+                        'ordering': ['role'],
+                    },
+                ),
+                migrations.CreateModel(
+                    name='EncryptionKey',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('key_value', models.BinaryField()),
+                        ('is_active', models.BooleanField(default=True)),
+                        ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                    ],
+                    options={
+                        'db_table': 'encryption_keys',
+                    },
+                ),
+                migrations.CreateModel(
+                    name='Medication',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('name', models.TextField(unique=True)),
+                        ('dosage', models.TextField(blank=True, null=True)),
+                        ('instruction', models.TextField(blank=True, null=True)),
+                        ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                    ],
+                    options={
+                        'db_table': 'medications',
+                    },
+                ),
+                migrations.CreateModel(
+                    name='Patient',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('first_name', models.TextField(blank=True, null=True)),
+                        ('last_name', models.TextField(blank=True, null=True)),
+                        ('birth_date', models.DateField(blank=True, null=True)),
+                        ('phone', models.TextField(blank=True, null=True, unique=True, validators=[django.core.validators.RegexValidator(regex='^\\+?\\d{1,3}?[-\\s]?\\(?\\d{1,4}?\\)?[-\\s]?\\d{3,4}[-\\s]?\\d{2,4}$')])),
+                        ('email', models.EmailField(blank=True, max_length=254, null=True, unique=True)),
+                        ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                    ],
+                    options={
+                        'verbose_name': 'Пациент',
+                        'verbose_name_plural': 'Пациенты',
+                        'db_table': 'patients',
+                        'ordering': ['created_at'],
+                    },
+                ),
+                migrations.CreateModel(
+                    name='Prescription',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('adjustments', models.TextField(blank=True, null=True)),
+                        ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                    ],
+                    options={
+                        'db_table': 'prescriptions',
+                    },
+                ),
+                migrations.CreateModel(
+                    name='Doctor',
+                    fields=[
+                        ('user', models.OneToOneField(db_column='id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='core.systemuser')),
+                        ('first_name', models.TextField(blank=True, null=True)),
+                        ('last_name', models.TextField(blank=True, null=True)),
+                        ('specialization', models.TextField(blank=True, null=True)),
+                        ('license_number', models.TextField(unique=True)),
+                        ('phone', models.TextField(blank=True, null=True, unique=True, validators=[django.core.validators.RegexValidator(regex='^\\+?\\d{1,3}?[-\\s]?\\(?\\d{1,4}?\\)?[-\\s]?\\d{3,4}[-\\s]?\\d{2,4}$')])),
+                        ('email', models.EmailField(blank=True, max_length=254, null=True, unique=True)),
+                        ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                    ],
+                    options={
+                        'verbose_name': 'Врач',
+                        'db_table': 'doctors',
+                        'ordering': ['created_at'],
+                    },
+                ),
+                migrations.CreateModel(
+                    name='ActionLog',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('action_type', models.TextField()),
+                        ('entity', models.TextField()),
+                        ('entity_id', models.IntegerField(blank=True, null=True)),
+                        ('details', models.TextField(blank=True, null=True)),
+                        ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                        ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.systemuser')),
+                    ],
+                    options={
+                        'db_table': 'action_logs',
+                    },
+                ),
+                migrations.CreateModel(
+                    name='Alias',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('encrypted_data', models.TextField()),
+                        ('iv', models.BinaryField()),
+                        ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                        ('key', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='core.encryptionkey')),
+                        ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='alias', to='core.patient')),
+                    ],
+                    options={
+                        'verbose_name': 'Псевдоним пациента',
+                        'db_table': 'aliases',
+                        'ordering': ['patient_id'],
+                    },
+                ),
+                migrations.CreateModel(
+                    name='PrescriptionMedication',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('medication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.medication')),
+                        ('prescription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.prescription')),
+                    ],
+                    options={
+                        'db_table': 'prescription_medications',
+                        'unique_together': {('prescription', 'medication')},
+                    },
+                ),
+                migrations.AddField(
+                    model_name='prescription',
+                    name='medications',
+                    field=models.ManyToManyField(through='core.PrescriptionMedication', to='core.medication'),
+                ),
+                migrations.CreateModel(
+                    name='Visit',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('visit_date', models.DateTimeField()),
+                        ('reason', models.TextField(blank=True, null=True)),
+                        ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                        ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                        ('alias', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.alias')),
+                        ('doctor', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.doctor')),
+                    ],
+                    options={
+                        'db_table': 'visits',
+                    },
+                ),
+                migrations.AddField(
+                    model_name='prescription',
+                    name='visit',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.visit'),
+                ),
+                migrations.CreateModel(
+                    name='MedicalRecord',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('record_type', models.TextField()),
+                        ('content', models.TextField()),
+                        ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                        ('visit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.visit')),
+                    ],
+                    options={
+                        'db_table': 'medical_records',
+                    },
+                ),
+                migrations.CreateModel(
+                    name='LabTest',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('test_type', models.TextField()),
+                        ('ordered_at', models.DateTimeField(default=django.utils.timezone.now)),
+                        ('result', models.TextField(blank=True, null=True)),
+                        ('result_at', models.DateTimeField(blank=True, null=True)),
+                        ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                        ('visit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.visit')),
+                    ],
+                    options={
+                        'db_table': 'lab_tests',
+                    },
+                ),
+                migrations.CreateModel(
+                    name='Diagnosis',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('icd_code', models.TextField()),
+                        ('description', models.TextField(blank=True, null=True)),
+                        ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                        ('visit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.visit')),
+                    ],
+                    options={
+                        'db_table': 'diagnoses',
+                    },
+                ),
+            ],
+        ),
+    ]
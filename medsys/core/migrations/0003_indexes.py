@@ -0,0 +1,67 @@
+# Generated by Django 6.0 on 2026-10-17 22:24
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY не работает внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('core', '0002_schema_state'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='actionlog',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['created_at'], name='action_logs_created_brin'),
+        ),
+        AddIndexConcurrently(
+            model_name='actionlog',
+            index=models.Index(fields=['user', 'created_at'], name='action_logs_user_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='diagnosis',
+            index=models.Index(fields=['visit', 'created_at'], name='diagnoses_visit_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='labtest',
+            index=models.Index(fields=['visit', 'created_at'], name='lab_tests_visit_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='medicalrecord',
+            index=models.Index(fields=['visit', 'created_at'], name='medical_records_visit_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='patient',
+            index=models.Index(fields=['created_at', 'id'], name='patients_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['last_name'], name='patients_last_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['first_name'], name='patients_first_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='prescription',
+            index=models.Index(fields=['visit', 'created_at'], name='prescriptions_visit_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='visit',
+            index=models.Index(fields=['doctor', 'visit_date'], name='visits_doctor_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='visit',
+            index=models.Index(fields=['alias', 'visit_date'], name='visits_alias_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='visit',
+            index=models.Index(condition=models.Q(('status__in', ['scheduled', 'in_progress'])), fields=['status', 'visit_date'], name='visits_open_status_idx'),
+        ),
+    ]
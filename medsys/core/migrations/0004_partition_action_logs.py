@@ -0,0 +1,97 @@
+from django.db import migrations
+
+# Переводит action_logs на секционирование по месяцам created_at.
+# Существующая таблица становится секцией action_logs_legacy для всех
+# строк до конца текущего месяца, новые месяцы создаются core.partitions.
+PARTITION_SQL = """
+DO $$
+DECLARE
+    upper_bound timestamptz;
+    pkey text;
+    next_id bigint;
+    g record;
+    p record;
+BEGIN
+    -- строка без created_at не попадёт ни в одну секцию, и ATTACH ниже
+    -- упадёт с невнятной ошибкой; журнал не заполняется выдуманным временем,
+    -- поэтому миграция останавливается до любых изменений
+    IF EXISTS (SELECT 1 FROM action_logs WHERE created_at IS NULL) THEN
+        RAISE EXCEPTION 'action_logs: % строк без created_at',
+            (SELECT count(*) FROM action_logs WHERE created_at IS NULL)
+            USING HINT = 'Заполните created_at (например, временем соседних записей) или удалите эти строки и повторите migrate';
+    END IF;
+
+    ALTER TABLE action_logs RENAME TO action_logs_legacy;
+    ALTER INDEX action_logs_created_brin RENAME TO action_logs_legacy_created_brin;
+    ALTER INDEX action_logs_user_created_idx RENAME TO action_logs_legacy_user_created_idx;
+
+    SELECT conname INTO pkey FROM pg_constraint
+    WHERE conrelid = 'action_logs_legacy'::regclass AND contype = 'p';
+    EXECUTE format('ALTER TABLE action_logs_legacy DROP CONSTRAINT %I', pkey);
+    -- ключ (id, created_at) родителя требует NOT NULL и у секции
+    ALTER TABLE action_logs_legacy ALTER COLUMN created_at SET NOT NULL;
+
+    CREATE TABLE action_logs (
+        LIKE action_logs_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+    ) PARTITION BY RANGE (created_at);
+
+    -- собственная последовательность, чтобы не зависеть от legacy-таблицы
+    SELECT COALESCE(max(id), 0) + 1 INTO next_id FROM action_logs_legacy;
+    ALTER TABLE action_logs_legacy ALTER COLUMN id DROP IDENTITY IF EXISTS;
+    CREATE SEQUENCE action_logs_part_id_seq AS bigint OWNED BY action_logs.id;
+    PERFORM setval('action_logs_part_id_seq', next_id, false);
+    ALTER TABLE action_logs ALTER COLUMN id SET DEFAULT nextval('action_logs_part_id_seq');
+
+    ALTER TABLE action_logs ADD PRIMARY KEY (id, created_at);
+    ALTER TABLE action_logs ADD CONSTRAINT action_logs_user_id_fk
+        FOREIGN KEY (user_id) REFERENCES system_users (id)
+        ON DELETE SET NULL DEFERRABLE INITIALLY DEFERRED;
+    CREATE INDEX action_logs_created_brin ON ONLY action_logs USING brin (created_at);
+    CREATE INDEX action_logs_user_created_idx ON ONLY action_logs (user_id, created_at);
+
+    SELECT date_trunc('month', greatest(max(created_at), now())) + interval '1 month'
+    INTO upper_bound FROM action_logs_legacy;
+    EXECUTE format(
+        'ALTER TABLE action_logs ATTACH PARTITION action_logs_legacy FOR VALUES FROM (MINVALUE) TO (%L)',
+        upper_bound
+    );
+    ALTER INDEX action_logs_created_brin ATTACH PARTITION action_logs_legacy_created_brin;
+    ALTER INDEX action_logs_user_created_idx ATTACH PARTITION action_logs_legacy_user_created_idx;
+
+    -- права и политики RLS переносятся со старой таблицы
+    FOR g IN
+        SELECT grantee, privilege_type FROM information_schema.role_table_grants
+        WHERE table_name = 'action_logs_legacy' AND grantee <> current_user
+    LOOP
+        EXECUTE format('GRANT %s ON action_logs TO %I', g.privilege_type, g.grantee);
+        IF g.privilege_type = 'INSERT' THEN
+            EXECUTE format('GRANT USAGE ON SEQUENCE action_logs_part_id_seq TO %I', g.grantee);
+        END IF;
+    END LOOP;
+
+    IF (SELECT relrowsecurity FROM pg_class WHERE oid = 'action_logs_legacy'::regclass) THEN
+        ALTER TABLE action_logs ENABLE ROW LEVEL SECURITY;
+    END IF;
+    FOR p IN SELECT * FROM pg_policies WHERE tablename = 'action_logs_legacy' LOOP
+        EXECUTE format(
+            'CREATE POLICY %I ON action_logs AS %s FOR %s TO %s%s%s',
+            p.policyname, p.permissive, p.cmd,
+            array_to_string(p.roles, ', '),
+            CASE WHEN p.qual IS NOT NULL THEN ' USING (' || p.qual || ')' ELSE '' END,
+            CASE WHEN p.with_check IS NOT NULL THEN ' WITH CHECK (' || p.with_check || ')' ELSE '' END
+        );
+    END LOOP;
+END
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(PARTITION_SQL),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 6.0 on 2026-10-17 22:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Роль администратора читает витрины через SET LOCAL ROLE (CurrentUserMiddleware)
+GRANT_SQL = """
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'admin_role') THEN
+        GRANT SELECT ON stats_visits_daily, stats_diagnoses_daily,
+                        stats_medications_daily, stats_watermarks TO admin_role;
+    END IF;
+END
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_partition_action_logs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiagnosisStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('icd_code', models.TextField()),
+                ('diagnoses', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'stats_diagnoses_daily',
+            },
+        ),
+        migrations.CreateModel(
+            name='MedicationStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('prescriptions', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'stats_medications_daily',
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField(unique=True)),
+                ('created_at', models.DateTimeField()),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'stats_watermarks',
+            },
+        ),
+        migrations.CreateModel(
+            name='VisitStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('visits', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'stats_visits_daily',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='diagnosisstat',
+            unique_together={('day', 'icd_code')},
+        ),
+        migrations.AddField(
+            model_name='medicationstat',
+            name='medication',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.medication'),
+        ),
+        migrations.AddField(
+            model_name='visitstat',
+            name='doctor',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.doctor'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='medicationstat',
+            unique_together={('day', 'medication')},
+        ),
+        migrations.AddIndex(
+            model_name='visitstat',
+            index=models.Index(fields=['day', 'doctor'], name='stats_visits_day_idx'),
+        ),
+        migrations.RunSQL(GRANT_SQL, migrations.RunSQL.noop),
+    ]
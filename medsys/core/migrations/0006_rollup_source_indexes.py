@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-17 22:30
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY не работает внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('core', '0005_rollups'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='diagnosis',
+            index=models.Index(fields=['created_at', 'id'], name='diagnoses_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='prescription',
+            index=models.Index(fields=['created_at', 'id'], name='prescriptions_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='visit',
+            index=models.Index(fields=['created_at', 'id'], name='visits_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='visit',
+            index=models.Index(fields=['visit_date'], name='visits_visit_date_idx'),
+        ),
+    ]
@@ -0,0 +1,127 @@
+# Generated by Django 6.0 on 2026-10-17 22:33
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+# Колонки search_vector для полнотекстового поиска (core.search).
+# Пересчитываются триггером BEFORE INSERT/UPDATE только при изменении
+# исходных колонок; выражение вынесено в SQL-функцию <table>_search_vector,
+# общую для триггера и первичного заполнения.
+SEARCH_VECTORS = {
+    "patients": (
+        "setweight(to_tsvector('simple', coalesce(r.last_name, '') || ' ' || coalesce(r.first_name, '')), 'A')"
+        " || setweight(to_tsvector('simple', coalesce(r.email, '') || ' ' || coalesce(r.phone, '')), 'B')",
+        ("first_name", "last_name", "email", "phone"),
+    ),
+    "doctors": (
+        "setweight(to_tsvector('simple', coalesce(r.last_name, '') || ' ' || coalesce(r.first_name, '')"
+        " || ' ' || r.license_number), 'A')"
+        " || setweight(to_tsvector('simple', coalesce(r.specialization, '') || ' ' || coalesce(r.email, '')), 'B')",
+        ("first_name", "last_name", "license_number", "specialization", "email"),
+    ),
+    "medical_records": (
+        "setweight(to_tsvector('russian', r.content), 'A')"
+        " || setweight(to_tsvector('russian', r.record_type), 'B')",
+        ("content", "record_type"),
+    ),
+    "diagnoses": (
+        "setweight(to_tsvector('simple', r.icd_code), 'A')"
+        " || setweight(to_tsvector('russian', coalesce(r.description, '')), 'B')",
+        ("icd_code", "description"),
+    ),
+}
+BACKFILL_BATCH_SIZE = 10000
+
+
+def vector_sql(table, expression, columns):
+    return f"""
+    ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+    CREATE OR REPLACE FUNCTION {table}_search_vector(r {table}) RETURNS tsvector
+        LANGUAGE sql IMMUTABLE AS $$ SELECT {expression} $$;
+
+    CREATE OR REPLACE FUNCTION {table}_search_vector_trigger() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.search_vector := {table}_search_vector(NEW);
+        RETURN NEW;
+    END
+    $$;
+
+    DROP TRIGGER IF EXISTS {table}_search_vector ON {table};
+    CREATE TRIGGER {table}_search_vector
+        BEFORE INSERT OR UPDATE OF {", ".join(columns)} ON {table}
+        FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_trigger();
+    """
+
+
+def drop_vector_sql(table):
+    return f"""
+    DROP TRIGGER IF EXISTS {table}_search_vector ON {table};
+    DROP FUNCTION IF EXISTS {table}_search_vector_trigger();
+    DROP FUNCTION IF EXISTS {table}_search_vector({table});
+    ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector;
+    """
+
+
+def backfill(apps, schema_editor):
+    # Миграция не атомарная: каждая пачка коммитится отдельно и не держит
+    # блокировку строк всей таблицы
+    with schema_editor.connection.cursor() as cursor:
+        for table in SEARCH_VECTORS:
+            cursor.execute(f"SELECT min(id), max(id) FROM {table}")
+            low, high = cursor.fetchone()
+            if low is None:
+                continue
+            for start in range(low, high + 1, BACKFILL_BATCH_SIZE):
+                cursor.execute(
+                    f"UPDATE {table} r SET search_vector = {table}_search_vector(r) "
+                    f"WHERE id >= %s AND id < %s",
+                    [start, start + BACKFILL_BATCH_SIZE],
+                )
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY не работает внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_rollup_source_indexes'),
+    ]
+
+    operations = [
+        *[
+            migrations.RunSQL(vector_sql(table, expression, columns), drop_vector_sql(table))
+            for table, (expression, columns) in SEARCH_VECTORS.items()
+        ],
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        *[
+            migrations.RunSQL(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {table}_search_idx ON {table} USING gin (search_vector)",
+                f"DROP INDEX CONCURRENTLY IF EXISTS {table}_search_idx",
+            )
+            for table in SEARCH_VECTORS
+        ],
+        AddIndexConcurrently(
+            model_name='doctor',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['last_name'], name='doctors_last_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='doctor',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['first_name'], name='doctors_first_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='doctor',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['license_number'], name='doctors_license_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['phone'], name='patients_phone_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['email'], name='patients_email_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 6.0 on 2026-10-17 22:46
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+# Веб-запросы ставят и читают задания под ролью пользователя (SET LOCAL ROLE);
+# воркер работает под владельцем схемы
+GRANT_SQL = """
+DO $$
+DECLARE
+    role_name text;
+BEGIN
+    FOREACH role_name IN ARRAY ARRAY['admin_role', 'doctor_role'] LOOP
+        IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = role_name) THEN
+            EXECUTE format('GRANT SELECT, INSERT ON jobs TO %I', role_name);
+            EXECUTE format('GRANT USAGE ON SEQUENCE %s TO %I',
+                           pg_get_serial_sequence('jobs', 'id'), role_name);
+        END IF;
+    END LOOP;
+END
+$$;
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.TextField()),
+                ('params', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'), ('expired', 'Expired')], default='queued', max_length=20)),
+                ('progress', models.IntegerField(default=0)),
+                ('attempts', models.IntegerField(default=0)),
+                ('worker', models.TextField(blank=True, null=True)),
+                ('result_path', models.TextField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.systemuser')),
+            ],
+            options={
+                'db_table': 'jobs',
+                'indexes': [models.Index(condition=models.Q(('status', 'queued')), fields=['created_at', 'id'], name='jobs_queued_idx'), models.Index(fields=['user', 'status'], name='jobs_user_status_idx')],
+            },
+        ),
+        migrations.RunSQL(GRANT_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,196 @@
+# Generated by Django 6.0 on 2026-10-17 22:53
+
+import django.db.models.functions.comparison
+import django.utils.timezone
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+# Лента изменений (core.changes). Колонки updated_at добавляются без
+# значения по умолчанию — без перезаписи таблиц; у старых строк NULL,
+# и ключом ленты для них служит created_at. Триггер ставит updated_at при
+# любой вставке и изменении, в том числе COPY-импорте и QuerySet.update().
+# Удаления (delete_row, bulk_delete, каскады) пишет в deleted_rows
+# триггер уровня оператора по таблице переходов.
+TOUCHED_TABLES = ("system_users", "doctors", "patients", "aliases", "visits", "medical_records",
+                  "diagnoses", "prescriptions", "medications", "lab_tests")
+
+FUNCTIONS_SQL = """
+CREATE OR REPLACE FUNCTION core_touch_updated_at() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION core_record_deletes() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO deleted_rows (table_name, row_id, deleted_at)
+    SELECT TG_TABLE_NAME, id, now() FROM old_rows;
+    RETURN NULL;
+END
+$$;
+
+DO $$
+DECLARE
+    role_name text;
+BEGIN
+    FOREACH role_name IN ARRAY ARRAY['admin_role', 'doctor_role'] LOOP
+        IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = role_name) THEN
+            EXECUTE format('GRANT INSERT ON deleted_rows TO %I', role_name);
+            EXECUTE format('GRANT USAGE ON SEQUENCE %s TO %I',
+                           pg_get_serial_sequence('deleted_rows', 'id'), role_name);
+        END IF;
+    END LOOP;
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'admin_role') THEN
+        GRANT SELECT ON deleted_rows TO admin_role;
+    END IF;
+END
+$$;
+"""
+
+DROP_FUNCTIONS_SQL = """
+DROP FUNCTION IF EXISTS core_record_deletes();
+DROP FUNCTION IF EXISTS core_touch_updated_at();
+"""
+
+
+def triggers_sql(table):
+    return f"""
+    DROP TRIGGER IF EXISTS {table}_touch_updated_at ON {table};
+    CREATE TRIGGER {table}_touch_updated_at
+        BEFORE INSERT OR UPDATE ON {table}
+        FOR EACH ROW EXECUTE FUNCTION core_touch_updated_at();
+
+    DROP TRIGGER IF EXISTS {table}_record_deletes ON {table};
+    CREATE TRIGGER {table}_record_deletes
+        AFTER DELETE ON {table}
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION core_record_deletes();
+    """
+
+
+def drop_triggers_sql(table):
+    return f"""
+    DROP TRIGGER IF EXISTS {table}_record_deletes ON {table};
+    DROP TRIGGER IF EXISTS {table}_touch_updated_at ON {table};
+    """
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY не работает внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('core', '0008_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table_name', models.TextField()),
+                ('row_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'deleted_rows',
+            },
+        ),
+        migrations.AddField(
+            model_name='alias',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='diagnosis',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='labtest',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='medicalrecord',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='medication',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='prescription',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='visit',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        AddIndexConcurrently(
+            model_name='alias',
+            index=models.Index(django.db.models.functions.comparison.Coalesce('updated_at', 'created_at'), models.F('id'), name='aliases_changed_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='diagnosis',
+            index=models.Index(django.db.models.functions.comparison.Coalesce('updated_at', 'created_at'), models.F('id'), name='diagnoses_changed_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='doctor',
+            index=models.Index(django.db.models.functions.comparison.Coalesce('updated_at', 'created_at'), models.F('user'), name='doctors_changed_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='labtest',
+            index=models.Index(django.db.models.functions.comparison.Coalesce('updated_at', 'created_at'), models.F('id'), name='lab_tests_changed_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='medicalrecord',
+            index=models.Index(django.db.models.functions.comparison.Coalesce('updated_at', 'created_at'), models.F('id'), name='medical_records_changed_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='medication',
+            index=models.Index(django.db.models.functions.comparison.Coalesce('updated_at', 'created_at'), models.F('id'), name='medications_changed_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='patient',
+            index=models.Index(django.db.models.functions.comparison.Coalesce('updated_at', 'created_at'), models.F('id'), name='patients_changed_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='prescription',
+            index=models.Index(django.db.models.functions.comparison.Coalesce('updated_at', 'created_at'), models.F('id'), name='prescriptions_changed_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='systemuser',
+            index=models.Index(django.db.models.functions.comparison.Coalesce('updated_at', 'created_at'), models.F('id'), name='system_users_changed_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='visit',
+            index=models.Index(django.db.models.functions.comparison.Coalesce('updated_at', 'created_at'), models.F('id'), name='visits_changed_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='deletedrow',
+            index=models.Index(fields=['table_name', 'deleted_at', 'id'], name='deleted_rows_table_idx'),
+        ),
+        migrations.RunSQL(FUNCTIONS_SQL, DROP_FUNCTIONS_SQL),
+    ] + [
+        migrations.RunSQL(triggers_sql(table), drop_triggers_sql(table))
+        for table in TOUCHED_TABLES
+    ]
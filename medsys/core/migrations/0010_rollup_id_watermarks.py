@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+# Отметки витрин переходят с (created_at, id) на id. Обработанные строки
+# по старой отметке не совпадают с префиксом по id, поэтому витрины
+# диагнозов и назначений собираются заново: следующий refresh_rollups
+# запоминает наибольший id, а через ANALYTICS_LAG_SECONDS проходит всю историю
+RESET_SQL = """
+DELETE FROM stats_watermarks;
+TRUNCATE stats_diagnoses_daily, stats_medications_daily;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_change_feed'),
+    ]
+
+    operations = [
+        migrations.RunSQL(RESET_SQL, migrations.RunSQL.noop),
+        migrations.RemoveField(
+            model_name='rollupwatermark',
+            name='created_at',
+        ),
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='seen_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
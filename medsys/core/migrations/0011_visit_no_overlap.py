@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.db import migrations
+
+# Активные визиты одного врача не пересекаются: визит занимает
+# [visit_date, visit_date + VISIT_DURATION_MINUTES), как в
+# core.schedule.has_conflict. Ограничение закрывает все пути записи,
+# включая импорт, сидер и сырой SQL; save_visit проверяет то же заранее,
+# чтобы вернуть понятную ошибку. Врач сравнивается как int8range по
+# встроенному GiST range_ops, без расширения btree_gist. Длительность
+# берётся из настроек при применении миграции: после её смены ограничение
+# нужно пересоздать (migrate core 0010 && migrate core).
+# Существующие пересечения нужно разобрать до миграции: она падает со
+# списком первых найденных пар.
+def overlap_sql(duration):
+    return f"""
+    CREATE OR REPLACE FUNCTION visit_period(start timestamptz) RETURNS tstzrange
+        LANGUAGE sql IMMUTABLE AS $$ SELECT tstzrange(start, start + interval '{duration} minutes') $$;
+
+    DO $$
+    DECLARE
+        pairs text;
+    BEGIN
+        SELECT string_agg(pair, ', ') INTO pairs FROM (
+            SELECT format('%s/%s', a.id, b.id) AS pair
+            FROM visits a
+                     JOIN visits b ON b.doctor_id = a.doctor_id AND b.id > a.id
+                AND visit_period(b.visit_date) && visit_period(a.visit_date)
+            WHERE a.status IN ('scheduled', 'in_progress')
+              AND b.status IN ('scheduled', 'in_progress')
+            LIMIT 20
+        ) found;
+        IF pairs IS NOT NULL THEN
+            RAISE EXCEPTION 'Пересекающиеся активные визиты (id/id): %', pairs
+                USING HINT = 'Отмените или перенесите визиты и повторите migrate';
+        END IF;
+    END
+    $$;
+
+    ALTER TABLE visits ADD CONSTRAINT visits_no_overlap EXCLUDE USING gist (
+        int8range(doctor_id, doctor_id, '[]') WITH =,
+        visit_period(visit_date) WITH &&
+    ) WHERE (status IN ('scheduled', 'in_progress'));
+    """
+
+
+DROP_OVERLAP_SQL = """
+    ALTER TABLE visits DROP CONSTRAINT IF EXISTS visits_no_overlap;
+    DROP FUNCTION IF EXISTS visit_period(timestamptz);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_rollup_id_watermarks'),
+    ]
+
+    operations = [
+        migrations.RunSQL(overlap_sql(settings.VISIT_DURATION_MINUTES), DROP_OVERLAP_SQL),
+    ]
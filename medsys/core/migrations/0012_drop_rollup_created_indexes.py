@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 12:40
+
+from django.contrib.postgres.operations import RemoveIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # Индексы (created_at, id) служили отметкам витрин по created_at; с 0010
+    # отметки идут по id и используют первичный ключ.
+    # DROP INDEX CONCURRENTLY не работает внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('core', '0011_visit_no_overlap'),
+    ]
+
+    operations = [
+        RemoveIndexConcurrently(
+            model_name='diagnosis',
+            name='diagnoses_created_idx',
+        ),
+        RemoveIndexConcurrently(
+            model_name='prescription',
+            name='prescriptions_created_idx',
+        ),
+        RemoveIndexConcurrently(
+            model_name='visit',
+            name='visits_created_idx',
+        ),
+    ]
@@ -1,8 +1,11 @@
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Coalesce
 from django.core.validators import RegexValidator
 from django.utils import timezone
 
-from .constants import (ROLE_CHOICES, REGEX_PATTERN,
+from .constants import (JOB_STATUS_CHOICES, ROLE_CHOICES, REGEX_PATTERN,
                         REGEX_PHONE_PATTERN, STATUS_CHOICES)
 
 class SystemUser(models.Model):
@@ -22,6 +25,9 @@ class SystemUser(models.Model):
 
     class Meta:
         db_table = 'system_users'
+        indexes = [
+            models.Index(Coalesce('updated_at', 'created_at'), F('id'), name='system_users_changed_idx'),
+        ]
         verbose_name = 'Пользователь системы'
         verbose_name_plural = 'Пользователи системы'
         ordering = ['role', ]
@@ -45,12 +51,21 @@ class Patient(models.Model):
                              )
     email = models.EmailField(unique=True, blank=True, null=True)
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True, blank=True, null=True)
 
     class Meta:
         db_table = 'patients'
         verbose_name = 'Пациент'
         verbose_name_plural = 'Пациенты'
         ordering = ['created_at', ]
+        indexes = [
+            models.Index(Coalesce('updated_at', 'created_at'), F('id'), name='patients_changed_idx'),
+            models.Index(fields=['created_at', 'id'], name='patients_created_idx'),
+            GinIndex(fields=['last_name'], opclasses=['gin_trgm_ops'], name='patients_last_name_trgm'),
+            GinIndex(fields=['first_name'], opclasses=['gin_trgm_ops'], name='patients_first_name_trgm'),
+            GinIndex(fields=['phone'], opclasses=['gin_trgm_ops'], name='patients_phone_trgm'),
+            GinIndex(fields=['email'], opclasses=['gin_trgm_ops'], name='patients_email_trgm'),
+        ]
 
     def __str__(self):
         return f"{self.id}"
@@ -84,9 +99,13 @@ class Alias(models.Model):
     )
     iv = models.BinaryField()
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True, blank=True, null=True)
 
     class Meta:
         db_table = 'aliases'
+        indexes = [
+            models.Index(Coalesce('updated_at', 'created_at'), F('id'), name='aliases_changed_idx'),
+        ]
         verbose_name = 'Псевдоним пациента'
         ordering = ['patient_id']
 
@@ -114,11 +133,18 @@ class Doctor(models.Model):
                              )
     email = models.EmailField(unique=True, blank=True, null=True)
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True, blank=True, null=True)
 
     class Meta:
         db_table = 'doctors'
         verbose_name = 'Врач'
         ordering = ['created_at']
+        indexes = [
+            models.Index(Coalesce('updated_at', 'created_at'), F('user'), name='doctors_changed_idx'),
+            GinIndex(fields=['last_name'], opclasses=['gin_trgm_ops'], name='doctors_last_name_trgm'),
+            GinIndex(fields=['first_name'], opclasses=['gin_trgm_ops'], name='doctors_first_name_trgm'),
+            GinIndex(fields=['license_number'], opclasses=['gin_trgm_ops'], name='doctors_license_trgm'),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -139,9 +165,21 @@ class Visit(models.Model):
     reason = models.TextField(blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES)
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True, blank=True, null=True)
 
     class Meta:
         db_table = 'visits'
+        indexes = [
+            models.Index(Coalesce('updated_at', 'created_at'), F('id'), name='visits_changed_idx'),
+            models.Index(fields=['visit_date'], name='visits_visit_date_idx'),
+            models.Index(fields=['doctor', 'visit_date'], name='visits_doctor_date_idx'),
+            models.Index(fields=['alias', 'visit_date'], name='visits_alias_date_idx'),
+            models.Index(
+                fields=['status', 'visit_date'],
+                name='visits_open_status_idx',
+                condition=models.Q(status__in=['scheduled', 'in_progress']),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.id}"
@@ -158,9 +196,14 @@ class LabTest(models.Model):
     result = models.TextField(blank=True, null=True)
     result_at = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True, blank=True, null=True)
 
     class Meta:
         db_table = 'lab_tests'
+        indexes = [
+            models.Index(Coalesce('updated_at', 'created_at'), F('id'), name='lab_tests_changed_idx'),
+            models.Index(fields=['visit', 'created_at'], name='lab_tests_visit_idx'),
+        ]
 
 
 class MedicalRecord(models.Model):
@@ -171,9 +214,14 @@ class MedicalRecord(models.Model):
     record_type = models.TextField()
     content = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True, blank=True, null=True)
 
     class Meta:
         db_table = 'medical_records'
+        indexes = [
+            models.Index(Coalesce('updated_at', 'created_at'), F('id'), name='medical_records_changed_idx'),
+            models.Index(fields=['visit', 'created_at'], name='medical_records_visit_idx'),
+        ]
 
 
 
@@ -185,9 +233,14 @@ class Diagnosis(models.Model):
     icd_code = models.TextField()
     description = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True, blank=True, null=True)
 
     class Meta:
         db_table = 'diagnoses'
+        indexes = [
+            models.Index(Coalesce('updated_at', 'created_at'), F('id'), name='diagnoses_changed_idx'),
+            models.Index(fields=['visit', 'created_at'], name='diagnoses_visit_idx'),
+        ]
 
 
 
@@ -196,9 +249,13 @@ class Medication(models.Model):
     dosage = models.TextField(blank=True, null=True)
     instruction = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True, blank=True, null=True)
 
     class Meta:
         db_table = 'medications'
+        indexes = [
+            models.Index(Coalesce('updated_at', 'created_at'), F('id'), name='medications_changed_idx'),
+        ]
 
 
 
@@ -209,6 +266,7 @@ class Prescription(models.Model):
     )
     adjustments = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True, blank=True, null=True)
 
     medications = models.ManyToManyField(
         Medication,
@@ -217,6 +275,10 @@ class Prescription(models.Model):
 
     class Meta:
         db_table = 'prescriptions'
+        indexes = [
+            models.Index(Coalesce('updated_at', 'created_at'), F('id'), name='prescriptions_changed_idx'),
+            models.Index(fields=['visit', 'created_at'], name='prescriptions_visit_idx'),
+        ]
 
 
 
@@ -250,3 +312,106 @@ class ActionLog(models.Model):
 
     class Meta:
         db_table = 'action_logs'
+        indexes = [
+            BrinIndex(fields=['created_at'], name='action_logs_created_brin'),
+            models.Index(fields=['user', 'created_at'], name='action_logs_user_created_idx'),
+        ]
+
+
+
+class VisitStat(models.Model):
+    doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        db_constraint=False,
+        related_name='+'
+    )
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    visits = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'stats_visits_daily'
+        indexes = [
+            models.Index(fields=['day', 'doctor'], name='stats_visits_day_idx'),
+        ]
+
+
+class DiagnosisStat(models.Model):
+    day = models.DateField()
+    icd_code = models.TextField()
+    diagnoses = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'stats_diagnoses_daily'
+        unique_together = ('day', 'icd_code')
+
+
+class MedicationStat(models.Model):
+    day = models.DateField()
+    medication = models.ForeignKey(
+        Medication,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+    prescriptions = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'stats_medications_daily'
+        unique_together = ('day', 'medication')
+
+
+class RollupWatermark(models.Model):
+    name = models.TextField(unique=True)
+    last_id = models.BigIntegerField(default=0)
+    seen_id = models.BigIntegerField(default=0)
+    seen_at = models.DateTimeField(blank=True, null=True)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'stats_watermarks'
+
+
+class Job(models.Model):
+    user = models.ForeignKey(
+        SystemUser,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    kind = models.TextField()
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=JOB_STATUS_CHOICES, default='queued')
+    progress = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    worker = models.TextField(blank=True, null=True)
+    result_path = models.TextField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(blank=True, null=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'jobs'
+        indexes = [
+            # очередь: воркер берёт самое старое задание в статусе queued
+            models.Index(fields=['created_at', 'id'], name='jobs_queued_idx',
+                         condition=models.Q(status='queued')),
+            models.Index(fields=['user', 'status'], name='jobs_user_status_idx'),
+        ]
+
+
+class DeletedRow(models.Model):
+    # Удалённые строки для ленты изменений; пишет триггер AFTER DELETE
+    # (миграция 0009), поэтому сюда попадают и каскадные удаления
+    table_name = models.TextField()
+    row_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'deleted_rows'
+        indexes = [
+            models.Index(fields=['table_name', 'deleted_at', 'id'], name='deleted_rows_table_idx'),
+        ]
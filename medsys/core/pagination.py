@@ -0,0 +1,143 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+
+from .constants import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+CURSOR_SALT = "core.pagination"
+
+
+def estimate_count(model):
+    # Оценка по статистике планировщика вместо COUNT(*)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+
+    if row is None or row[0] < 0:
+        # таблица ещё ни разу не анализировалась
+        return model.objects.count()
+    return row[0]
+
+
+@functools.lru_cache(maxsize=None)
+def sortable_fields(model):
+    # Только NOT NULL колонки: NULL ломает сравнение в keyset-условии
+    sortable = {}
+    for field in model._meta.concrete_fields:
+        if not field.null:
+            sortable[field.name] = field
+            sortable[field.attname] = field
+    return sortable
+
+
+@functools.lru_cache(maxsize=None)
+def default_sort(model):
+    sortable = sortable_fields(model)
+    for name in model._meta.ordering:
+        if isinstance(name, str) and name.lstrip("-") in sortable:
+            return name
+    return model._meta.pk.attname
+
+
+def parse_sort(model, value):
+    sortable = sortable_fields(model)
+    if value and value.lstrip("-") in sortable:
+        return value
+    return default_sort(model)
+
+
+def parse_page_size(value):
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(sort_value, pk):
+    if not isinstance(sort_value, (int, str)):
+        sort_value = str(sort_value)
+    return signing.dumps([sort_value, pk], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(model, field, cursor):
+    try:
+        sort_value, pk = signing.loads(cursor, salt=CURSOR_SALT)
+        return field.to_python(sort_value), model._meta.pk.to_python(pk)
+    except (signing.BadSignature, ValidationError, TypeError, ValueError):
+        return None
+
+
+def page_query(model, fields, params):
+    # Запрос страницы и её параметры без выполнения: общий для
+    # синхронного paginate и асинхронного apaginate
+    pk_name = model._meta.pk.attname
+    sortable = sortable_fields(model)
+    sort = parse_sort(model, params.get("sort"))
+    page_size = parse_page_size(params.get("page_size"))
+    descending = sort.startswith("-")
+    # сортируем по колонке (attname), а не по связанной модели
+    field = sortable[sort.lstrip("-")]
+    column = field.attname
+
+    queryset = model.objects.all()
+    if column == pk_name:
+        order_by = ["-" + column if descending else column]
+    else:
+        order_by = ["-" + column if descending else column, "-pk" if descending else "pk"]
+
+    cursor = params.get("cursor")
+    position = decode_cursor(model, field, cursor) if cursor else None
+    if position is not None:
+        sort_value, last_pk = position
+        op = "lt" if descending else "gt"
+        if column == pk_name:
+            queryset = queryset.filter(**{"pk__" + op: last_pk})
+        else:
+            queryset = queryset.filter(
+                Q(**{column + "__" + op: sort_value})
+                | Q(**{column: sort_value, "pk__" + op: last_pk})
+            )
+
+    # кортежи values_list: колонки дашборда первыми и по порядку fields,
+    # ключи keyset-курсора (если их среди fields нет) — в конце
+    values = list(dict.fromkeys([*fields, column, pk_name]))
+    page = {
+        "sort": sort,
+        "page_size": page_size,
+        "is_first_page": position is None,
+        "sortable": [name for name in fields if name in sortable],
+    }
+    key_columns = (values.index(column), values.index(pk_name))
+    return queryset.order_by(*order_by).values_list(*values)[:page_size + 1], page, key_columns
+
+
+def fill_page(page, rows, key_columns, total_estimate):
+    # позиции ключей курсора в кортеже строки
+    column_index, pk_index = key_columns
+    next_cursor = None
+    if len(rows) > page["page_size"]:
+        rows = rows[:page["page_size"]]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[column_index], last[pk_index])
+
+    page.update(rows=rows, next_cursor=next_cursor, total_estimate=total_estimate)
+    return page
+
+
+def paginate(model, fields, params):
+    queryset, page, key_columns = page_query(model, fields, params)
+    return fill_page(page, list(queryset), key_columns, estimate_count(model))
+
+
+async def apaginate(model, fields, params):
+    queryset, page, key_columns = page_query(model, fields, params)
+    rows = [row async for row in queryset]
+    return fill_page(page, rows, key_columns, await sync_to_async(estimate_count)(model))
@@ -0,0 +1,259 @@
+import datetime
+import decimal
+import multiprocessing
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from xml.sax.saxutils import escape, quoteattr
+
+import django
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.datetime import to_excel
+
+from .constants import (EXPORT_CHUNK_SIZE, EXPORT_MAX_COLUMN_WIDTH,
+                        EXPORT_RANGE_ROWS, EXPORT_ZIP_LEVEL)
+from .exports import export_fields, iter_rows
+from .middleware import DB_CONTEXT_SQL, SessionUser, apply_db_context, db_context_params
+from .registry import export_tables
+
+# Параллельная выгрузка: каждая таблица режется на диапазоны PK по
+# EXPORT_RANGE_ROWS строк, процессы пула читают диапазоны в одном
+# экспортированном снимке (pg_export_snapshot) и пишут готовые строки XML
+# листа. Номер первой строки диапазона известен заранее, поэтому
+# итоговая книга собирается простым копированием кусков в zip.
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+XML_HEAD = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+# индексы cellXfs в STYLES_XML: форматы дат те же, что ставит openpyxl
+DATE_STYLE, DATETIME_STYLE, TIME_STYLE = 1, 2, 3
+STYLES_XML = XML_HEAD + (
+    f'<styleSheet xmlns="{MAIN_NS}">'
+    '<numFmts count="2"><numFmt numFmtId="164" formatCode="yyyy-mm-dd"/>'
+    '<numFmt numFmtId="165" formatCode="yyyy-mm-dd h:mm:ss"/></numFmts>'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="21" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+ROOT_RELS = XML_HEAD + (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="xl/workbook.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>'
+)
+
+
+def cell_xml(ref, value):
+    # значение уже прошло exports.cell_value
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    if isinstance(value, datetime.datetime):
+        style = DATETIME_STYLE
+    elif isinstance(value, datetime.date):
+        style = DATE_STYLE
+    elif isinstance(value, datetime.time):
+        style = TIME_STYLE
+    else:
+        text = escape(ILLEGAL_CHARACTERS_RE.sub("", value))
+        return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+    return f'<c r="{ref}" s="{style}"><v>{to_excel(value)}</v></c>'
+
+
+def row_xml(number, letters, values):
+    cells = "".join(cell_xml(f"{letter}{number}", value) for letter, value in zip(letters, values))
+    return f'<row r="{number}">{cells}</row>'
+
+
+def column_letters(count):
+    return [get_column_letter(i) for i in range(1, count + 1)]
+
+
+def write_part(fileobj, rows, first_row, letters, widths=None, chunk_size=EXPORT_CHUNK_SIZE):
+    # ширины колонок, как в exports.write_sheet, по первой пачке строк листа
+    count = 0
+    for values in rows:
+        if widths is not None and count < chunk_size:
+            for i, value in enumerate(values):
+                if value is not None:
+                    widths[i] = max(widths[i], len(str(value)))
+        fileobj.write(row_xml(first_row + count, letters, values))
+        count += 1
+    return count
+
+
+def sheet_head(fields, widths):
+    cols = "".join(
+        f'<col min="{i}" max="{i}" width="{min(width, EXPORT_MAX_COLUMN_WIDTH) + 2}" customWidth="1"/>'
+        for i, width in enumerate(widths, start=1)
+    )
+    header = row_xml(1, column_letters(len(fields)), fields)
+    return f'{XML_HEAD}<worksheet xmlns="{MAIN_NS}"><cols>{cols}</cols><sheetData>{header}'
+
+
+SHEET_TAIL = "</sheetData></worksheet>"
+
+
+def workbook_parts(names):
+    sheets = "".join(
+        f'<sheet name={quoteattr(name)} sheetId="{i}" r:id="rId{i}"/>'
+        for i, name in enumerate(names, start=1)
+    )
+    workbook = f'{XML_HEAD}<workbook xmlns="{MAIN_NS}" xmlns:r="{REL_NS}"><sheets>{sheets}</sheets></workbook>'
+
+    rels = "".join(
+        f'<Relationship Id="rId{i}" Target="worksheets/sheet{i}.xml" Type="{REL_NS}/worksheet"/>'
+        for i in range(1, len(names) + 1)
+    )
+    rels += f'<Relationship Id="rId{len(names) + 1}" Target="styles.xml" Type="{REL_NS}/styles"/>'
+    workbook_rels = (f'{XML_HEAD}<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                     f'{rels}</Relationships>')
+
+    overrides = "".join(
+        f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for i in range(1, len(names) + 1)
+    )
+    content_types = (
+        f'{XML_HEAD}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        f'{overrides}</Types>'
+    )
+    return {
+        "[Content_Types].xml": content_types,
+        "_rels/.rels": ROOT_RELS,
+        "xl/workbook.xml": workbook,
+        "xl/_rels/workbook.xml.rels": workbook_rels,
+        "xl/styles.xml": STYLES_XML,
+    }
+
+
+def assemble_workbook(path, sheets):
+    # sheets: [(имя, поля, ширины, [файлы диапазонов по порядку])]
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=EXPORT_ZIP_LEVEL) as zf:
+        for name, content in workbook_parts([sheet[0] for sheet in sheets]).items():
+            zf.writestr(name, content)
+        for i, (name, fields, widths, parts) in enumerate(sheets, start=1):
+            with zf.open(f"xl/worksheets/sheet{i}.xml", "w", force_zip64=True) as entry:
+                entry.write(sheet_head(fields, widths).encode())
+                for part in parts:
+                    with open(part, "rb") as f:
+                        shutil.copyfileobj(f, entry, 1024 * 1024)
+                entry.write(SHEET_TAIL.encode())
+
+
+def plan_ranges(cursor, model, range_rows):
+    # Начало каждого диапазона — каждая range_rows-я строка по PK
+    # (index-only scan). Все диапазоны, кроме последнего, ровно по
+    # range_rows строк, поэтому диапазон i начинается со строки
+    # 2 + i * range_rows листа
+    table = connection.ops.quote_name(model._meta.db_table)
+    pk = connection.ops.quote_name(model._meta.pk.column)
+    cursor.execute(
+        f"SELECT {pk} FROM (SELECT {pk}, row_number() OVER (ORDER BY {pk}) AS n FROM {table}) AS s"
+        f" WHERE n %% %s = 1 ORDER BY {pk}",
+        [range_rows],
+    )
+    starts = [row[0] for row in cursor.fetchall()]
+    if not starts:
+        return [(None, None)]
+    return list(zip(starts, starts[1:] + [None]))
+
+
+def export_part(task):
+    # выполняется в процессе пула на собственном соединении
+    table, index, low, high, snapshot, user, first_row, path, chunk_size, using = task
+    model = export_tables[table]
+    fields = export_fields(model)
+    pk = model._meta.pk.attname
+
+    queryset = model.objects.using(using).order_by(pk)
+    if low is not None:
+        queryset = queryset.filter(**{f"{pk}__gte": low})
+    if high is not None:
+        queryset = queryset.filter(**{f"{pk}__lt": high})
+    widths = [len(field) for field in fields] if index == 0 else None
+
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            # уровень изоляции и снимок — до первого запроса транзакции
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cursor.execute("SET TRANSACTION SNAPSHOT %s", [snapshot])
+        apply_db_context(SessionUser(*user), using=using)
+        with open(path, "w", encoding="utf-8") as f:
+            rows = write_part(f, iter_rows(queryset, fields, chunk_size), first_row,
+                              column_letters(len(fields)), widths, chunk_size)
+    return table, index, rows, widths
+
+
+def write_workbook_parallel(path, tables, user, progress=None, processes=None,
+                            range_rows=EXPORT_RANGE_ROWS, chunk_size=EXPORT_CHUNK_SIZE,
+                            using=DEFAULT_DB_ALIAS):
+    processes = processes or settings.EXPORT_PROCESSES
+    # Снимок держит открытая транзакция отдельного соединения: основное
+    # соединение остаётся в autocommit, и прогресс задания виден сразу.
+    # Реплика (using) тоже экспортирует снимки, начиная с PostgreSQL 10
+    holder = connections.create_connection(using)
+    try:
+        holder.set_autocommit(False)
+        with holder.cursor() as cursor:
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cursor.execute(DB_CONTEXT_SQL, db_context_params(user))
+            cursor.execute("SELECT pg_export_snapshot()")
+            snapshot = cursor.fetchone()[0]
+            plans = {name: plan_ranges(cursor, model, range_rows) for name, model in tables.items()}
+
+        with tempfile.TemporaryDirectory() as workdir:
+            tasks = [
+                (name, index, low, high, snapshot, (user.id, user.role),
+                 2 + index * range_rows, os.path.join(workdir, f"{name}-{index}.xml"), chunk_size, using)
+                for name, ranges in plans.items()
+                for index, (low, high) in enumerate(ranges)
+            ]
+            # spawn: дочерним процессам не достаются соединения родителя,
+            # Django в них поднимается заново
+            pool = ProcessPoolExecutor(max_workers=min(processes, len(tasks)),
+                                       mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=django.setup)
+            widths = {}
+            try:
+                for future in as_completed([pool.submit(export_part, task) for task in tasks]):
+                    table, index, rows, part_widths = future.result()
+                    if part_widths is not None:
+                        widths[table] = part_widths
+                    if progress is not None:
+                        progress(rows)
+            finally:
+                pool.shutdown(cancel_futures=True)
+
+            sheets = []
+            for name, model in tables.items():
+                fields = export_fields(model)
+                parts = [task[7] for task in tasks if task[0] == name]
+                sheets.append((name, fields, widths[name], parts))
+            assemble_workbook(path, sheets)
+    finally:
+        holder.close()
+    return path
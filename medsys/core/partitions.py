@@ -0,0 +1,119 @@
+import datetime
+import re
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+PARENT_TABLE = "action_logs"
+BOUNDS_RE = re.compile(r"FROM \((.+)\) TO \((.+)\)")
+
+
+def month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    return value.replace(year=value.year + month // 12, month=month % 12 + 1)
+
+
+def partition_name(month):
+    return f"{PARENT_TABLE}_y{month.year}m{month.month:02d}"
+
+
+def parse_bound(value):
+    # 'timestamp' или MINVALUE/MAXVALUE (None)
+    value = value.strip()
+    if value.startswith("'"):
+        return datetime.datetime.fromisoformat(value.strip("'"))
+    return None
+
+
+def list_partitions():
+    # [(имя секции, нижняя граница, верхняя граница)]; None — MINVALUE/MAXVALUE
+    with connection.cursor() as cursor:
+        cursor.execute("""
+                       SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+                       FROM pg_inherits i
+                                JOIN pg_class c ON c.oid = i.inhrelid
+                       WHERE i.inhparent = %s::regclass
+                       """, [PARENT_TABLE])
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        match = BOUNDS_RE.search(bound or "")
+        if match:
+            partitions.append((name, parse_bound(match.group(1)), parse_bound(match.group(2))))
+        else:
+            # DEFAULT-секция
+            partitions.append((name, None, None))
+    return partitions
+
+
+def covering_partition(month, partitions):
+    # секция, в которую уже попадает начало месяца (например, action_logs_legacy)
+    start = month_start(month)
+    for name, lower, upper in partitions:
+        if (lower is None or lower <= start) and (upper is None or start < upper):
+            return name
+    return None
+
+
+def create_partition(month):
+    name = partition_name(month)
+    start = month_start(month)
+    end = add_months(start, 1)
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)".format(
+                        connection.ops.quote_name(name), PARENT_TABLE),
+                    [start, end],
+                )
+    except DatabaseError:
+        # Секцию этого месяца одновременно создал другой процесс (ошибка
+        # пересечения или дубль в каталоге); любая другая ошибка пробрасывается
+        if covering_partition(start, list_partitions()):
+            return False
+        raise
+    return True
+
+
+def ensure_partitions(months_ahead=None, now=None):
+    if months_ahead is None:
+        months_ahead = settings.ACTION_LOG_PARTITIONS_AHEAD
+    current = month_start(now or timezone.now())
+    partitions = list_partitions()
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if covering_partition(month, partitions) is None and create_partition(month):
+            created.append(partition_name(month))
+    return created
+
+
+def detach_old_partitions(keep_months=None, archive_schema=None, now=None):
+    # Секции старше срока хранения отсоединяются без блокировки записи
+    # (DETACH ... CONCURRENTLY, вне транзакции) и переносятся в архивную схему
+    if keep_months is None:
+        keep_months = settings.ACTION_LOG_RETENTION_MONTHS
+    if archive_schema is None:
+        archive_schema = settings.ACTION_LOG_ARCHIVE_SCHEMA
+    cutoff = add_months(month_start(now or timezone.now()), -keep_months)
+
+    detached = []
+    for name, _, upper in list_partitions():
+        if upper is None or upper > cutoff:
+            continue
+        quoted = connection.ops.quote_name(name)
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {quoted} CONCURRENTLY")
+            if archive_schema:
+                schema = connection.ops.quote_name(archive_schema)
+                cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+                cursor.execute(f"ALTER TABLE {quoted} SET SCHEMA {schema}")
+        detached.append(name)
+    return detached
@@ -0,0 +1,79 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from django.conf import settings
+from django.db import connection
+
+BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+
+_executor = None
+_executor_lock = threading.Lock()
+_dummy_hash = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.PASSWORD_HASH_WORKERS,
+                    thread_name_prefix="password-hash",
+                )
+    return _executor
+
+
+def is_bcrypt(hashed):
+    return hashed.startswith(BCRYPT_PREFIXES)
+
+
+def bcrypt_rounds(hashed):
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed):
+    return not is_bcrypt(hashed) or bcrypt_rounds(hashed) != settings.PASSWORD_BCRYPT_ROUNDS
+
+
+def _hash(plain):
+    # префикс $2a$ понимает и pgcrypto crypt()
+    salt = bcrypt.gensalt(rounds=settings.PASSWORD_BCRYPT_ROUNDS, prefix=b"2a")
+    return bcrypt.hashpw(plain.encode(), salt).decode()
+
+
+def _check(plain, hashed):
+    try:
+        return bcrypt.checkpw(plain.encode(), hashed.encode())
+    except ValueError:
+        return False
+
+
+def hash_password(plain):
+    return get_executor().submit(_hash, plain).result()
+
+
+def verify_password(plain, hashed):
+    return get_executor().submit(_check, plain, hashed).result()
+
+
+def verify_password_in_db(user_id, plain):
+    # старые хеши pgcrypto (md5, des, xdes) проверяем через crypt()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT hashed_password = crypt(%s, hashed_password) FROM system_users WHERE id = %s",
+            [plain, user_id],
+        )
+        row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def burn_password_check(plain):
+    # выравниваем время ответа для несуществующего email
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password("dummy-password")
+    verify_password(plain, _dummy_hash)
@@ -0,0 +1,141 @@
+from .crypto import decrypt_rows
+from .exports import export_fields
+from .models import (
+    SystemUser,
+    Doctor,
+    Patient,
+    Alias,
+    Visit,
+    MedicalRecord,
+    Diagnosis,
+    Prescription,
+    Medication,
+    LabTest,
+    ActionLog,
+)
+from .pagination import default_sort, sortable_fields
+
+TABLES = {
+    "system_users": SystemUser,
+    "doctors": Doctor,
+    "patients": Patient,
+    "aliases": Alias,
+    "visits": Visit,
+    "medical_records": MedicalRecord,
+    "diagnoses": Diagnosis,
+    "prescriptions": Prescription,
+    "medications": Medication,
+    "lab_tests": LabTest,
+    "action_logs": ActionLog,
+}
+
+ROLES = ("admin", "doctor")
+# таблицы, скрытые от роли на дашборде
+HIDDEN_TABLES = {
+    "doctor": ("patients", "aliases", "action_logs"),
+}
+EDIT_ROLES = ("admin",)
+NOT_EDITABLE_TABLES = ("aliases",)
+NOT_EXPORTED_TABLES = ("encryption_keys",)
+EDIT_EXCLUDED_FIELDS = ("id", "hashed_password", "created_at", "updated_at")
+# массовое изменение в обход проверки расписания запрещено
+BULK_EXCLUDED_FIELDS = {
+    "visits": ("doctor", "visit_date"),
+}
+
+
+def decrypt_column(rows, index):
+    key_id, encrypted_data, iv = index["key_id"], index["encrypted_data"], index["iv"]
+    data = decrypt_rows([(row[key_id], row[encrypted_data], row[iv]) for row in rows])
+    return [(value,) for value in data]
+
+
+# Дополнительные вычисляемые колонки дашборда: таблица -> (колонки,
+# функция над страницей). Функция получает кортежи строк и позиции полей
+# и возвращает для каждой строки кортеж значений дополнительных колонок
+RENDERERS = {
+    "aliases": (("data",), decrypt_column),
+}
+
+
+class TableSpec:
+    # Всё, что обработчикам нужно знать о таблице, считается один раз при
+    # старте приложения: запрос делает только обращения к словарям
+    def __init__(self, name, model):
+        self.name = name
+        self.model = model
+
+        # FK показываются как <поле>_id, остальные поля — по имени
+        self.fields = [
+            field.attname if field.get_internal_type() == "ForeignKey" else field.name
+            for field in model._meta.fields
+        ]
+        extra, self.render = RENDERERS.get(name, ((), None))
+        self.columns = self.fields + list(extra)
+        # позиции полей в кортежах строк страницы (pagination.page_query)
+        self.field_index = {name: i for i, name in enumerate(self.fields)}
+        pk = model._meta.pk
+        self.pk_index = self.fields.index(pk.attname if pk.get_internal_type() == "ForeignKey" else pk.name)
+        self.export_fields = export_fields(model)
+
+        self.edit_fields = [
+            (field.name, field.related_model)
+            for field in model._meta.fields
+            if field.name not in EDIT_EXCLUDED_FIELDS
+        ]
+        # уникальные поля массово менять бессмысленно
+        self.bulk_fields = {
+            field.name: field
+            for field in model._meta.fields
+            if field.name not in EDIT_EXCLUDED_FIELDS
+            and not field.unique
+            and field.name not in BULK_EXCLUDED_FIELDS.get(name, ())
+        }
+        self.auto_now_fields = [field.attname for field in model._meta.fields if getattr(field, "auto_now", False)]
+
+        choices = {field.name: field.choices for field in model._meta.fields if field.choices}
+        self.role_choices = choices.get("role")
+        self.status_choices = choices.get("status")
+
+        self.view_roles = frozenset(role for role in ROLES if name not in HIDDEN_TABLES.get(role, ()))
+        self.edit_roles = frozenset(() if name in NOT_EDITABLE_TABLES else EDIT_ROLES)
+
+        # прогрев кешей сортировки для пагинации
+        sortable_fields(model)
+        default_sort(model)
+
+    def display_rows(self, rows):
+        # Кортежи страницы -> значения колонок в порядке columns: ключи
+        # курсора в конце отбрасываются, вычисляемые колонки добавляются
+        width = len(self.fields)
+        if self.render is not None:
+            return [row[:width] + extra for row, extra in zip(rows, self.render(rows, self.field_index))]
+        if rows and len(rows[0]) > width:
+            return [row[:width] for row in rows]
+        return rows
+
+
+registry = {}
+tables_by_role = {}
+export_tables = {}
+
+
+def build_registry():
+    registry.clear()
+    for name, model in TABLES.items():
+        registry[name] = TableSpec(name, model)
+
+    tables_by_role.clear()
+    for role in ROLES:
+        tables_by_role[role] = [name for name, spec in registry.items() if role in spec.view_roles]
+
+    export_tables.clear()
+    export_tables.update((name, model) for name, model in TABLES.items() if name not in NOT_EXPORTED_TABLES)
+    return registry
+
+
+def get_table(name, role=None):
+    spec = registry.get(name)
+    if spec is None or (role is not None and role not in spec.view_roles):
+        return None
+    return spec
@@ -0,0 +1,102 @@
+import datetime
+import functools
+from operator import attrgetter
+
+from django.conf import settings
+from django.template.base import render_value_in_context
+from django.utils import timezone
+from django.utils.dateformat import DateFormat, re_escaped, re_formatchars
+from django.utils.formats import get_format, localize
+from django.utils.html import conditional_escape
+
+# Символ формата -> поля значения, от которых зависит его вывод: вывод
+# кешируется по ним (месяц, день, час...), поэтому на странице почти все
+# части даты и времени уже посчитаны. Символы, зависящие от часового
+# пояса (e, I, O, T, Z, c, r, U), считаются для каждого значения
+year, month, day = attrgetter("year"), attrgetter("month"), attrgetter("day")
+hour, minute = attrgetter("hour"), attrgetter("minute")
+calendar_day = attrgetter("year", "month", "day")
+PART_KEYS = {
+    **dict.fromkeys("yYL", year),
+    **dict.fromkeys("bEFmMnN", month),
+    **dict.fromkeys("djS", day),
+    "t": attrgetter("year", "month"),
+    **dict.fromkeys("DlwWoz", calendar_day),
+    **dict.fromkeys("aAgGhH", hour),
+    "i": minute,
+    "s": attrgetter("second"),
+    "u": attrgetter("microsecond"),
+    **dict.fromkeys("fP", attrgetter("hour", "minute")),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def compile_format(format_string):
+    # разбор как в dateformat.Formatter.format: (символ, None) или (None, литерал)
+    parts = []
+    for i, piece in enumerate(re_formatchars.split(format_string)):
+        if i % 2:
+            parts.append((piece, None))
+        elif piece:
+            parts.append((None, re_escaped.sub(r"\1", piece)))
+    return tuple(parts)
+
+
+class CellRenderer:
+    # Значение ячейки так же, как его выводит {{ value }} (часовой пояс,
+    # локализация, экранирование). Формат, часовой пояс и разбор строки
+    # формата берутся один раз на отрисовку, а не на каждую ячейку
+    def __init__(self, context):
+        self.context = context
+        self.use_tz = settings.USE_TZ if context.use_tz is None else context.use_tz
+        self.tz = timezone.get_current_timezone()
+        self.datetime_format = compile_format(str(get_format("DATETIME_FORMAT", use_l10n=context.use_l10n)))
+        self.date_format = compile_format(str(get_format("DATE_FORMAT", use_l10n=context.use_l10n)))
+        # без разделителя тысяч целое выводится как str()
+        self.plain_ints = context.use_l10n is False or not settings.USE_THOUSAND_SEPARATOR
+        self.parts = {}
+        self.values = {}
+
+    def __call__(self, value):
+        if isinstance(value, str):
+            return conditional_escape(value)
+        if value is None or isinstance(value, bool):
+            return str(value)
+        if isinstance(value, int) and self.plain_ints:
+            return str(value)
+        if isinstance(value, datetime.datetime):
+            if self.use_tz and value.utcoffset() is not None and getattr(value, "convert_to_local_time", True):
+                value = value.astimezone(self.tz)
+            return self.render_date(value, self.datetime_format)
+        if isinstance(value, datetime.date):
+            return self.render_date(value, self.date_format)
+        if isinstance(value, datetime.time):
+            # колонок времени без даты нет, вывод кешируется целиком
+            if value not in self.values:
+                self.values[value] = conditional_escape(localize(value, use_l10n=self.context.use_l10n))
+            return self.values[value]
+        return render_value_in_context(value, self.context)
+
+    def render_date(self, value, parts):
+        formatter = None
+        pieces = []
+        for char, literal in parts:
+            if char is None:
+                pieces.append(literal)
+                continue
+            get_key = PART_KEYS.get(char)
+            key = (char, get_key(value)) if get_key else None
+            text = self.parts.get(key) if key else None
+            if text is None:
+                formatter = formatter or DateFormat(value)
+                text = str(getattr(formatter, char)())
+                if key:
+                    self.parts[key] = text
+            pieces.append(text)
+        return conditional_escape("".join(pieces))
+
+
+def cell_renderer(context):
+    if not context.autoescape:
+        return functools.partial(render_value_in_context, context=context)
+    return CellRenderer(context)
@@ -0,0 +1,113 @@
+import sys
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+
+from .middleware import apply_db_context, begin_request
+from .routers import PRIMARY_UNTIL_KEY, reads_from
+
+REPLICA_ALIAS = "replica"
+
+# Отставание в секундах. Реплика не отстаёт, если применила WAL до позиции
+# primary, снятой перед замером, даже если primary давно ничего не писал и
+# время последней применённой транзакции старое. Сравнение с полученным
+# самой репликой WAL не годится: при обрыве или зависании приёма WAL
+# полученное равно применённому, и реплика бесконечно «не отстаёт»
+PRIMARY_LSN_SQL = "SELECT pg_current_wal_lsn()"
+LAG_SQL = """
+          SELECT CASE
+                     WHEN NOT pg_is_in_recovery() OR pg_last_wal_replay_lsn() >= %s::pg_lsn THEN 0
+                     ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+                     END
+          """
+
+lag_lock = threading.Lock()
+lag_checked_at = None
+last_lag = None
+
+
+def measure_lag():
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute(PRIMARY_LSN_SQL)
+        primary_lsn = cursor.fetchone()[0]
+    replica = connections[REPLICA_ALIAS]
+    try:
+        with replica.cursor() as cursor:
+            cursor.execute(LAG_SQL, [primary_lsn])
+            lag = cursor.fetchone()[0]
+    except DatabaseError:
+        replica.close()
+        return None
+    return None if lag is None else float(lag)
+
+
+def replica_lag():
+    # Замер не чаще REPLICA_LAG_CHECK_SECONDS на процесс; пока один поток
+    # замеряет, остальные берут прошлое значение. None — реплика
+    # недоступна или отставание неизвестно
+    global lag_checked_at, last_lag
+    now = time.monotonic()
+    with lag_lock:
+        if lag_checked_at is not None and now - lag_checked_at < settings.REPLICA_LAG_CHECK_SECONDS:
+            return last_lag
+        lag_checked_at = now
+    lag = measure_lag()
+    with lag_lock:
+        last_lag = lag
+    return lag
+
+
+def choose_read_alias(request=None, max_lag=None):
+    # Реплика, если она настроена, сессия недавно не писала и отставание
+    # не больше REPLICA_MAX_LAG_SECONDS (и max_lag, если задан)
+    if REPLICA_ALIAS not in settings.DATABASES:
+        return DEFAULT_DB_ALIAS
+    if request is not None and request.session.get(PRIMARY_UNTIL_KEY, 0) > time.time():
+        return DEFAULT_DB_ALIAS
+    limit = settings.REPLICA_MAX_LAG_SECONDS
+    if max_lag is not None:
+        limit = min(limit, max_lag)
+    lag = replica_lag()
+    if lag is None or lag > limit:
+        return DEFAULT_DB_ALIAS
+    return REPLICA_ALIAS
+
+
+def replica_reads(view_func):
+    # Представление только читает: модели core читаются из реплики в её
+    # собственной транзакции с контекстом RLS пользователя. Ставится
+    # после login_required
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            alias = await sync_to_async(choose_read_alias)(request)
+            if alias == DEFAULT_DB_ALIAS:
+                return await view_func(request, *args, **kwargs)
+
+            # как в CurrentUserMiddleware: транзакция открывается в потоке,
+            # где выполняются все ORM-вызовы запроса
+            with reads_from(alias):
+                atomic = transaction.atomic(using=alias)
+                await sync_to_async(begin_request)(atomic, request.current_user, alias)
+                try:
+                    response = await view_func(request, *args, **kwargs)
+                except BaseException:
+                    await sync_to_async(atomic.__exit__)(*sys.exc_info())
+                    raise
+                await sync_to_async(atomic.__exit__)(None, None, None)
+                return response
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        alias = choose_read_alias(request)
+        if alias == DEFAULT_DB_ALIAS:
+            return view_func(request, *args, **kwargs)
+        with reads_from(alias), transaction.atomic(using=alias):
+            apply_db_context(request.current_user, using=alias)
+            return view_func(request, *args, **kwargs)
+    return wrapper
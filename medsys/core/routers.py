@@ -0,0 +1,46 @@
+import contextlib
+import contextvars
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Псевдоним БД, из которого читаются модели core в текущем запросе или
+# задании. Реплику выбирают core.replica.replica_reads и run_job
+read_alias = contextvars.ContextVar("read_alias", default=DEFAULT_DB_ALIAS)
+# до какого времени (unix) сессия читает только из primary
+PRIMARY_UNTIL_KEY = "db_primary_until"
+
+
+@contextlib.contextmanager
+def reads_from(alias):
+    token = read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        read_alias.reset(token)
+
+
+def pin_primary(request):
+    # чтение после записи: сессия видит свои изменения, пока реплика
+    # может их ещё не применить
+    request.session[PRIMARY_UNTIL_KEY] = time.time() + settings.REPLICA_STICKY_SECONDS
+
+
+class ReplicaRouter:
+    # Записи и всё, кроме моделей core (сессии, auth), — только primary:
+    # иначе сохранение объекта, прочитанного из реплики, ушло бы в реплику
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == "core":
+            return read_alias.get()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплика содержит те же строки, что и primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
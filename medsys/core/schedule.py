@@ -0,0 +1,238 @@
+import datetime
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache as shared_cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Doctor, Visit
+
+ACTIVE_STATUSES = ("scheduled", "in_progress")
+# метка версии расписания в общем кеше: меняется при каждой записи визита
+SCHEDULE_VERSION_KEY = "core:schedule:version"
+OVERLAP_CONSTRAINT = "visits_no_overlap"
+CHUNK_BITS = 8
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+class ScheduleConflict(Exception):
+    pass
+
+
+def visit_duration():
+    return datetime.timedelta(minutes=settings.VISIT_DURATION_MINUTES)
+
+
+def day_grid(day):
+    # Сетка приёма на день: (начала слотов, epoch-секунды начала дня приёма)
+    tz = timezone.get_current_timezone()
+    opens = datetime.datetime.combine(day, datetime.time(settings.CLINIC_OPEN_HOUR), tzinfo=tz)
+    closes = datetime.datetime.combine(day, datetime.time(settings.CLINIC_CLOSE_HOUR), tzinfo=tz)
+    step = visit_duration()
+    slots = []
+    current = opens
+    while current + step <= closes:
+        slots.append(current)
+        current += step
+    return slots, int(opens.timestamp())
+
+
+class ScheduleIndex:
+    # Индекс занятости в памяти на (врач, день): битовая маска слотов
+    # сетки, с которыми пересекается активный визит. Все визиты одной
+    # длительности d, поэтому визит в момент b занимает слоты, начинающиеся
+    # в интервале (b - d, b + d).
+    def __init__(self, duration=None):
+        self.duration = int((duration or visit_duration()).total_seconds())
+        # часовой пояс берётся один раз: localtime() на каждый визит заметен при загрузке недели
+        self.tz = timezone.get_current_timezone()
+        self._blocked = defaultdict(int)
+        self._grids = {}
+
+    @classmethod
+    def load(cls, start, end, doctor_ids=None):
+        index = cls()
+        margin = datetime.timedelta(seconds=index.duration)
+        visits = Visit.objects.filter(
+            status__in=ACTIVE_STATUSES,
+            visit_date__gt=start - margin,
+            visit_date__lt=end + margin,
+            doctor_id__isnull=False,
+        )
+        if doctor_ids is not None:
+            visits = visits.filter(doctor_id__in=doctor_ids)
+        for doctor_id, visit_date in visits.values_list("doctor_id", "visit_date").iterator():
+            index.add(doctor_id, visit_date)
+        return index
+
+    def _key(self, doctor_id, moment):
+        return doctor_id, moment.astimezone(self.tz).date()
+
+    def grid(self, day):
+        # (начала слотов, таблицы свободных слотов по кускам маски, epoch открытия).
+        # Маска режется на куски по CHUNK_BITS бит, для каждого значения куска
+        # заранее собран список свободных слотов, поэтому поиск по маске —
+        # несколько обращений к таблицам вместо проверки каждого слота.
+        if day not in self._grids:
+            slots, opens = day_grid(day)
+            tables = []
+            for base in range(0, len(slots), CHUNK_BITS):
+                chunk = slots[base:base + CHUNK_BITS]
+                tables.append([
+                    [slot for j, slot in enumerate(chunk) if not value >> j & 1]
+                    for value in range(1 << len(chunk))
+                ])
+            self._grids[day] = (slots, tables, opens)
+        return self._grids[day]
+
+    def add(self, doctor_id, moment):
+        key = self._key(doctor_id, moment)
+        ts = int(moment.timestamp())
+
+        slots, _, opens = self.grid(key[1])
+        d = self.duration
+        offset = ts - opens
+        first = max((offset - d) // d + 1, 0)
+        last = min(-(-(offset + d) // d) - 1, len(slots) - 1)
+        if first <= last:
+            # биты first..last
+            self._blocked[key] |= (1 << (last + 1)) - (1 << first)
+
+    def free_slots_range(self, doctor_ids, start_day, days):
+        # {врач: {день: свободные слоты}}; горячий цикл поиска по всей
+        # клинике, поэтому без вызова метода на каждую пару (врач, день)
+        blocked = self._blocked
+        grids = []
+        for n in range(days):
+            day = start_day + datetime.timedelta(days=n)
+            slots, tables, _ = self.grid(day)
+            grids.append((day, slots, list(enumerate(tables))))
+
+        result = {}
+        for doctor_id in doctor_ids:
+            by_day = {}
+            for day, slots, tables in grids:
+                mask = blocked.get((doctor_id, day))
+                if mask:
+                    free = []
+                    for n, table in tables:
+                        free += table[mask >> (n * CHUNK_BITS) & CHUNK_MASK]
+                    by_day[day] = free
+                else:
+                    by_day[day] = list(slots)
+            result[doctor_id] = by_day
+        return result
+
+
+def day_bounds(start_day, days):
+    tz = timezone.get_current_timezone()
+    start = datetime.datetime.combine(start_day, datetime.time.min, tzinfo=tz)
+    return start, start + datetime.timedelta(days=days)
+
+
+def bump_schedule_version():
+    # случайная метка, а не счётчик: после вытеснения ключа из кеша
+    # счётчик начался бы заново и совпал бы с версией, уже загруженной процессом
+    shared_cache.set(SCHEDULE_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidate_schedule(using=None):
+    # Как invalidate_rows в core.cache: сразу и ещё раз после коммита,
+    # иначе процесс, перечитавший визиты до коммита, сохранит старую
+    # занятость под новой версией
+    bump_schedule_version()
+    transaction.on_commit(bump_schedule_version, using=using)
+
+
+class WarmSchedule:
+    # Индекс занятости всей клиники на SCHEDULE_WARM_DAYS дней от сегодня,
+    # общий для запросов процесса. Перечитывается, когда в общем кеше
+    # сменилась версия расписания (сигналы визитов, массовые операции,
+    # импорт), наступил новый день или прошло SCHEDULE_WARM_SECONDS — на
+    # случай записи мимо приложения. Свободные слоты носят справочный
+    # характер: запись всё равно проверяется в save_visit и ограничением БД.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def fresh(self, state, version, today):
+        return (state is not None and state[0] == version and state[1] == today
+                and time.monotonic() - state[2] < settings.SCHEDULE_WARM_SECONDS)
+
+    def get(self, start_day, days):
+        # None, если период выходит за окно прогретого индекса
+        today = timezone.localdate()
+        if start_day < today or start_day + datetime.timedelta(days=days) > \
+                today + datetime.timedelta(days=settings.SCHEDULE_WARM_DAYS):
+            return None
+        version = shared_cache.get(SCHEDULE_VERSION_KEY)
+        state = self._state
+        if not self.fresh(state, version, today):
+            with self._lock:
+                state = self._state
+                if not self.fresh(state, version, today):
+                    loaded_at = time.monotonic()
+                    start, end = day_bounds(today, settings.SCHEDULE_WARM_DAYS)
+                    state = (version, today, loaded_at, ScheduleIndex.load(start, end))
+                    self._state = state
+        return state[3]
+
+    def clear(self):
+        self._state = None
+
+
+warm_schedule = WarmSchedule()
+
+
+def find_free_slots(doctor_ids, start_day, days=7):
+    index = warm_schedule.get(start_day, days)
+    if index is None:
+        start, end = day_bounds(start_day, days)
+        index = ScheduleIndex.load(start, end, doctor_ids)
+    return index.free_slots_range(doctor_ids, start_day, days)
+
+
+def has_conflict(doctor_id, moment, exclude_visit_id=None):
+    duration = visit_duration()
+    visits = Visit.objects.filter(
+        doctor_id=doctor_id,
+        status__in=ACTIVE_STATUSES,
+        visit_date__gt=moment - duration,
+        visit_date__lt=moment + duration,
+    )
+    if exclude_visit_id is not None:
+        visits = visits.exclude(id=exclude_visit_id)
+    return visits.exists()
+
+
+def conflict_message(visit):
+    return f"У врача уже есть визит в пределах {settings.VISIT_DURATION_MINUTES} минут от {visit.visit_date}"
+
+
+@transaction.atomic
+def save_visit(visit):
+    # Блокировка строки врача сериализует записи к одному врачу:
+    # проверка пересечения и сохранение идут в одной транзакции.
+    # Импорт (core.imports) и сидер пишут визиты мимо save_visit, от
+    # пересечений там защищает ограничение visits_no_overlap (миграция 0011)
+    visit.visit_date = Visit._meta.get_field("visit_date").to_python(visit.visit_date)
+    if visit.visit_date is not None and timezone.is_naive(visit.visit_date):
+        visit.visit_date = timezone.make_aware(visit.visit_date)
+
+    if visit.doctor_id is not None and visit.visit_date is not None and visit.status in ACTIVE_STATUSES:
+        Doctor.objects.select_for_update().filter(pk=visit.doctor_id).first()
+        if has_conflict(visit.doctor_id, visit.visit_date, visit.pk):
+            raise ScheduleConflict(conflict_message(visit))
+    try:
+        with transaction.atomic():
+            visit.save()
+    except IntegrityError as e:
+        # импорт блокировку врача не берёт: его визит, закоммиченный
+        # после проверки, отсекает ограничение visits_no_overlap
+        if getattr(getattr(e.__cause__, "diag", None), "constraint_name", None) == OVERLAP_CONSTRAINT:
+            raise ScheduleConflict(conflict_message(visit))
+        raise
@@ -0,0 +1,132 @@
+from django.conf import settings
+from django.db import connections
+
+from .pagination import parse_page_size
+from .routers import read_alias
+
+# Области поиска. Колонка search_vector и триггеры, которые её пересчитывают,
+# создаются миграцией 0007_search и в модели не входят (не попадают в
+# дашборд, выгрузку и формы). fuzzy — триграммное сравнение для опечаток,
+# contains — поиск подстроки (телефон, email) по триграммному индексу.
+SEARCH_SCOPES = {
+    "patients": {
+        "table": "patients",
+        "config": "simple",
+        "columns": ("id", "first_name", "last_name", "birth_date", "phone", "email"),
+        "fuzzy": ("last_name", "first_name"),
+        "contains": ("phone", "email"),
+        "roles": ("admin",),
+    },
+    "doctors": {
+        "table": "doctors",
+        "config": "simple",
+        "columns": ("id", "first_name", "last_name", "specialization", "license_number"),
+        "fuzzy": ("last_name", "first_name", "license_number"),
+        "contains": (),
+        "roles": ("admin", "doctor"),
+    },
+    "medical_records": {
+        "table": "medical_records",
+        "config": "russian",
+        "columns": ("id", "visit_id", "record_type", "created_at"),
+        "headline": "content",
+        "fuzzy": (),
+        "contains": (),
+        "roles": ("admin", "doctor"),
+    },
+    "diagnoses": {
+        "table": "diagnoses",
+        "config": "russian",
+        "columns": ("id", "visit_id", "icd_code", "description", "created_at"),
+        "fuzzy": (),
+        "contains": (),
+        "roles": ("admin", "doctor"),
+    },
+}
+
+
+def build_search_sql(spec):
+    # Сначала не больше SEARCH_CANDIDATE_LIMIT совпадений по индексам
+    # (GIN по search_vector и триграммам, планировщик объединяет их через
+    # BitmapOr), ранжируются только они: ts_rank и word_similarity не
+    # считаются для всех совпадений. Кандидаты отбираются по дешёвому ключу:
+    # совпадение слова целиком раньше совпадения по опечатке или подстроке,
+    # дальше новые строки раньше старых. GIN такой порядок не отдаёт, поэтому
+    # на частых словах совпадения всё же перебираются (без ранжирования), а
+    # за пределом лимита могут остаться только более слабые или более старые
+    table = spec["table"]
+    query = "websearch_to_tsquery(%(config)s::regconfig, %(text)s)"
+
+    conditions = [f"search_vector @@ {query}"]
+    conditions += [f"{column} %%> %(text)s" for column in spec["fuzzy"]]
+    conditions += [f"{column} ILIKE %(pattern)s" for column in spec["contains"]]
+
+    priority = "id DESC"
+    if spec["fuzzy"] or spec["contains"]:
+        priority = f"(search_vector @@ {query}) DESC, {priority}"
+
+    rank = f"ts_rank(t.search_vector, {query})"
+    if spec["fuzzy"]:
+        similarity = ", ".join(f"coalesce(word_similarity(%(text)s, t.{column}), 0)" for column in spec["fuzzy"])
+        rank += f" + greatest({similarity})"
+
+    columns = [f"t.{column}" for column in spec["columns"]]
+    if "headline" in spec:
+        # ts_headline дорогая, но считается только для строк страницы
+        columns.append(f"ts_headline(%(config)s::regconfig, t.{spec['headline']}, {query}) AS snippet")
+
+    return f"""
+        SELECT {", ".join(columns)}, {rank} AS rank
+        FROM {table} t
+        WHERE t.id IN (
+            SELECT id FROM {table}
+            WHERE {" OR ".join(conditions)}
+            ORDER BY {priority}
+            LIMIT %(candidates)s
+        )
+        ORDER BY rank DESC, t.id
+        LIMIT %(limit)s OFFSET %(offset)s
+    """
+
+
+SEARCH_SQL = {scope: build_search_sql(spec) for scope, spec in SEARCH_SCOPES.items()}
+
+
+def scopes_for_role(role):
+    return [scope for scope, spec in SEARCH_SCOPES.items() if role in spec["roles"]]
+
+
+def like_pattern(text):
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def parse_offset(value):
+    try:
+        offset = int(value)
+    except (TypeError, ValueError):
+        return 0
+    return max(0, min(offset, settings.SEARCH_CANDIDATE_LIMIT))
+
+
+def search(scope, text, params):
+    page_size = parse_page_size(params.get("page_size"))
+    offset = parse_offset(params.get("offset"))
+    # сырой SQL роутер не видит: БД для чтения берётся явно
+    with connections[read_alias.get()].cursor() as cursor:
+        cursor.execute(SEARCH_SQL[scope], {
+            "config": SEARCH_SCOPES[scope]["config"],
+            "text": text,
+            "pattern": like_pattern(text),
+            "candidates": settings.SEARCH_CANDIDATE_LIMIT,
+            "limit": page_size + 1,
+            "offset": offset,
+        })
+        names = [column[0] for column in cursor.description]
+        rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    next_offset = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_offset = offset + page_size
+    return {"results": rows, "next_offset": next_offset}
@@ -0,0 +1,184 @@
+import datetime
+import random
+
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .cache import invalidate_rows
+from .crypto import create_key, encrypt_with, key_cache
+from .imports import write_batch
+from .models import (Alias, Diagnosis, Doctor, LabTest, MedicalRecord, Medication,
+                     Patient, Prescription, PrescriptionMedication, SystemUser, Visit)
+from .passwords import hash_password
+
+FIRST_NAMES = ("Александр", "Мария", "Иван", "Анна", "Дмитрий", "Елена", "Сергей",
+               "Ольга", "Андрей", "Наталья", "Алексей", "Татьяна", "Михаил", "Ирина")
+LAST_NAMES = ("Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов",
+              "Михайлов", "Новиков", "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев")
+SPECIALIZATIONS = ("Терапевт", "Кардиолог", "Невролог", "Хирург", "Офтальмолог",
+                   "Эндокринолог", "Педиатр", "Дерматолог")
+REASONS = ("Плановый осмотр", "Головная боль", "Боль в груди", "Повышенное давление",
+           "Кашель", "Повторный приём", "Результаты анализов", "Боль в спине")
+TEST_TYPES = ("Общий анализ крови", "Биохимия крови", "Общий анализ мочи", "ЭКГ", "Глюкоза")
+ICD_CODES = ("I10", "J06.9", "E11.9", "M54.5", "K29.7", "J45.9", "I25.1", "N39.0")
+RECORD_TYPES = ("Осмотр", "Анамнез", "Заключение")
+SEED_PASSWORD = "medsys-seed"
+
+# таблицы в порядке заполнения: родители раньше потомков
+SEED_MODELS = (SystemUser, Doctor, Medication, Patient, Alias, Visit,
+               LabTest, Diagnosis, MedicalRecord, Prescription, PrescriptionMedication)
+
+
+class Seeder:
+    # Синтетические данные для нагрузочных замеров. Идентификаторы
+    # назначаются заранее, поэтому строки пишутся COPY без обратного
+    # чтения id; последовательности выравниваются в конце.
+    def __init__(self, patients, visits_per_patient, doctors, medications,
+                 batch_size=5000, seed=0, progress=None):
+        self.patients = patients
+        self.visits_per_patient = visits_per_patient
+        self.doctors = doctors
+        self.medications = medications
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        self.progress = progress
+        self.now = timezone.now()
+        self.next_ids = {}
+        self.written = {model._meta.db_table: 0 for model in SEED_MODELS}
+        # занятые (врач, слот) запланированных визитов: ограничение
+        # visits_no_overlap не пропустит пересечений
+        self.booked = set()
+
+    def next_id(self, model):
+        if model not in self.next_ids:
+            self.next_ids[model] = (model.objects.aggregate(m=Max("pk"))["m"] or 0) + 1
+        value = self.next_ids[model]
+        self.next_ids[model] += 1
+        return value
+
+    def write(self, model, rows):
+        if rows:
+            write_batch(model, model._meta.concrete_fields, rows)
+            self.written[model._meta.db_table] += len(rows)
+
+    def moment(self, days_back=730, days_ahead=30):
+        offset = self.random.uniform(-days_back, days_ahead)
+        return self.now + datetime.timedelta(days=offset)
+
+    def run(self):
+        with transaction.atomic():
+            self.doctor_ids = self.seed_doctors()
+            self.medication_ids = self.seed_medications()
+        key_id = key_cache.active_key_id() or create_key().id
+        self.cipher = key_cache.get(key_id)
+        self.key_id = key_id
+
+        for start in range(0, self.patients, self.batch_size):
+            with transaction.atomic():
+                self.seed_patient_batch(min(self.batch_size, self.patients - start))
+            if self.progress:
+                self.progress(self.written)
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), SEED_MODELS):
+                cursor.execute(sql)
+        invalidate_rows(Visit, [])
+        return self.written
+
+    def slot(self, moment):
+        # начало слота длиной VISIT_DURATION_MINUTES: визиты в разных слотах не пересекаются
+        step = settings.VISIT_DURATION_MINUTES * 60
+        return datetime.datetime.fromtimestamp(int(moment.timestamp()) // step * step, tz=datetime.timezone.utc)
+
+    def seed_doctors(self):
+        hashed = hash_password(SEED_PASSWORD)
+        users, doctors = [], []
+        for _ in range(self.doctors):
+            user_id = self.next_id(SystemUser)
+            first, last = self.random.choice(FIRST_NAMES), self.random.choice(LAST_NAMES)
+            users.append({"id": user_id, "email": f"doctor{user_id}@seed.medsys", "hashed_password": hashed,
+                          "full_name": f"{first} {last}", "role": "doctor",
+                          "created_at": self.now, "updated_at": self.now})
+            doctors.append({"user_id": user_id, "first_name": first, "last_name": last,
+                            "specialization": self.random.choice(SPECIALIZATIONS),
+                            "license_number": f"SEED-{user_id:08d}", "phone": None,
+                            "email": f"doctor{user_id}@seed.medsys", "created_at": self.now, "updated_at": None})
+        self.write(SystemUser, users)
+        self.write(Doctor, doctors)
+        return [row["user_id"] for row in doctors]
+
+    def seed_medications(self):
+        rows = []
+        for _ in range(self.medications):
+            medication_id = self.next_id(Medication)
+            rows.append({"id": medication_id, "name": f"Препарат {medication_id}",
+                         "dosage": f"{self.random.choice((5, 10, 20, 50, 100))} мг",
+                         "instruction": "По 1 таблетке в день", "created_at": self.now, "updated_at": None})
+        self.write(Medication, rows)
+        return [row["id"] for row in rows]
+
+    def seed_patient_batch(self, count):
+        rnd = self.random
+        patients, aliases, visits = [], [], []
+        lab_tests, diagnoses, records, prescriptions, links = [], [], [], [], []
+
+        for _ in range(count):
+            patient_id = self.next_id(Patient)
+            first, last = rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES)
+            created = self.moment(days_ahead=0)
+            patients.append({"id": patient_id, "first_name": first, "last_name": last,
+                             "birth_date": datetime.date(rnd.randint(1940, 2020), rnd.randint(1, 12), rnd.randint(1, 28)),
+                             "phone": f"+7{9000000000 + patient_id}", "email": f"patient{patient_id}@seed.medsys",
+                             "created_at": created, "updated_at": None})
+
+            alias_id = self.next_id(Alias)
+            encrypted, iv = encrypt_with(self.cipher, f"{last} {first}")
+            aliases.append({"id": alias_id, "patient_id": patient_id, "encrypted_data": encrypted,
+                            "key_id": self.key_id, "iv": iv, "created_at": created, "updated_at": None})
+
+            for _ in range(self.visits_per_patient):
+                visit_id = self.next_id(Visit)
+                visit_date = self.moment()
+                doctor_id = rnd.choice(self.doctor_ids)
+                if visit_date > self.now:
+                    visit_date = self.slot(visit_date)
+                    status = "cancelled" if (doctor_id, visit_date) in self.booked else "scheduled"
+                    self.booked.add((doctor_id, visit_date))
+                else:
+                    status = rnd.choice(("completed", "completed", "completed", "cancelled"))
+                visits.append({"id": visit_id, "alias_id": alias_id, "doctor_id": doctor_id,
+                               "visit_date": visit_date, "reason": rnd.choice(REASONS), "status": status,
+                               "created_at": min(visit_date, self.now), "updated_at": None})
+                if status != "completed":
+                    continue
+
+                lab_tests.append({"id": self.next_id(LabTest), "visit_id": visit_id,
+                                  "test_type": rnd.choice(TEST_TYPES), "ordered_at": visit_date,
+                                  "result": "В пределах нормы", "result_at": visit_date + datetime.timedelta(days=1),
+                                  "created_at": visit_date, "updated_at": None})
+                diagnoses.append({"id": self.next_id(Diagnosis), "visit_id": visit_id,
+                                  "icd_code": rnd.choice(ICD_CODES), "description": rnd.choice(REASONS),
+                                  "created_at": visit_date, "updated_at": None})
+                records.append({"id": self.next_id(MedicalRecord), "visit_id": visit_id,
+                                "record_type": rnd.choice(RECORD_TYPES),
+                                "content": f"{rnd.choice(REASONS)}. Состояние удовлетворительное.",
+                                "created_at": visit_date, "updated_at": None})
+                if rnd.random() < 0.5:
+                    prescription_id = self.next_id(Prescription)
+                    prescriptions.append({"id": prescription_id, "visit_id": visit_id, "adjustments": None,
+                                          "created_at": visit_date, "updated_at": None})
+                    for medication_id in rnd.sample(self.medication_ids, min(2, len(self.medication_ids))):
+                        links.append({"id": self.next_id(PrescriptionMedication),
+                                      "prescription_id": prescription_id, "medication_id": medication_id})
+
+        self.write(Patient, patients)
+        self.write(Alias, aliases)
+        self.write(Visit, visits)
+        self.write(LabTest, lab_tests)
+        self.write(Diagnosis, diagnoses)
+        self.write(MedicalRecord, records)
+        self.write(Prescription, prescriptions)
+        self.write(PrescriptionMedication, links)
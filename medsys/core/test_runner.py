@@ -0,0 +1,31 @@
+from django.db import connections
+from django.db.migrations.loader import MigrationLoader
+from django.db.models.signals import pre_migrate
+from django.test.runner import DiscoverRunner
+
+# Миграция 0002 переносит модели только в состояние: в рабочей БД таблицы
+# создаёт внешняя схема (роли, триггеры, pgcrypto). В тестовой БД её нет,
+# поэтому перед миграциями core таблицы создаются по состоянию 0002, иначе
+# индексы 0003 и секционирование 0004 падают на отсутствующих таблицах
+SCHEMA_STATE = ("core", "0002_schema_state")
+
+
+def create_base_schema(sender, using, **kwargs):
+    if sender.name != "core":
+        return
+    connection = connections[using]
+    existing = set(connection.introspection.table_names())
+    state = MigrationLoader(connection).project_state(SCHEMA_STATE)
+    with connection.schema_editor() as editor:
+        for model in state.apps.get_app_config("core").get_models():
+            if model._meta.db_table not in existing:
+                editor.create_model(model)
+
+
+class SchemaTestRunner(DiscoverRunner):
+    def setup_databases(self, **kwargs):
+        pre_migrate.connect(create_base_schema, dispatch_uid="core.create_base_schema")
+        try:
+            return super().setup_databases(**kwargs)
+        finally:
+            pre_migrate.disconnect(dispatch_uid="core.create_base_schema")
@@ -0,0 +1,34 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from core.analytics import refresh_rollups, top_diagnoses, visits_summary
+from core.models import Diagnosis, Doctor, RollupWatermark, SystemUser, Visit
+
+
+class RebuildTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = SystemUser.objects.create(email="doctor@example.com", hashed_password="x", role="doctor")
+        cls.doctor = Doctor.objects.create(user=user, last_name="Петров", license_number="L-1")
+        cls.moment = timezone.now() - datetime.timedelta(days=90)
+        cls.day = timezone.localtime(cls.moment).date()
+        cls.visit = Visit.objects.create(doctor=cls.doctor, status="scheduled", visit_date=cls.moment)
+        cls.diagnosis = Diagnosis.objects.create(visit=cls.visit, icd_code="J06.9", created_at=cls.moment)
+
+    def test_full_rebuild_reflects_old_changes(self):
+        refresh_rollups(full=True)
+        self.assertEqual([row["status"] for row in visits_summary(self.day, self.day)], ["scheduled"])
+        self.assertEqual(top_diagnoses(self.day, self.day), [{"icd_code": "J06.9", "diagnoses": 1}])
+
+        # за пределами окна ANALYTICS_RECHECK_DAYS: инкрементальное обновление этого не видит
+        Visit.objects.filter(id=self.visit.id).update(status="completed")
+        self.diagnosis.delete()
+        refresh_rollups(full=True)
+        self.assertEqual([row["status"] for row in visits_summary(self.day, self.day)], ["completed"])
+        self.assertEqual(top_diagnoses(self.day, self.day), [])
+
+        # отметки стоят на учтённых id: инкрементальный проход их не повторит
+        watermark = RollupWatermark.objects.get(name="visits")
+        self.assertEqual((watermark.last_id, watermark.seen_id), (self.visit.id, self.visit.id))
@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from core import cache
+from core.cache import MISSING, LocalLRU, TwoLevelCache, get_identity
+from core.models import SystemUser
+
+
+class FakeSharedCache:
+    # общий уровень (Redis) в памяти теста: get/set/delete_many как у кеша Django
+    def __init__(self):
+        self.items = {}
+
+    def get(self, key, default=None):
+        return self.items.get(key, default)
+
+    def set(self, key, value, timeout=None):
+        self.items[key] = value
+
+    def delete_many(self, keys):
+        for key in keys:
+            self.items.pop(key, None)
+
+
+class TwoLevelCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.shared = FakeSharedCache()
+        self.cache = TwoLevelCache("test", local=LocalLRU(size=10, ttl=60), shared=self.shared)
+        self.loads = 0
+
+    def loader(self):
+        self.loads += 1
+        return f"value-{self.loads}"
+
+    def test_miss_then_local_and_shared_hits(self):
+        self.assertEqual(self.cache.get("k", self.loader), "value-1")
+        self.assertEqual(self.shared.get(self.cache.make_key("k")), "value-1")
+        self.assertEqual(self.cache.get("k", self.loader), "value-1")
+        # другой процесс: локального уровня нет, значение из общего
+        self.cache.clear_local()
+        self.assertEqual(self.cache.get("k", self.loader), "value-1")
+        self.assertEqual(self.loads, 1)
+
+        stats = self.cache.stats()
+        self.assertEqual((stats["local"], stats["shared"], stats["miss"]), (1, 1, 1))
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["hit_rate"], round(2 / 3, 4))
+
+    def test_delete_clears_both_levels(self):
+        self.cache.get("k", self.loader)
+        self.cache.delete("k")
+        self.assertIs(self.cache.local.get("k"), MISSING)
+        self.assertIsNone(self.shared.get(self.cache.make_key("k")))
+        self.assertEqual(self.cache.get("k", self.loader), "value-2")
+        self.assertEqual(self.cache.stats()["hit_rate"], 0.0)
+
+    def test_empty_stats(self):
+        self.assertIsNone(self.cache.stats()["hit_rate"])
+
+
+class IdentityInvalidationTests(TestCase):
+    def setUp(self):
+        self.shared = FakeSharedCache()
+        patcher = mock.patch.object(cache, "identity_cache", TwoLevelCache("identity", shared=self.shared))
+        self.identity_cache = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = SystemUser.objects.create(email="admin@example.com", hashed_password="x", role="admin")
+
+    def test_save_invalidates_after_commit(self):
+        self.assertEqual(get_identity(self.user.id)[1], "admin")
+        key = self.identity_cache.make_key(self.user.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.role = "doctor"
+            self.user.save()
+            self.assertIsNone(self.shared.get(key))
+            # параллельный запрос до коммита видит старую роль и кладёт её обратно
+            self.shared.set(key, (self.user.id, "admin", None, self.user.email))
+
+        self.identity_cache.clear_local()
+        self.assertEqual(get_identity(self.user.id)[1], "doctor")
+
+    def test_delete_invalidates(self):
+        get_identity(self.user.id)
+        user_id = self.user.id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertIsNone(get_identity(user_id))
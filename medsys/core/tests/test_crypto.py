@@ -0,0 +1,19 @@
+from django.test import TestCase
+
+from core.crypto import create_key, decrypt_rows, encrypt_with, key_cache
+from core.models import EncryptionKey
+
+
+class DecryptRowsTests(TestCase):
+    def setUp(self):
+        key_cache.clear()
+        self.addCleanup(key_cache.clear)
+
+    def test_bad_key_length_skipped(self):
+        key = create_key()
+        broken = EncryptionKey.objects.create(key_value=b"short")
+        encrypted, iv = encrypt_with(key_cache.get(key.id), "Иванов Иван")
+
+        with self.assertLogs("core.crypto", "ERROR"):
+            result = decrypt_rows([(key.id, encrypted, iv), (broken.id, encrypted, iv)])
+        self.assertEqual(result, ["Иванов Иван", None])
@@ -0,0 +1,48 @@
+import csv
+import os
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from core.jobs import Progress, run_import_data, save_upload
+from core.middleware import SessionUser
+from core.models import Job, Patient, SystemUser
+
+CSV_DATA = (
+    "first_name,last_name,phone,email\n"
+    "Иван,Иванов,+79161234567,ivanov@example.com\n"
+    "Пётр,Петров,+79161234568,not-an-email\n"
+    "Анна,Смирнова,+79161234569,smirnova@example.com\n"
+).encode()
+
+
+class ImportJobTests(TestCase):
+    def setUp(self):
+        results = tempfile.TemporaryDirectory()
+        self.addCleanup(results.cleanup)
+        patcher = override_settings(JOB_RESULTS_DIR=results.name)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        self.result = os.path.join(results.name, "result.csv")
+
+        admin = SystemUser.objects.create(email="admin@example.com", hashed_password="x", role="admin")
+        self.user = SessionUser(admin.id, admin.role)
+        self.job = Job.objects.create(user_id=admin.id, kind="import_data")
+
+    def test_import_writes_rows_and_error_report(self):
+        upload = save_upload(SimpleUploadedFile("patients.csv", CSV_DATA))
+        progress = Progress(self.job, self.user)
+        # журнал действий пишет фоновый буфер, который не видит транзакцию теста
+        with mock.patch("core.jobs.log_action") as log_action:
+            run_import_data({"table": "patients", "upload": upload, "filename": "patients.csv"},
+                            self.result, progress)
+        log_action.assert_called_once()
+
+        self.assertEqual(sorted(Patient.objects.values_list("last_name", flat=True)), ["Иванов", "Смирнова"])
+        self.assertEqual((progress.total, progress.done), (3, 2))
+        with open(self.result, encoding="utf-8") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual([row[:2] for row in rows], [["line", "field"], ["3", "email"]])
+        self.assertFalse(os.path.exists(upload))
@@ -0,0 +1,23 @@
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.metrics import MetricsMiddleware, QueryTimer
+
+
+@override_settings(METRICS_SAMPLE_RATE=1.0)
+class MetricsMiddlewareTests(SimpleTestCase):
+    def test_timer_on_every_alias(self):
+        seen = {}
+
+        def view(request):
+            for alias in connections:
+                seen[alias] = [w for w in connections[alias].execute_wrappers if isinstance(w, QueryTimer)]
+            return HttpResponse()
+
+        MetricsMiddleware(view)(RequestFactory().get("/"))
+        self.assertEqual(set(seen), set(connections))
+        for alias, timers in seen.items():
+            self.assertEqual(len(timers), 1, alias)
+            self.assertIs(timers[0], seen["default"][0])
+            self.assertEqual(connections[alias].execute_wrappers, [])
@@ -0,0 +1,24 @@
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import TestCase
+from django.utils import timezone
+
+from core import partitions
+from core.partitions import add_months, create_partition, ensure_partitions, month_start
+
+
+class CreatePartitionTests(TestCase):
+    def test_month_covered_by_legacy_partition(self):
+        # action_logs_legacy (миграция 0004) покрывает текущий месяц
+        self.assertFalse(create_partition(month_start(timezone.now())))
+        self.assertNotIn(partitions.partition_name(timezone.now()), ensure_partitions(months_ahead=0))
+
+    def test_new_month(self):
+        month = add_months(month_start(timezone.now()), 2)
+        self.assertTrue(create_partition(month))
+        self.assertIn(partitions.partition_name(month), {name for name, _, _ in partitions.list_partitions()})
+
+    def test_other_errors_raised(self):
+        with mock.patch.object(partitions, "PARENT_TABLE", "system_users"), self.assertRaises(DatabaseError):
+            create_partition(add_months(month_start(timezone.now()), 2))
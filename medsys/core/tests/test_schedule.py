@@ -0,0 +1,41 @@
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Doctor, SystemUser, Visit
+from core.schedule import ScheduleConflict, day_grid, find_free_slots, save_visit, warm_schedule
+
+
+class ScheduleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = SystemUser.objects.create(email="doctor@example.com", hashed_password="x", role="doctor")
+        cls.doctor = Doctor.objects.create(user=user, last_name="Петров", license_number="L-1")
+        cls.day = timezone.localdate() + datetime.timedelta(days=1)
+        cls.slots, _ = day_grid(cls.day)
+
+    def setUp(self):
+        warm_schedule.clear()
+        self.addCleanup(warm_schedule.clear)
+
+    def free(self):
+        return find_free_slots([self.doctor.pk], self.day, 1)[self.doctor.pk][self.day]
+
+    def test_save_visit_invalidates_warm_index(self):
+        self.assertEqual(self.free(), self.slots)
+        with self.captureOnCommitCallbacks(execute=True):
+            save_visit(Visit(doctor=self.doctor, status="scheduled", visit_date=self.slots[0]))
+        self.assertEqual(self.free(), self.slots[1:])
+
+    def test_overlap_rejected(self):
+        save_visit(Visit(doctor=self.doctor, status="scheduled", visit_date=self.slots[0]))
+        shifted = self.slots[0] + datetime.timedelta(minutes=10)
+        with self.assertRaises(ScheduleConflict):
+            save_visit(Visit(doctor=self.doctor, status="scheduled", visit_date=shifted))
+        # мимо save_visit (импорт, сидер) — ограничение visits_no_overlap
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Visit.objects.bulk_create([Visit(doctor=self.doctor, status="scheduled", visit_date=shifted)])
+        Visit.objects.bulk_create([Visit(doctor=self.doctor, status="cancelled", visit_date=shifted),
+                                   Visit(doctor=self.doctor, status="scheduled", visit_date=self.slots[1])])
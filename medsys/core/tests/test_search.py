@@ -0,0 +1,38 @@
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Doctor, MedicalRecord, Patient, SystemUser, Visit
+from core.search import search
+
+
+def found_ids(scope, text):
+    return [row["id"] for row in search(scope, text, {})["results"]]
+
+
+# search_vector, триггеры и индексы создаются миграцией 0007_search
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = Patient.objects.create(first_name="Иван", last_name="Иванов",
+                                             phone="+79161234567", email="ivanov@example.com")
+        Patient.objects.create(first_name="Пётр", last_name="Сидоров", phone="+79990000000")
+        user = SystemUser.objects.create(email="doctor@example.com", hashed_password="x", role="doctor")
+        doctor = Doctor.objects.create(user=user, last_name="Петров", license_number="L-1")
+        visit = Visit.objects.create(doctor=doctor, status="completed", visit_date=timezone.now())
+        cls.record = MedicalRecord.objects.create(visit=visit, record_type="осмотр",
+                                                  content="Жалобы на головную боль и слабость")
+
+    def test_patient_by_name_and_phone(self):
+        self.assertEqual(found_ids("patients", "Иванов"), [self.patient.id])
+        self.assertEqual(found_ids("patients", "1234567"), [self.patient.id])
+
+    def test_vector_follows_source_columns(self):
+        self.patient.last_name = "Смирнов"
+        self.patient.save()
+        self.assertEqual(found_ids("patients", "Смирнов"), [self.patient.id])
+        self.assertEqual(found_ids("patients", "Иванов"), [])
+
+    def test_record_by_word_form(self):
+        results = search("medical_records", "боли", {})["results"]
+        self.assertEqual([row["id"] for row in results], [self.record.id])
+        self.assertIn("<b>", results[0]["snippet"])
@@ -0,0 +1,75 @@
+import datetime
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import (Alias, Diagnosis, Doctor, EncryptionKey, LabTest, MedicalRecord,
+                         Medication, Patient, Prescription, PrescriptionMedication,
+                         SystemUser, Visit)
+from core.timeline import load_timeline
+
+# пациент, визиты с врачами, анализы, диагнозы, записи, назначения, лекарства
+TIMELINE_QUERIES = 7
+
+
+class TimelineQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        key = EncryptionKey.objects.create(key_value=b"k")
+        cls.patient = Patient.objects.create(first_name="Иван", last_name="Иванов")
+        cls.alias = Alias.objects.create(patient=cls.patient, encrypted_data="x", key=key, iv=b"iv")
+        user = SystemUser.objects.create(email="doctor@example.com", hashed_password="x", role="doctor")
+        cls.doctor = Doctor.objects.create(user=user, last_name="Петров", license_number="L-1")
+        cls.medications = [Medication.objects.create(name=f"Препарат {i}") for i in range(3)]
+        cls.start = timezone.now() - datetime.timedelta(days=100)
+
+    def add_visits(self, count):
+        first = Visit.objects.count()
+        for i in range(first, first + count):
+            visit = Visit.objects.create(alias=self.alias, doctor=self.doctor, status="completed",
+                                         visit_date=self.start + datetime.timedelta(days=i))
+            LabTest.objects.create(visit=visit, test_type="ОАК", result="норма")
+            Diagnosis.objects.create(visit=visit, icd_code="J06.9")
+            MedicalRecord.objects.create(visit=visit, record_type="осмотр", content="...")
+            prescription = Prescription.objects.create(visit=visit)
+            for medication in self.medications[:2]:
+                PrescriptionMedication.objects.create(prescription=prescription, medication=medication)
+
+    def load(self):
+        with CaptureQueriesContext(connection) as queries:
+            timeline = load_timeline(self.patient.id, {"page_size": "50"})
+        return timeline, len(queries)
+
+    def test_query_count_does_not_grow_with_visits(self):
+        self.add_visits(1)
+        timeline, single = self.load()
+        self.assertEqual(len(timeline["visits"]), 1)
+
+        self.add_visits(19)
+        timeline, many = self.load()
+        self.assertEqual(len(timeline["visits"]), 20)
+        self.assertEqual(single, TIMELINE_QUERIES)
+        self.assertEqual(many, TIMELINE_QUERIES)
+
+        visit = timeline["visits"][0]
+        self.assertEqual(visit["doctor"]["last_name"], "Петров")
+        self.assertEqual(len(visit["lab_tests"]), 1)
+        self.assertEqual(len(visit["diagnoses"]), 1)
+        self.assertEqual(len(visit["medical_records"]), 1)
+        self.assertEqual(len(visit["prescriptions"][0]["medications"]), 2)
+
+    def test_next_page_uses_same_number_of_queries(self):
+        self.add_visits(5)
+        first = load_timeline(self.patient.id, {"page_size": "2"})
+        with self.assertNumQueries(TIMELINE_QUERIES):
+            second = load_timeline(self.patient.id, {"page_size": "2", "cursor": first["next_cursor"]})
+        self.assertEqual(len(second["visits"]), 2)
+        self.assertLess(second["visits"][0]["visit_date"], first["visits"][-1]["visit_date"])
+
+    def test_patient_without_visits(self):
+        with self.assertNumQueries(2):
+            timeline = load_timeline(self.patient.id, {})
+        self.assertEqual(timeline["visits"], [])
+        self.assertIsNone(timeline["next_cursor"])
@@ -0,0 +1,149 @@
+from django.db.models import Prefetch, Q
+
+from .models import (Alias, Diagnosis, LabTest, MedicalRecord, Medication,
+                     Patient, Prescription, Visit)
+from .pagination import decode_cursor, encode_cursor, parse_page_size
+
+PATIENT_FIELDS = ("id", "first_name", "last_name", "birth_date", "phone", "email")
+
+
+def visits_queryset(alias_id):
+    # Весь граф визитов за фиксированное число запросов:
+    # визиты + врачи, анализы, диагнозы, записи, назначения, лекарства
+    return (
+        Visit.objects
+        .filter(alias_id=alias_id)
+        .select_related("doctor")
+        .only("id", "visit_date", "reason", "status", "alias_id",
+              "doctor__user_id", "doctor__first_name", "doctor__last_name", "doctor__specialization")
+        .prefetch_related(
+            Prefetch("labtest_set", queryset=LabTest.objects
+                     .only("id", "visit_id", "test_type", "ordered_at", "result", "result_at")
+                     .order_by("ordered_at", "id")),
+            Prefetch("diagnosis_set", queryset=Diagnosis.objects
+                     .only("id", "visit_id", "icd_code", "description", "created_at")
+                     .order_by("created_at", "id")),
+            Prefetch("medicalrecord_set", queryset=MedicalRecord.objects
+                     .only("id", "visit_id", "record_type", "content", "created_at")
+                     .order_by("created_at", "id")),
+            Prefetch("prescription_set", queryset=Prescription.objects
+                     .only("id", "visit_id", "adjustments", "created_at")
+                     .order_by("created_at", "id")
+                     .prefetch_related(Prefetch("medications", queryset=Medication.objects
+                                                .only("id", "name", "dosage", "instruction")))),
+        )
+    )
+
+
+def serialize_visit(visit):
+    doctor = visit.doctor
+    return {
+        "id": visit.id,
+        "visit_date": visit.visit_date,
+        "reason": visit.reason,
+        "status": visit.status,
+        "doctor": {
+            "id": doctor.user_id,
+            "first_name": doctor.first_name,
+            "last_name": doctor.last_name,
+            "specialization": doctor.specialization,
+        } if doctor else None,
+        "lab_tests": [
+            {"id": t.id, "test_type": t.test_type, "ordered_at": t.ordered_at,
+             "result": t.result, "result_at": t.result_at}
+            for t in visit.labtest_set.all()
+        ],
+        "diagnoses": [
+            {"id": d.id, "icd_code": d.icd_code, "description": d.description, "created_at": d.created_at}
+            for d in visit.diagnosis_set.all()
+        ],
+        "medical_records": [
+            {"id": r.id, "record_type": r.record_type, "content": r.content, "created_at": r.created_at}
+            for r in visit.medicalrecord_set.all()
+        ],
+        "prescriptions": [
+            {"id": p.id, "adjustments": p.adjustments, "created_at": p.created_at,
+             "medications": [
+                 {"id": m.id, "name": m.name, "dosage": m.dosage, "instruction": m.instruction}
+                 for m in p.medications.all()
+             ]}
+            for p in visit.prescription_set.all()
+        ],
+    }
+
+
+def visits_page_query(queryset, params):
+    # Новые визиты первыми, курсор — (visit_date, id) последнего визита
+    page_size = parse_page_size(params.get("page_size"))
+    cursor = params.get("cursor")
+    position = decode_cursor(Visit, Visit._meta.get_field("visit_date"), cursor) if cursor else None
+    if position is not None:
+        visit_date, last_id = position
+        queryset = queryset.filter(Q(visit_date__lt=visit_date) | Q(visit_date=visit_date, id__lt=last_id))
+    return queryset.order_by("-visit_date", "-id")[:page_size + 1], page_size
+
+
+def split_page(visits, page_size):
+    next_cursor = None
+    if len(visits) > page_size:
+        visits = visits[:page_size]
+        next_cursor = encode_cursor(visits[-1].visit_date, visits[-1].id)
+    return visits, next_cursor
+
+
+def paginate_visits(queryset, params):
+    queryset, page_size = visits_page_query(queryset, params)
+    return split_page(list(queryset), page_size)
+
+
+async def apaginate_visits(queryset, params):
+    # prefetch_related выполняется и при асинхронном переборе
+    queryset, page_size = visits_page_query(queryset, params)
+    return split_page([visit async for visit in queryset], page_size)
+
+
+def patient_queryset(patient_id):
+    return (Patient.objects
+            .filter(id=patient_id)
+            .select_related("alias")
+            .only(*PATIENT_FIELDS, "alias__id", "alias__patient_id"))
+
+
+def alias_id_of(patient):
+    if patient is None:
+        raise Patient.DoesNotExist
+    try:
+        return patient.alias.id
+    except Alias.DoesNotExist:
+        return None
+
+
+def build_timeline(patient, visits, next_cursor, include_patient):
+    timeline = {
+        "patient_id": patient.id,
+        "visits": [serialize_visit(visit) for visit in visits],
+        "next_cursor": next_cursor,
+    }
+    if include_patient:
+        timeline["patient"] = {f: getattr(patient, f) for f in PATIENT_FIELDS}
+    return timeline
+
+
+def load_timeline(patient_id, params, include_patient=True):
+    patient = patient_queryset(patient_id).first()
+    alias_id = alias_id_of(patient)
+
+    visits, next_cursor = [], None
+    if alias_id is not None:
+        visits, next_cursor = paginate_visits(visits_queryset(alias_id), params)
+    return build_timeline(patient, visits, next_cursor, include_patient)
+
+
+async def aload_timeline(patient_id, params, include_patient=True):
+    patient = await patient_queryset(patient_id).afirst()
+    alias_id = alias_id_of(patient)
+
+    visits, next_cursor = [], None
+    if alias_id is not None:
+        visits, next_cursor = await apaginate_visits(visits_queryset(alias_id), params)
+    return build_timeline(patient, visits, next_cursor, include_patient)
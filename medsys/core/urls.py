@@ -1,7 +1,12 @@
 # app/urls.py
 from django.urls import path
 from .views import (login_view, logout_view,
-                    dashboard, add_employee, export_excel, edit_row, delete_row)
+                    dashboard, add_employee, export_excel, edit_row, delete_row,
+                    import_data, patient_timeline, free_slots, analytics,
+                    search_view, bulk_edit_rows, bulk_delete_rows,
+                    cache_stats_view, metrics_view, slow_queries_view,
+                    jobs_view, job_status, job_download, export_table,
+                    changes_view)
 
 urlpatterns = [
     path("", login_view, name="login"),
@@ -11,5 +16,21 @@ urlpatterns = [
     path('add_employee/', add_employee, name='add_employee'),
     path('edit_row/<str:table>/<int:row_id>/', edit_row, name='edit_row'),
     path('delete_row/', delete_row, name='delete_row'),
+    path('bulk_edit/', bulk_edit_rows, name='bulk_edit_rows'),
+    path('bulk_delete/', bulk_delete_rows, name='bulk_delete_rows'),
+    path('cache/stats/', cache_stats_view, name='cache_stats'),
+    # без завершающего слеша: путь по умолчанию для сборщика Prometheus
+    path('metrics', metrics_view, name='metrics'),
+    path('metrics/slow_queries/', slow_queries_view, name='slow_queries'),
     path('export_excel/', export_excel, name='export_excel'),
+    path('export/<str:table>/', export_table, name='export_table'),
+    path('changes/<str:table>/', changes_view, name='changes'),
+    path('jobs/', jobs_view, name='jobs'),
+    path('jobs/<int:job_id>/', job_status, name='job_status'),
+    path('jobs/<int:job_id>/download/', job_download, name='job_download'),
+    path('import/', import_data, name='import_data'),
+    path('patients/<int:patient_id>/timeline/', patient_timeline, name='patient_timeline'),
+    path('schedule/free_slots/', free_slots, name='free_slots'),
+    path('analytics/', analytics, name='analytics'),
+    path('search/', search_view, name='search'),
 ]
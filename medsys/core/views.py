@@ -1,53 +1,63 @@
-import io
-import openpyxl
+import datetime
+import os
 
+from django.contrib import messages
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse
+from django.conf import settings
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.urls import reverse
 from django.utils import timezone
-from .forms import LoginForm, AddAdminForm, AddDoctorForm
+from .forms import LoginForm, AddAdminForm, AddDoctorForm, ImportForm
 from .decorators import login_required
-from django.db import transaction, connection
-from .models import (
-    SystemUser,
-    Doctor,
-    Patient,
-    Alias,
-    Visit,
-    MedicalRecord,
-    Diagnosis,
-    Prescription,
-    Medication,
-    LabTest,
-    ActionLog,
-)
-
-TABLES = {
-    "system_users": SystemUser,
-    "doctors": Doctor,
-    "patients": Patient,
-    "aliases": Alias,
-    "visits": Visit,
-    "medical_records": MedicalRecord,
-    "diagnoses": Diagnosis,
-    "prescriptions": Prescription,
-    "medications": Medication,
-    "lab_tests": LabTest,
-    "action_logs": ActionLog,
-}
+from .analytics import top_diagnoses, top_medications, visits_summary
+from .audit import log_action
+from .bulk import BulkError, bulk_delete, bulk_update
+from .cache import cache_stats, get_doctor_ids
+from .changes import WatermarkError, WatermarkExpired, read_changes
+from .copy_export import FORMATS, export_content_type, export_filename, stream_table
+from .exports import download_response, stream_response
+from .jobs import JOB_KINDS, JobError, enqueue, recent_jobs, save_upload, serialize_job
+from .metrics import metrics
+from .middleware import SessionUser, remember_user
+from .constants import SEARCH_MIN_LENGTH
+from .pagination import apaginate
+from .replica import choose_read_alias, replica_reads
+from .registry import get_table, tables_by_role
+from .search import scopes_for_role, search
+from .schedule import ScheduleConflict, find_free_slots, save_visit
+from .passwords import (burn_password_check, hash_password, is_bcrypt,
+                        needs_rehash, verify_password, verify_password_in_db)
+from .timeline import aload_timeline
+from .models import SystemUser, Doctor, Job, Patient
 
 
 def authenticate_user(email, plain_password):
-    with connection.cursor() as cursor:
-        cursor.execute("""
-                       SELECT id, role
-                       FROM system_users
-                       WHERE email = %s
-                         AND hashed_password = crypt(%s, hashed_password) LIMIT 1
-                       """, [email, plain_password])
+    row = (SystemUser.objects
+           .filter(email=email)
+           .values_list("id", "role", "full_name", "email", "hashed_password")
+           .first())
 
-        row = cursor.fetchone()
+    if row is None:
+        burn_password_check(plain_password)
+        return None
 
-    return row
+    *identity, hashed = row
+    user_id = identity[0]
+
+    if is_bcrypt(hashed):
+        valid = verify_password(plain_password, hashed)
+    else:
+        valid = verify_password_in_db(user_id, plain_password)
+
+    if not valid:
+        return None
+
+    if needs_rehash(hashed):
+        SystemUser.objects.filter(id=user_id).update(hashed_password=hash_password(plain_password))
+
+    return identity
 
 
 def login_view(request):
@@ -62,9 +72,9 @@ def login_view(request):
             result = authenticate_user(email, password)
 
             if result:
-                user_id, role = result
-                request.session["user_id"] = user_id
-                request.session["user_role"] = role
+                user = SessionUser(*result)
+                remember_user(request, user)
+                log_action(user.id, "login", "system_users", user.id)
                 return redirect("dashboard")
             else:
                 error = "Неверный email или пароль"
@@ -78,68 +88,53 @@ def login_view(request):
 
 
 def logout_view(request):
-    with connection.cursor() as cursor:
-        cursor.execute("RESET ROLE")
+    user = getattr(request, "current_user", None)
+    if user:
+        log_action(user.id, "logout", "system_users", user.id)
     request.session.flush()
     return redirect("login")
 
 
 @login_required
-def dashboard(request):
-    user_id = request.session.get("user_id")
-    if not user_id:
-        return redirect("login")
-
-    try:
-        user = SystemUser.objects.get(id=user_id)
-    except SystemUser.DoesNotExist:
-        return redirect("login")
-
-    with connection.cursor() as cursor:
-        cursor.execute("SET app.current_user_id = %s", [user.id])
-        cursor.execute("SET app.current_user_role = %s", [user.role])
-        if user.role == "admin":
-            cursor.execute("SET ROLE admin_role")
-        else:
-            cursor.execute("SET ROLE doctor_role")
+@replica_reads
+async def dashboard(request):
+    user = request.current_user
 
-    available_tables = list(TABLES.keys())
-    if user.role == "doctor":
-        for forbidden in ("patients", "aliases", "action_logs"):
-            if forbidden in available_tables:
-                available_tables.remove(forbidden)
+    available_tables = tables_by_role.get(user.role, [])
 
-    selected_table = request.GET.get("table")
-    if selected_table not in available_tables:
-        selected_table = None
+    spec = get_table(request.GET.get("table"), user.role)
+    selected_table = spec.name if spec else None
 
     table_data = None
     columns = None
-
-    if selected_table:
-        model = TABLES[selected_table]
-
-        fields = []
-        for field in model._meta.fields:
-            if field.get_internal_type() == "ForeignKey":
-                fields.append(field.attname)
-            else:
-                fields.append(field.name)
-
-        columns = fields
-        if selected_table == "doctors":
-            table_data = model.objects.select_related('user').values(*fields, 'user_id')
+    page = None
+
+    if spec:
+        columns = spec.columns
+        page = await apaginate(spec.model, spec.fields, request.GET)
+        # вычисляемые колонки (расшифровка) обращаются к БД
+        if spec.render:
+            table_data = await sync_to_async(spec.display_rows)(page["rows"])
         else:
-            table_data = model.objects.values(*fields)
+            table_data = spec.display_rows(page["rows"])
+
+    jobs = [job async for job in recent_jobs(user.id)]
 
     add_admin_form = AddAdminForm()
     add_doctor_form = AddDoctorForm()
 
-    return render(request, "dashboard.html", {
+    # контекст-процессоры (сообщения, сессия) синхронные
+    return await sync_to_async(render)(request, "dashboard.html", {
         "tables": available_tables,
         "selected_table": selected_table,
         "table_data": table_data,
         "columns": columns,
+        "pk_index": spec.pk_index if spec else None,
+        "row_actions": user.role == "admin",
+        "editable": spec is not None and user.role in spec.edit_roles,
+        "bulk_fields": list(spec.bulk_fields) if spec else None,
+        "page": page,
+        "jobs": jobs,
         "current_user": user,
         "form_admin": add_admin_form,
         "form_doctor": add_doctor_form
@@ -148,14 +143,7 @@ def dashboard(request):
 
 @login_required
 def add_employee(request):
-    user_id = request.session.get("user_id")
-    if not user_id:
-        return redirect("login")
-    try:
-        user = SystemUser.objects.get(id=user_id)
-    except SystemUser.DoesNotExist:
-        return redirect("login")
-
+    user = request.current_user
     if user.role != "admin":
         return redirect("dashboard")
 
@@ -172,7 +160,7 @@ def add_employee(request):
             new_user = SystemUser.objects.create(
                 full_name=data["full_name"],
                 email=data["email"],
-                hashed_password=data["hashed_password"],
+                hashed_password=hash_password(data["hashed_password"]),
                 role=role
             )
             if role == "doctor":
@@ -201,126 +189,343 @@ def add_employee(request):
     })
 
 
-from openpyxl.utils import get_column_letter
+@login_required
+def import_data(request):
+    user = request.current_user
+    if user.role != "admin":
+        return redirect("dashboard")
+
+    if request.method == "POST":
+        form = ImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            # импорт выполняет воркер run_jobs: в транзакции запроса
+            # (CurrentUserMiddleware) все пачки коммитились бы только вместе
+            upload = form.cleaned_data["file"]
+            table = form.cleaned_data["table"]
+            path = save_upload(upload)
+            try:
+                job = enqueue(user, "import_data", {"table": table, "upload": path, "filename": upload.name})
+            except JobError as e:
+                os.remove(path)
+                form.add_error(None, str(e))
+            else:
+                log_action(user.id, "import", table, entity_id=job.id, details=upload.name)
+                messages.success(request, f"Импорт поставлен в очередь, задание {job.id}; "
+                                          f"отчёт об ошибках — в результате задания")
+                return redirect("dashboard")
+    else:
+        form = ImportForm()
+
+    return render(request, "import_data.html", {"form": form})
 
 
 @login_required
-def export_excel(request):
-    user = SystemUser.objects.get(id=request.session["user_id"])
+@replica_reads
+async def patient_timeline(request, patient_id):
+    user = request.current_user
+    try:
+        # персональные данные пациента видит только администратор
+        timeline = await aload_timeline(patient_id, request.GET, include_patient=user.role == "admin")
+    except Patient.DoesNotExist:
+        raise Http404("Пациент не найден")
+    return JsonResponse(timeline)
+
+
+@login_required
+def free_slots(request):
+    try:
+        start_day = datetime.date.fromisoformat(request.GET["start"]) if "start" in request.GET else timezone.localdate()
+        days = min(max(int(request.GET.get("days", 7)), 1), 31)
+        doctor_ids = [int(d) for d in request.GET.getlist("doctor")]
+    except ValueError:
+        return JsonResponse({"error": "Неверные параметры"}, status=400)
+
+    if not doctor_ids:
+        doctor_ids = get_doctor_ids()
+
+    slots = find_free_slots(doctor_ids, start_day, days)
+    return JsonResponse({
+        str(doctor_id): {day.isoformat(): [s.isoformat() for s in day_slots] for day, day_slots in by_day.items()}
+        for doctor_id, by_day in slots.items()
+    })
+
+
+@login_required
+@replica_reads
+async def search_view(request):
+    user = request.current_user
+    text = request.GET.get("q", "").strip()
+    if len(text) < SEARCH_MIN_LENGTH:
+        return JsonResponse({"error": f"Запрос должен содержать не менее {SEARCH_MIN_LENGTH} символов"}, status=400)
+
+    scopes = scopes_for_role(user.role)
+    selected = request.GET.get("scope")
+    if selected:
+        if selected not in scopes:
+            return JsonResponse({"error": "Область поиска недоступна"}, status=403)
+        scopes = [selected]
+
+    return JsonResponse({scope: await sync_to_async(search)(scope, text, request.GET) for scope in scopes})
+
+
+@login_required
+@replica_reads
+def analytics(request):
+    user = request.current_user
     if user.role != "admin":
         return redirect("dashboard")
 
-    wb = openpyxl.Workbook()
-    wb.remove(wb.active)
-
-    TABLES_TO_EXPORT = {k: v for k, v in TABLES.items() if k != "encryption_keys"}
-
-    for table_name, model in TABLES_TO_EXPORT.items():
-        ws = wb.create_sheet(title=table_name)
-        fields = [f.name for f in model._meta.fields]
-
-        ws.append(fields)
-
-        for obj in model.objects.all():
-            row = []
-            for f in fields:
-                val = getattr(obj, f)
-                if hasattr(val, "__str__"):
-                    val = str(val)
-                row.append(val)
-            ws.append(row)
-
-        # автоширина колонок
-        for i, column in enumerate(ws.columns, start=1):
-            max_length = 0
-            for cell in column:
-                if cell.value:
-                    max_length = max(max_length, len(str(cell.value)))
-            ws.column_dimensions[get_column_letter(i)].width = max_length + 2  # +2 для отступа
-
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    response = HttpResponse(
-        output,
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-    response['Content-Disposition'] = 'attachment; filename="report.xlsx"'
-    return response
+    try:
+        end = datetime.date.fromisoformat(request.GET["end"]) if "end" in request.GET else timezone.localdate()
+        start = (datetime.date.fromisoformat(request.GET["start"]) if "start" in request.GET
+                 else end - datetime.timedelta(days=30))
+        doctor_id = int(request.GET["doctor"]) if "doctor" in request.GET else None
+    except ValueError:
+        return JsonResponse({"error": "Неверные параметры"}, status=400)
+
+    return JsonResponse({
+        "start": start,
+        "end": end,
+        "visits": visits_summary(start, end, doctor_id),
+        "top_diagnoses": top_diagnoses(start, end),
+        "top_medications": top_medications(start, end),
+    })
 
 
 @login_required
-def edit_row(request, table, row_id):
-    model = TABLES.get(table)
-    if not model:
+def cache_stats_view(request):
+    if request.current_user.role != "admin":
         return redirect("dashboard")
+    return JsonResponse(cache_stats())
 
-    user = SystemUser.objects.get(id=request.session["user_id"])
 
-    if user.role != "admin":
+def can_read_metrics(request):
+    user = getattr(request, "current_user", None)
+    if user is not None and user.role == "admin":
+        return True
+    token = settings.METRICS_TOKEN
+    return bool(token) and constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}")
+
+
+def metrics_view(request):
+    if not can_read_metrics(request):
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def slow_queries_view(request):
+    if not can_read_metrics(request):
+        return HttpResponse(status=403)
+    return JsonResponse(metrics.slow_queries())
+
+
+@login_required
+def export_excel(request):
+    # выгрузку собирает воркер run_jobs, веб-процесс только ставит задание
+    user = request.current_user
+    if request.method != "POST" or user.role != "admin":
         return redirect("dashboard")
 
-    if table == "doctors":
-        row = get_object_or_404(model, user_id=row_id)
+    try:
+        job = enqueue(user, "export_excel")
+    except JobError as e:
+        messages.error(request, str(e))
     else:
-        row = get_object_or_404(model, id=row_id)
+        log_action(user.id, "export", "all_tables", entity_id=job.id, details="report.xlsx")
+        messages.success(request, f"Выгрузка поставлена в очередь, задание {job.id}")
+    return redirect("dashboard")
 
-    if request.method == "POST":
-        for field in model._meta.fields:
-            name = field.name
 
-            if name in ("id", "hashed_password", "created_at", "updated_at"):
-                continue
+@login_required
+def export_table(request, table):
+    # CSV/JSONL одной таблицы через COPY, сжатие gzip на лету (?gzip=0 — без)
+    user = request.current_user
+    spec = get_table(table, user.role)
+    if spec is None:
+        raise Http404("Таблица не найдена")
+    fmt = request.GET.get("format", "csv")
+    if fmt not in FORMATS:
+        return JsonResponse({"error": f"Формат: {', '.join(FORMATS)}"}, status=400)
+    compress = request.GET.get("gzip", "1") != "0"
+
+    log_action(user.id, "export", table, details=fmt)
+    return stream_response(
+        request,
+        stream_table(spec.model, fmt, user, compress, choose_read_alias(request)),
+        export_filename(table, fmt, compress),
+        export_content_type(fmt, compress),
+    )
+
+
+@login_required
+def changes_view(request, table):
+    # Инкрементальная выгрузка: строки, изменённые после ?since=, и id
+    # удалённых. Клиент передаёт watermark ответа в следующий запрос,
+    # пока has_more
+    user = request.current_user
+    if user.role != "admin":
+        return redirect("dashboard")
+    spec = get_table(table)
+    if spec is None:
+        raise Http404("Таблица не найдена")
+
+    try:
+        result = read_changes(table, spec.model, request.GET.get("since"), request.GET.get("limit"))
+    except WatermarkExpired as e:
+        return JsonResponse({"error": str(e)}, status=410)
+    except WatermarkError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    log_action(user.id, "export", table, details="changes")
+    return JsonResponse(result)
+
+
+def job_json(job):
+    data = serialize_job(job)
+    data["url"] = reverse("job_status", args=[job.id])
+    if job.status == "done":
+        data["download_url"] = reverse("job_download", args=[job.id])
+    return data
+
+
+@login_required
+def jobs_view(request):
+    user = request.current_user
+    if request.method != "POST":
+        return JsonResponse({"jobs": [job_json(job) for job in recent_jobs(user.id)]})
+
+    kind = request.POST.get("kind")
+    try:
+        job = enqueue(user, kind)
+    except JobError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    log_action(user.id, "enqueue", kind, entity_id=job.id)
+    return JsonResponse(job_json(job), status=202)
+
+
+@login_required
+def job_status(request, job_id):
+    job = get_object_or_404(Job, id=job_id, user_id=request.current_user.id)
+    return JsonResponse(job_json(job))
+
+
+@login_required
+def job_download(request, job_id):
+    job = get_object_or_404(Job, id=job_id, user_id=request.current_user.id)
+    if job.status == "expired":
+        return JsonResponse({"error": "Срок хранения результата истёк"}, status=410)
+    if job.status != "done":
+        return JsonResponse({"error": "Задание ещё не завершено"}, status=409)
+
+    spec = JOB_KINDS[job.kind]
+    try:
+        output = open(job.result_path, "rb")
+    except FileNotFoundError:
+        return JsonResponse({"error": "Файл результата не найден"}, status=410)
+    log_action(job.user_id, "download", job.kind, entity_id=job.id, details=spec.filename)
+    return download_response(request, output, spec.filename, spec.content_type)
+
+
+@login_required
+def edit_row(request, table, row_id):
+    spec = get_table(table)
+    if not spec:
+        return redirect("dashboard")
+
+    user = request.current_user
 
+    if user.role not in spec.edit_roles:
+        return redirect("dashboard")
+
+    row = get_object_or_404(spec.model, pk=row_id)
+
+    error = None
+    if request.method == "POST":
+        for name, related_model in spec.edit_fields:
             value = request.POST.get(name)
 
-            if hasattr(field, "related_model") and field.related_model and value:
+            if related_model and value:
                 try:
-                    fk_instance = field.related_model.objects.get(pk=int(value))
+                    fk_instance = related_model.objects.get(pk=int(value))
                     setattr(row, name, fk_instance)
-                except (field.related_model.DoesNotExist, ValueError, TypeError):
+                except (related_model.DoesNotExist, ValueError, TypeError):
                     pass
             else:
                 setattr(row, name, value)
 
-        row.save()
-        return redirect("dashboard")
-
-    fields = {}
-    role_choices = None
-    status_choices = None
-
-    for field in model._meta.fields:
-        if field.name not in ("id", "hashed_password", "created_at", "updated_at"):
-            fields[field.name] = getattr(row, field.name)
-
-        if field.name == "role":
-            role_choices = field.choices
+        try:
+            if table == "visits":
+                save_visit(row)
+            else:
+                row.save()
+        except ScheduleConflict as e:
+            error = str(e)
+        else:
+            if table == "system_users" and row.id == user.id:
+                remember_user(request, SessionUser.from_model(row))
+            return redirect("dashboard")
 
-        elif field.name == "status":
-            status_choices = field.choices
+    fields = {name: getattr(row, name) for name, _ in spec.edit_fields}
 
     return render(request, "edit_row.html",
                   {"fields": fields,
                    "table": table,
                    "row_id": row_id,
-                   "role_choices": role_choices,
-                   "status_choices": status_choices,})
+                   "role_choices": spec.role_choices,
+                   "status_choices": spec.status_choices,
+                   "error": error,})
 
 
 @login_required
 def delete_row(request):
-    user = SystemUser.objects.get(id=request.session["user_id"])
+    user = request.current_user
     if user.role != "admin":
         return redirect("dashboard")
 
     if request.method == "POST":
         table = request.POST.get("table")
         row_id = request.POST.get("row_id")
-        model = TABLES.get(table)
-        if model:
-            obj = get_object_or_404(model, id=row_id)
+        spec = get_table(table)
+        if spec:
+            obj = get_object_or_404(spec.model, pk=row_id)
             obj.delete()
 
     return redirect("dashboard")
+
+
+def dashboard_table_url(table):
+    return f"{reverse('dashboard')}?table={table}" if table else reverse("dashboard")
+
+
+@login_required
+def bulk_edit_rows(request):
+    user = request.current_user
+    table = request.POST.get("table")
+    spec = get_table(table)
+    if request.method != "POST" or not spec or user.role not in spec.edit_roles:
+        return redirect("dashboard")
+
+    try:
+        updated = bulk_update(spec, request.POST.getlist("row_ids"),
+                              request.POST.get("field"), request.POST.get("value"), user.id)
+    except BulkError as e:
+        messages.error(request, str(e))
+    else:
+        messages.success(request, f"Изменено строк: {updated}")
+    return redirect(dashboard_table_url(table))
+
+
+@login_required
+def bulk_delete_rows(request):
+    user = request.current_user
+    table = request.POST.get("table")
+    spec = get_table(table)
+    if request.method != "POST" or not spec or user.role != "admin":
+        return redirect("dashboard")
+
+    try:
+        deleted = bulk_delete(spec, request.POST.getlist("row_ids"), user.id)
+    except BulkError as e:
+        messages.error(request, str(e))
+    else:
+        messages.success(request, f"Удалено строк: {deleted}")
+    return redirect(dashboard_table_url(table))
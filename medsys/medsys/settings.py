@@ -2,6 +2,8 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
+from core.dbpool import reset_connection
+
 load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -28,13 +30,15 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    # GinIndex, BrinIndex, AddIndexConcurrently и pg_trgm в миграциях core
+    'django.contrib.postgres',
     'django_bootstrap5',
     'django.contrib.staticfiles',
     'core',
-'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -42,9 +46,15 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'core.middleware.CurrentUserMiddleware',
 ]
 
+# debug_toolbar только для разработки: под нагрузкой он непригоден
+DEBUG_TOOLBAR = os.getenv('DEBUG_TOOLBAR', '1' if DEBUG else '0') == '1'
+if DEBUG_TOOLBAR:
+    INSTALLED_APPS += ['debug_toolbar']
+    MIDDLEWARE += ['debug_toolbar.middleware.DebugToolbarMiddleware']
+
 ROOT_URLCONF = 'medsys.urls'
 
 TEMPLATES_DIR = BASE_DIR / 'templates'
@@ -71,6 +81,18 @@ WSGI_APPLICATION = 'medsys.wsgi.application'
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
 
+# Пул соединений psycopg (DB_POOL=0 — новое соединение на каждый запрос):
+# минимум и максимум соединений, ожидание свободного соединения, закрытие
+# простаивающих и слишком старых соединений (секунды). Роль и app.*
+# сбрасываются при возврате соединения в пул (core.dbpool), исправность
+# проверяется при выдаче (CONN_HEALTH_CHECKS)
+DB_POOL = os.getenv('DB_POOL', '1') == '1'
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 2))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 20))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', 600))
+DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', 3600))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -79,9 +101,123 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'postgres'),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', "5432"),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'min_size': DB_POOL_MIN_SIZE,
+                'max_size': DB_POOL_MAX_SIZE,
+                'timeout': DB_POOL_TIMEOUT,
+                'max_idle': DB_POOL_MAX_IDLE,
+                'max_lifetime': DB_POOL_MAX_LIFETIME,
+                'reset': reset_connection,
+            },
+        } if DB_POOL else {},
     }
 }
 
+# Реплика для чтения (без DB_REPLICA_HOST всё читается из primary):
+# предельное отставание реплики (с), как часто его замерять и сколько
+# секунд после записи сессия читает только из primary — с запасом больше
+# предельного отставания и частоты замера
+DB_REPLICA_HOST = os.getenv('DB_REPLICA_HOST')
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 5))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv('REPLICA_LAG_CHECK_SECONDS', 1))
+REPLICA_STICKY_SECONDS = float(os.getenv('REPLICA_STICKY_SECONDS', 10))
+if DB_REPLICA_HOST:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': DB_REPLICA_HOST,
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# manage.py test: таблицы внешней схемы создаются в тестовой БД до миграций
+TEST_RUNNER = 'core.test_runner.SchemaTestRunner'
+
+
+# Проверка паролей на стороне приложения (bcrypt в пуле потоков)
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv('PASSWORD_BCRYPT_ROUNDS', 12))
+
+# Кеш ключей шифрования псевдонимов (секунды) и размер пачки при ротации
+ALIAS_KEY_CACHE_TTL = int(os.getenv('ALIAS_KEY_CACHE_TTL', 300))
+ALIAS_ROTATION_CHUNK_SIZE = int(os.getenv('ALIAS_ROTATION_CHUNK_SIZE', 1000))
+
+# Журнал действий: буфер фоновой записи и секции по месяцам
+ACTION_LOG_BUFFER_SIZE = int(os.getenv('ACTION_LOG_BUFFER_SIZE', 500))
+ACTION_LOG_FLUSH_INTERVAL = float(os.getenv('ACTION_LOG_FLUSH_INTERVAL', 2.0))
+ACTION_LOG_PARTITIONS_AHEAD = int(os.getenv('ACTION_LOG_PARTITIONS_AHEAD', 3))
+ACTION_LOG_RETENTION_MONTHS = int(os.getenv('ACTION_LOG_RETENTION_MONTHS', 12))
+ACTION_LOG_ARCHIVE_SCHEMA = os.getenv('ACTION_LOG_ARCHIVE_SCHEMA', 'archive')
+
+# Расписание приёма: длительность визита и часы работы клиники
+VISIT_DURATION_MINUTES = int(os.getenv('VISIT_DURATION_MINUTES', 30))
+CLINIC_OPEN_HOUR = int(os.getenv('CLINIC_OPEN_HOUR', 9))
+CLINIC_CLOSE_HOUR = int(os.getenv('CLINIC_CLOSE_HOUR', 18))
+# Прогретый индекс занятости в каждом процессе (core.schedule.WarmSchedule):
+# сколько дней от сегодня он покрывает и предельный возраст (с) на случай
+# записи визитов мимо приложения. Изменение VISIT_DURATION_MINUTES требует
+# пересоздать ограничение visits_no_overlap (миграция 0011)
+SCHEDULE_WARM_DAYS = int(os.getenv('SCHEDULE_WARM_DAYS', 14))
+SCHEDULE_WARM_SECONDS = float(os.getenv('SCHEDULE_WARM_SECONDS', 60))
+
+# Кеш: общий уровень в Redis, если задан REDIS_URL, иначе в памяти процесса;
+# поверх него локальный LRU с коротким TTL (core.cache)
+REDIS_URL = os.getenv('REDIS_URL')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+CORE_CACHE_TTL = int(os.getenv('CORE_CACHE_TTL', 300))
+CORE_CACHE_LOCAL_TTL = float(os.getenv('CORE_CACHE_LOCAL_TTL', 5))
+CORE_CACHE_LOCAL_SIZE = int(os.getenv('CORE_CACHE_LOCAL_SIZE', 1024))
+
+# Метрики /metrics: доля запросов с замером обращений к БД, порог
+# медленного запроса (мс), размер выборки медленных запросов и токен
+# для сборщика Prometheus (без токена метрики видит только администратор)
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', 0.05))
+METRICS_SLOW_QUERY_MS = float(os.getenv('METRICS_SLOW_QUERY_MS', 100))
+METRICS_SLOW_QUERY_SAMPLES = int(os.getenv('METRICS_SLOW_QUERY_SAMPLES', 100))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Поиск /search/: сколько совпадений ранжируется (core.search). Больше —
+# точнее порядок на частых словах, но дольше ответ
+SEARCH_CANDIDATE_LIMIT = int(os.getenv('SEARCH_CANDIDATE_LIMIT', 1000))
+
+# Витрины аналитики: окно пересчёта визитов (дни) и сколько секунд новые
+# id ждут завершения транзакций, прежде чем попасть в витрину
+ANALYTICS_RECHECK_DAYS = int(os.getenv('ANALYTICS_RECHECK_DAYS', 7))
+ANALYTICS_LAG_SECONDS = int(os.getenv('ANALYTICS_LAG_SECONDS', 60))
+
+# Очередь заданий (run_jobs): каталог файлов результатов, лимиты заданий
+# пользователя в очереди и одновременно выполняемых, пауза опроса пустой
+# очереди, частота записи прогресса и heartbeat (с), через сколько секунд
+# без heartbeat задание считается брошенным, число попыток и срок хранения
+# результатов (часы)
+JOB_RESULTS_DIR = os.getenv('JOB_RESULTS_DIR', str(BASE_DIR / 'job_results'))
+JOB_MAX_ACTIVE_PER_USER = int(os.getenv('JOB_MAX_ACTIVE_PER_USER', 3))
+JOB_MAX_RUNNING_PER_USER = int(os.getenv('JOB_MAX_RUNNING_PER_USER', 1))
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', 2))
+JOB_PROGRESS_INTERVAL = float(os.getenv('JOB_PROGRESS_INTERVAL', 2))
+JOB_HEARTBEAT_SECONDS = float(os.getenv('JOB_HEARTBEAT_SECONDS', 30))
+JOB_STALE_SECONDS = int(os.getenv('JOB_STALE_SECONDS', 300))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+JOB_RESULT_TTL_HOURS = int(os.getenv('JOB_RESULT_TTL_HOURS', 24))
+
+# Процессы параллельной выгрузки Excel (1 — выгрузка в одном процессе)
+EXPORT_PROCESSES = int(os.getenv('EXPORT_PROCESSES', os.cpu_count() or 1))
+
+# Лента изменений /changes/: отставание верхней границы от текущего времени
+# (секунды; строки незавершённых транзакций не должны пропасть) и срок
+# хранения отметок об удалении (дни)
+CHANGES_LAG_SECONDS = int(os.getenv('CHANGES_LAG_SECONDS', 60))
+CHANGES_TOMBSTONE_DAYS = int(os.getenv('CHANGES_TOMBSTONE_DAYS', 30))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -129,5 +265,5 @@ INTERNAL_IPS = [
 ]
 
 
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 SESSION_COOKIE_SECURE = False  # для dev
\ No newline at end of file
@@ -7,7 +7,7 @@ urlpatterns = [
     path('', include('core.urls')),
 ]
 
-if settings.DEBUG:
+if settings.DEBUG_TOOLBAR:
     import debug_toolbar
     urlpatterns = [
         path('__debug__/', include(debug_toolbar.urls)),